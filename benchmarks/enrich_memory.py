@@ -0,0 +1,79 @@
+"""
+Measure the memory enrich_project adds to a parsed roadmap and fail if it is more than a bounded fraction
+
+the objectives and milestones of tests/roadmap.yml are repeated for each scale, the memory of the parsed
+roadmap and the memory retained and peaked while enriching it are measured with tracemalloc.
+Enrichment works in place, groups and the index refer to the elements of the project, so the overhead
+stays a fraction of the parsed roadmap. project.as_list is measured separately, it is built only if a template
+uses it. Run from the project root:
+
+    python benchmarks/enrich_memory.py --scales 1 50 200 --max-overhead 1.0
+"""
+import os
+import copy
+import argparse
+import tracemalloc
+
+from roadmap_app.utils import read_roadmap_definition
+from roadmap_app.model import enrich_project
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def read_large_project(roadmap_file: str, scale: int = 1):
+    """
+    Read roadmap_file with objectives and milestones repeated scale times, not enriched
+
+    explicit ids get the number of the copy, so every element keeps a unique _id
+    """
+    project = read_roadmap_definition(roadmap_file)
+    for element in ("objectives", "milestones"):
+        items = project.get(element) or []
+        project[element] = [dict(copy.deepcopy(item), title=f"{item['title']} {index}",
+                                 **({"id": f"{item['id']}.{index}"} if item.get("id") else {}))
+                            for index in range(scale) for item in items]
+    return project
+
+
+def measure_enrichment(scale: int = 1):
+    """
+    :return: bytes of the parsed roadmap, retained and peak bytes of enrich_project, bytes of the built as_list
+    :rtype: tuple
+    """
+    roadmap_file = os.path.join(PROJECT_ROOT, "tests", "roadmap.yml")
+    tracemalloc.start()
+    try:
+        project = read_large_project(roadmap_file, scale)
+        parsed = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        enrich_project(project, None, roadmap_file)
+        enriched, peak = tracemalloc.get_traced_memory()
+        len(project["as_list"])
+        as_list = tracemalloc.get_traced_memory()[0] - enriched
+    finally:
+        tracemalloc.stop()
+    return parsed, enriched - parsed, peak - parsed, as_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 50, 200],
+                        help="numbers of copies of objectives and milestones")
+    parser.add_argument("--max-overhead", type=float, default=1.0,
+                        help="largest allowed peak of enrichment as fraction of the parsed roadmap")
+    args = parser.parse_args()
+
+    print(f"{'scale':>8}{'parsed':>12}{'retained':>12}{'peak':>12}{'fraction':>10}{'as_list':>12}")
+    exceeded = []
+    for scale in args.scales:
+        parsed, retained, peak, as_list = measure_enrichment(scale)
+        fraction = peak / parsed
+        print(f"{scale:>8}{parsed:>12}{retained:>12}{peak:>12}{fraction:>10.2f}{as_list:>12}")
+        if fraction > args.max_overhead:
+            exceeded.append(scale)
+    if exceeded:
+        raise SystemExit(f"enrichment overhead above {args.max_overhead} of the parsed roadmap for scales {exceeded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare the scaling of flattening a roadmap into its key value list (project.as_list) before and after streaming
+
+the objectives and milestones of tests/roadmap.yml are repeated for each scale, the enriched project is flattened
+with the former get_key_value_list (which copied the growing list at every dict and list) and with
+iter_key_value_list. The time of both and the peak memory of streaming the pairs without keeping them
+are reported per scale. Run from the project root:
+
+    python benchmarks/flatten_scaling.py --scales 25 50 100 200 400
+"""
+import time
+import argparse
+import tracemalloc
+
+from render_memory import build_large_project
+from roadmap_app.utils import iter_key_value_list
+from roadmap_app.model import _AS_LIST_SKIP_KEYS
+
+
+def get_key_value_list_with_copies(element=None, key_value_list: list = None, prefix_for_key: str = None,
+                                   keep_index=False):
+    """
+    get_key_value_list as it was before iter_key_value_list, every call returns a copy of the whole list
+    """
+    if prefix_for_key is None:
+        prefix_for_key = ""
+    elif prefix_for_key is not None and prefix_for_key[-1] != ".":
+        prefix_for_key += "."
+    if key_value_list is None:
+        key_value_list = list()
+
+    if isinstance(element, list):
+        for index, item in enumerate(element):
+            if isinstance(item, dict):
+                sub_prefix = prefix_for_key + str(index) if keep_index else prefix_for_key
+                get_key_value_list_with_copies(element=item, prefix_for_key=sub_prefix,
+                                               key_value_list=key_value_list, keep_index=keep_index)
+    elif isinstance(element, dict):
+        for key in element.keys():
+            sub_prefix = prefix_for_key + str(key)
+            if not isinstance(element[key], (list, dict, tuple)):
+                key_value_list.append({'key': sub_prefix, 'value': element[key]})
+            else:
+                get_key_value_list_with_copies(element=element[key], prefix_for_key=sub_prefix,
+                                               key_value_list=key_value_list, keep_index=keep_index)
+    else:
+        if len(prefix_for_key) >= 1 and prefix_for_key[-1] == ".":
+            prefix_for_key = prefix_for_key[:-1]
+        if prefix_for_key == "":
+            prefix_for_key = None
+        key_value_list.append({'key': prefix_for_key, 'value': element})
+    return key_value_list.copy()
+
+
+def measure_time(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def stream_pairs(project):
+    count = 0
+    for _ in iter_key_value_list(project):
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[25, 50, 100, 200],
+                        help="numbers of copies of objectives and milestones")
+    args = parser.parse_args()
+
+    print(f"{'scale':>8}{'pairs':>10}{'before s':>12}{'after s':>12}{'speedup':>10}{'stream peak':>14}")
+    for scale in args.scales:
+        project = build_large_project(scale)
+        # flatten the project as project.as_list does, without the derived fields
+        project = {key: value for key, value in project.items() if key not in _AS_LIST_SKIP_KEYS}
+        before, pairs = measure_time(get_key_value_list_with_copies, element=project)
+        after, streamed = measure_time(lambda: list(iter_key_value_list(project)))
+        assert streamed == pairs
+        tracemalloc.start()
+        try:
+            stream_pairs(project)
+            stream_peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        print(f"{scale:>8}{len(pairs):>10}{before:>12.3f}{after:>12.3f}{before / after:>10.1f}{stream_peak:>14}")
+
+
+if __name__ == "__main__":
+    main()
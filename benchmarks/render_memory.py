@@ -0,0 +1,90 @@
+"""
+Compare the peak memory of rendering every template into a string with streaming it to disk
+
+the objectives and milestones of tests/roadmap.yml are repeated --scale times to get a large roadmap,
+each template is rendered twice: with Template.render and a single write (the former write path)
+and with stream_template_to_file. Run from the project root:
+
+    python benchmarks/render_memory.py --scale 200 --buffer-size 65536
+"""
+import os
+import copy
+import json
+import argparse
+import tempfile
+import tracemalloc
+
+from dotenv import dotenv_values
+
+from roadmap_app.utils import read_roadmap_definition
+from roadmap_app.model import enrich_project
+from roadmap_app.rendering import (find_templates, get_template_search_paths, stream_template_to_file,
+                                   EnvironmentPool, RENDER_BUFFER_SIZE)
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def build_large_project(scale: int = 1):
+    """
+    Enrich tests/roadmap.yml with objectives and milestones repeated scale times
+    """
+    roadmap_file = os.path.join(PROJECT_ROOT, "tests", "roadmap.yml")
+    project = read_roadmap_definition(roadmap_file)
+    for element in ("objectives", "milestones"):
+        items = project.get(element) or []
+        project[element] = [dict(copy.deepcopy(item), title=f"{item['title']} {index}")
+                            for index in range(scale) for item in items]
+    enrich_project(project, None, roadmap_file)
+    return project
+
+
+def measure(function, *args, **kwargs):
+    """
+    Peak memory in bytes allocated while function runs
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def render_to_string(template_file, output_file, project):
+    with open(output_file, "w") as f:
+        f.write(template_file.render(project=project))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=100, help="number of copies of objectives and milestones")
+    parser.add_argument("--buffer-size", type=int, default=RENDER_BUFFER_SIZE, help="write buffer in bytes")
+    args = parser.parse_args()
+
+    config = dotenv_values(os.path.join(PROJECT_ROOT, "config", "roadmap.env"))
+    project = build_large_project(args.scale)
+    environment_pool = EnvironmentPool()
+    results = []
+    with tempfile.TemporaryDirectory() as output_folder:
+        templates = find_templates(os.path.join(PROJECT_ROOT, config["TEMPLATE_PATH"]),
+                                   json.loads(config["TEMPLATE_KNOWN_SUFFIXES"]), output_folder)
+        for template in templates:
+            os.makedirs(template["output_path"], exist_ok=True)
+            environment = environment_pool.get_environment(get_template_search_paths(template))
+            template_file = environment.get_template(template["file"])
+            # render once to compile the template and its includes outside of the measurement
+            render_to_string(template_file, template["output_file"], project)
+            string_peak = measure(render_to_string, template_file, template["output_file"], project)
+            stream_peak = measure(stream_template_to_file, template_file, template["output_file"],
+                                  buffer_size=args.buffer_size, project=project)
+            results.append((template["output_name"], os.path.getsize(template["output_file"]),
+                            string_peak, stream_peak))
+
+    print(f"scale {args.scale}, buffer size {args.buffer_size} bytes")
+    print(f"{'output':<28}{'size':>12}{'render peak':>14}{'stream peak':>14}")
+    for output_name, size, string_peak, stream_peak in results:
+        print(f"{output_name:<28}{size:>12}{string_peak:>14}{stream_peak:>14}")
+
+
+if __name__ == "__main__":
+    main()
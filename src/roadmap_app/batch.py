@@ -0,0 +1,116 @@
+import os
+import glob
+from collections import Counter
+from pathlib import Path
+
+
+def is_batch_roadmap_file(roadmap_definition_file: str = ""):
+    """
+    Check if the roadmap file argument names several roadmap files
+
+    this is the case for a glob pattern (e.g. 'teams/*/roadmap.yml') or a list file prefixed with '@'
+
+    :param str roadmap_definition_file: value of --roadmap-file
+    :return: True for a glob pattern or a list file
+    :rtype: bool
+    """
+    return roadmap_definition_file.startswith("@") or glob.has_magic(roadmap_definition_file)
+
+
+def _default_output_folder(roadmap_file: str, base_dir: str, output_folder: str):
+    """
+    Output directory of a roadmap file without explicit output directory
+
+    the path of the roadmap file relative to base_dir without suffix, below output_folder,
+    e.g. 'teams/alpha/roadmap.yml' with base_dir 'teams' renders to '<output_folder>/alpha/roadmap/'.
+    Roadmap files outside of base_dir render to '<output_folder>/<stem>/'
+
+    :param str roadmap_file: path to the roadmap YAML file
+    :param str base_dir: directory the roadmap files are searched in
+    :param str output_folder: output directory of the batch
+    :return: output directory with trailing separator
+    :rtype: str
+    """
+    relative_path = os.path.relpath(os.path.abspath(roadmap_file), os.path.abspath(base_dir))
+    if relative_path.startswith(os.pardir):
+        relative_path = Path(roadmap_file).name
+    return os.path.join(output_folder, str(Path(relative_path).with_suffix(""))) + os.sep
+
+
+def _glob_base_dir(pattern: str):
+    """
+    Get the leading directory of a glob pattern which contains no wildcard
+
+    :param str pattern: glob pattern
+    :return: directory
+    :rtype: str
+    """
+    parts = []
+    for part in Path(pattern).parts[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.path.join(*parts) if parts else os.curdir
+
+
+def _read_roadmap_list_file(list_file: str, output_folder: str):
+    """
+    Read the roadmap files and their output directories from a list file
+
+    one roadmap file per line, optionally followed by its output directory, separated by whitespace.
+    Empty lines and lines starting with '#' are ignored, relative paths are relative to the list file.
+
+    :param str list_file: path to the list file
+    :param str output_folder: output directory of the batch, used for lines without output directory
+    :return: list of tuples of roadmap file and output directory
+    :rtype: list
+    """
+    if not os.path.exists(list_file):
+        raise ValueError(f"Roadmap list file '{list_file}' not found!")
+
+    base_dir = os.path.dirname(list_file)
+    jobs = []
+    with open(list_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            if len(parts) > 2:
+                raise ValueError(f"invalid line in roadmap list file '{list_file}': '{line}'")
+            roadmap_file = os.path.join(base_dir, parts[0])
+            if len(parts) == 2:
+                roadmap_output_folder = os.path.join(base_dir, parts[1])
+                if roadmap_output_folder[-1] != os.sep:
+                    roadmap_output_folder = f"{roadmap_output_folder}{os.sep}"
+            else:
+                roadmap_output_folder = _default_output_folder(roadmap_file, base_dir, output_folder)
+            jobs.append((roadmap_file, roadmap_output_folder))
+    return jobs
+
+
+def expand_roadmap_files(roadmap_definition_file: str = "", output_folder: str = ""):
+    """
+    Expand a glob pattern or a list file ('@roadmaps.txt') into roadmap files with their own output directory
+
+    :param str roadmap_definition_file: value of --roadmap-file
+    :param str output_folder: output directory of the batch
+    :return: list of tuples of roadmap file and output directory, in order of the list file or sorted by path
+    :rtype: list
+    """
+    if roadmap_definition_file.startswith("@"):
+        jobs = _read_roadmap_list_file(roadmap_definition_file[1:], output_folder)
+    else:
+        base_dir = _glob_base_dir(roadmap_definition_file)
+        jobs = [(roadmap_file, _default_output_folder(roadmap_file, base_dir, output_folder))
+                for roadmap_file in sorted(glob.glob(roadmap_definition_file, recursive=True))
+                if os.path.isfile(roadmap_file)]
+
+    if not jobs:
+        raise ValueError(f"No roadmap files found for '{roadmap_definition_file}'!")
+
+    output_folders = Counter(os.path.abspath(roadmap_output_folder) for _, roadmap_output_folder in jobs)
+    duplicates = sorted(folder for folder, count in output_folders.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"several roadmap files render to the same output directory: {', '.join(duplicates)}")
+    return jobs
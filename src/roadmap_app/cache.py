@@ -0,0 +1,259 @@
+import os
+import hashlib
+import logging
+import pickle
+import threading
+
+import jinja2
+import yaml
+from jinja2.bccache import Bucket, BytecodeCache, FileSystemBytecodeCache
+
+from .output import write_atomic
+
+# default size cap of the compiled template cache in bytes
+TEMPLATE_CACHE_MAX_SIZE = 32 * 1024 * 1024
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    Persistent on-disk cache for compiled Jinja2 templates
+
+    each entry is keyed by Jinja2 version, Environment extensions, template name, filename and the checksum
+    of the template source, so a changed template, extension or a Jinja2 upgrade never hits a stale entry.
+    The cache is pruned to max_size bytes by evicting least recently used entries, once after rendering
+    and not for every stored template, see prune.
+    """
+
+    def __init__(self, directory: str = "", max_size: int = TEMPLATE_CACHE_MAX_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory, pattern="__roadmap_jinja2_%s.cache")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # number of entries stored since the cache was pruned last
+        self.stored = 0
+
+    def get_bucket(self, environment, name, filename, source):
+        checksum = self.get_source_checksum(source)
+        extensions = ",".join(sorted(environment.extensions))
+        key = self.get_cache_key(f"{jinja2.__version__}|{extensions}|{name}|{checksum}", filename)
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+        return bucket
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+            return
+        self.hits += 1
+        # touch entry to keep track of the least recently used entries
+        try:
+            os.utime(self._get_cache_filename(bucket))
+        except OSError:
+            pass
+
+    def dump_bytecode(self, bucket):
+        super().dump_bytecode(bucket)
+        self.stored += 1
+
+    def prune(self):
+        """
+        Evict least recently used entries until the cache is not larger than max_size
+
+        the cache directory is listed once, so this is called after rendering instead of for every stored template
+
+        :return: number of evicted entries
+        :rtype: int
+        """
+        self.stored = 0
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.startswith("__roadmap_jinja2_") or not filename.endswith(".cache"):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            evicted += 1
+        if evicted:
+            logging.debug(f"template cache: evicted {evicted} entries from '{self.directory}'")
+        return evicted
+
+
+def get_template_bytecode_cache(config: dict = None):
+    """
+    Create the compiled template cache configured by CACHE_PATH and TEMPLATE_CACHE_MAX_SIZE
+
+    :param dict config: configuration dictionary
+    :return: TemplateBytecodeCache in CACHE_PATH/templates, None if CACHE_PATH is not set
+    :rtype: TemplateBytecodeCache
+    """
+    if not config or not config.get("CACHE_PATH"):
+        return None
+    try:
+        max_size = int(config.get("TEMPLATE_CACHE_MAX_SIZE") or TEMPLATE_CACHE_MAX_SIZE)
+    except ValueError:
+        raise ValueError(f"TEMPLATE_CACHE_MAX_SIZE must be an integer, got '{config.get('TEMPLATE_CACHE_MAX_SIZE')}'")
+    return TemplateBytecodeCache(os.path.join(config["CACHE_PATH"], "templates"), max_size=max_size)
+
+
+class SharedBytecodeCache(BytecodeCache):
+    """
+    In-memory cache for compiled Jinja2 templates shared by several Environments
+
+    each template source is compiled once per process, a persistent cache (e.g. TemplateBytecodeCache)
+    is consulted on a miss and gets every newly compiled template. Safe to use from parallel renders.
+    """
+
+    def __init__(self, persistent: BytecodeCache = None):
+        """
+        :param persistent: optional cache used below the in-memory cache
+        """
+        self.persistent = persistent
+        self.hits = 0
+        self.misses = 0
+        self._code = {}
+        self._lock = threading.Lock()
+
+    def get_bucket(self, environment, name, filename, source):
+        checksum = self.get_source_checksum(source)
+        memory_key = (name, filename, checksum)
+        with self._lock:
+            code = self._code.get(memory_key)
+            if code is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if code is not None:
+            bucket = Bucket(environment, self.get_cache_key(name, filename), checksum)
+            bucket.code = code
+        elif self.persistent is not None:
+            bucket = self.persistent.get_bucket(environment, name, filename, source)
+            if bucket.code is not None:
+                with self._lock:
+                    self._code[memory_key] = bucket.code
+        else:
+            bucket = Bucket(environment, self.get_cache_key(name, filename), checksum)
+        bucket.memory_key = memory_key
+        return bucket
+
+    def set_bucket(self, bucket):
+        with self._lock:
+            self._code[bucket.memory_key] = bucket.code
+        if self.persistent is not None:
+            self.persistent.set_bucket(bucket)
+
+    def clear(self):
+        with self._lock:
+            self._code.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def prune(self):
+        """
+        Prune the persistent cache if templates were stored in it since it was pruned last, see
+        TemplateBytecodeCache.prune
+
+        :return: number of evicted entries
+        :rtype: int
+        """
+        if not getattr(self.persistent, "stored", 0):
+            return 0
+        return self.persistent.prune()
+
+
+class ParsedYamlCache:
+    """
+    Persistent cache of parsed YAML files, e.g. roadmap.yml
+
+    the parsed data is pickled into one entry per YAML file, keyed by the hash of the file content,
+    the PyYAML version and the loader. A changed file replaces its entry, so the cache holds
+    at most one entry per YAML file.
+    """
+
+    def __init__(self, directory: str = ""):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _get_entry(self, path_to_yml: str):
+        name = hashlib.sha256(os.path.abspath(path_to_yml).encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.directory, f"{name}.pickle")
+
+    @staticmethod
+    def get_key(content_hash: str = "", loader: str = ""):
+        """
+        Get the cache key of a YAML file
+
+        :param str content_hash: hash of the content of the YAML file, see utils.YmlSource
+        :param str loader: name of the loader parsing the content
+        :return: key of the parsed content
+        :rtype: str
+        """
+        return f"{content_hash}|{yaml.__version__}|{loader}"
+
+    def load(self, path_to_yml: str = "", key: str = ""):
+        """
+        Load the parsed content of a YAML file
+
+        :param str path_to_yml: path/to/your.yml
+        :param str key: key of the current content, see get_key
+        :return: parsed content, None on a cache miss
+        """
+        data = None
+        try:
+            with open(self._get_entry(path_to_yml), "rb") as f:
+                entry_key, entry_data = pickle.load(f)
+            if entry_key == key:
+                data = entry_data
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            pass
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def store(self, path_to_yml: str = "", key: str = "", data=None):
+        """
+        Store the parsed content of a YAML file
+
+        :param str path_to_yml: path/to/your.yml
+        :param str key: key of the parsed content, see get_key
+        :param data: parsed content
+        """
+        try:
+            write_atomic(self._get_entry(path_to_yml),
+                         lambda f: pickle.dump((key, data), f, protocol=pickle.HIGHEST_PROTOCOL), mode="wb")
+        except (OSError, pickle.PicklingError) as err:
+            logging.debug(f"could not cache parsed '{path_to_yml}' in '{self.directory}': {err}")
+
+
+def get_parsed_yaml_cache(config: dict = None):
+    """
+    Create the parsed YAML cache configured by CACHE_PATH
+
+    :param dict config: configuration dictionary
+    :return: ParsedYamlCache in CACHE_PATH/yaml, None if CACHE_PATH is not set
+    :rtype: ParsedYamlCache
+    """
+    if not config or not config.get("CACHE_PATH"):
+        return None
+    return ParsedYamlCache(os.path.join(config["CACHE_PATH"], "yaml"))
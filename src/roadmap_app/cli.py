@@ -4,22 +4,43 @@ import sys
 import logging
 import argparse
 import shutil
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
-from jinja2 import Environment
-from jinja_markdown import MarkdownExtension
+import yaml
 from dotenv import dotenv_values
+from jsonschema import exceptions as schema_exceptions
 from pathlib import Path
 
-from .utils import read_roadmap_definition, convert_image_to_html_base64, create_output_folder
+from .utils import read_yml_source, convert_image_to_html_base64, create_output_folder
 from .model import enrich_project
-from .rendering import validate_yaml, find_templates, process_template
+from .rendering import (validate_yaml, find_templates, process_template, get_template_search_paths,
+                        TemplateLogFilter, EnvironmentPool, relocate_templates, get_render_buffer_size,
+                        RENDER_BUFFER_SIZE, current_template)
+from .cache import get_template_bytecode_cache, get_parsed_yaml_cache
+from .watch import snapshot_files, wait_for_changes, get_affected_templates
+from .batch import is_batch_roadmap_file, expand_roadmap_files
+from .validation import get_schema_cache_path, get_schema_hash, get_validation_result_cache
+from .logs import summarize, is_log_async, start_log_queue
+from .manifest import RenderManifest, get_project_hash
+from .output import OutputDirectoryLock
+from .graphviz import GraphvizConverter, get_graphviz_formats, get_graphviz_timeout, is_graphviz_installed
+from .markdown_cache import get_markdown_renderer, add_description_html
+from .dependencies import DependencyCycleError
+from .ranking import merge_rankings
+from .profiling import Profiler, stage
 
 
 # This function parses command-line arguments using the argparse module.
 def parse_commandline_args(parser):
-    # Add optional argument for specifying the path to the roadmap YAML file:
+    # Add optional command, 'compile-templates' fills the compiled template cache without rendering:
+    parser.add_argument("command", type=str, nargs="?", default="render", choices=["render", "compile-templates"],
+                        help="'render' the roadmap (default) or 'compile-templates' into CACHE_PATH ahead of time")
+    # Add optional argument for specifying the path to the roadmap YAML file, a glob or a list file renders a batch:
     parser.add_argument("--roadmap-file", "-rf", type=str,
-                        help="path to roadmap.yml", nargs="?", default="examples/roadmap.yml")
+                        help="path to roadmap.yml, a glob pattern (e.g. 'teams/*/roadmap.yml') or a list file "
+                             "('@roadmaps.txt') to render several roadmaps", nargs="?", default="examples/roadmap.yml")
     # Add optional argument for specifying the output directory for rendered results:
     parser.add_argument("--output-dir", "-out", type=str,
                         help="path to rendered output", nargs="?", default="roadmap/")
@@ -36,6 +57,50 @@ def parse_commandline_args(parser):
                         help="environment file containing paths to the schema definitions, logfile, etc.",
                         nargs="?",
                         default="config/roadmap.env")
+    # Add optional argument for rendering templates in parallel:
+    parser.add_argument("--workers", "-w",
+                        type=int,
+                        help="number of templates rendered in parallel, overrides RENDER_WORKERS from environment file",
+                        nargs="?",
+                        default=None)
+    # Add optional argument for staying resident and re-rendering on changes:
+    parser.add_argument("--watch",
+                        action="store_true",
+                        help="watch roadmap file, environment file and templates and re-render on changes")
+    # Add optional argument for rendering without template reload checks:
+    parser.add_argument("--production",
+                        action="store_true",
+                        help="preload the templates of the outputs and their includes and skip reload checks while rendering")
+    # Add optional arguments for profiling the pipeline:
+    parser.add_argument("--profile",
+                        type=str,
+                        help="write a JSON report with wall/CPU time per stage and per template to this file",
+                        default=None)
+    parser.add_argument("--profile-dir",
+                        type=str,
+                        help="dump cProfile statistics of every stage into this directory, requires --profile",
+                        default=None)
+    parser.add_argument("--profile-memory",
+                        action="store_true",
+                        help="report peak memory per stage with tracemalloc (slows down rendering), requires --profile")
+    # Add optional argument for rendering outputs whose inputs are unchanged:
+    parser.add_argument("--force",
+                        action="store_true",
+                        help="render all outputs, also if roadmap, config and templates are unchanged since the last run")
+    # Add optional argument for validating even if the validation result is cached:
+    parser.add_argument("--force-validate",
+                        action="store_true",
+                        help="validate the roadmap file even if it was validated successfully before")
+    # Add optional argument for reporting every schema violation instead of the most relevant one:
+    parser.add_argument("--all-errors",
+                        action="store_true",
+                        help="report all schema violations of the roadmap file, not only the most relevant one")
+    # Add optional argument for reporting the highest ranked keyresults and deliverables:
+    parser.add_argument("--top",
+                        type=int,
+                        help="report the N keyresults and deliverables with the highest weighted shortest job first, "
+                             "across all roadmaps of a batch",
+                        default=None)
     # Parse the arguments and return the parsed argument object:
     args = parser.parse_args()
     return args
@@ -47,36 +112,294 @@ def setup_logging(config):
 
     File logging: DEBUG level with timestamps.
     Console logging: INFO level without timestamps.
+    Records written while a template is processed are prefixed with the template name.
+    With LOG_ASYNC, records are written by a background thread, see logs.start_log_queue.
 
     :param dict config: configuration dictionary containing LOGFILE path
     """
     logging.basicConfig(filename=config["LOGFILE"], encoding='utf-8', level=logging.DEBUG,
-                        format='%(asctime)s [%(levelname)s] %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
+                        format='%(asctime)s [%(levelname)s] %(template)s%(message)s', datefmt='%m/%d/%Y %I:%M:%S %p')
 
     console_log_handler = logging.StreamHandler(sys.stdout)
-    console_log_format = logging.Formatter('%(levelname)s: %(message)s')
+    console_log_format = logging.Formatter('%(levelname)s: %(template)s%(message)s')
     console_log_handler.setFormatter(console_log_format)
     console_log_handler.setLevel(logging.INFO)
     logging.getLogger().addHandler(console_log_handler)
 
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TemplateLogFilter())
+
+    if is_log_async(config):
+        start_log_queue(TemplateLogFilter())
+
+
+def get_render_workers(config, workers=None):
+    """
+    Resolve the number of templates rendered in parallel
+
+    the commandline argument takes precedence over RENDER_WORKERS from the environment file,
+    if neither is given, templates are rendered sequentially
+
+    :param dict config: configuration dictionary, may contain RENDER_WORKERS
+    :param int workers: number of workers from commandline, None if not given
+    :return: number of workers, at least 1
+    :rtype: int
+    """
+    if workers is None:
+        try:
+            workers = int(config.get("RENDER_WORKERS") or 1)
+        except ValueError:
+            raise ValueError(f"RENDER_WORKERS must be an integer, got '{config.get('RENDER_WORKERS')}'")
+    return max(1, workers)
+
+
+def compile_templates(config, output_folder):
+    """
+    Compile every file in the search paths of all templates into the compiled template cache
+
+    used by 'roadmap compile-templates' to warm CACHE_PATH ahead of time, e.g. in a CI cache step
+
+    :param dict config: configuration dictionary with CACHE_PATH, TEMPLATE_PATH and TEMPLATE_KNOWN_SUFFIXES
+    :param str output_folder: path to output directory, only needed to discover templates
+    :return: number of compiled files
+    :rtype: int
+    """
+    bytecode_cache = get_template_bytecode_cache(config)
+    if bytecode_cache is None:
+        raise ValueError("CACHE_PATH is not set in environment file!")
+
+    environment_pool = EnvironmentPool(bytecode_cache=bytecode_cache)
+    compiled = 0
+    compiled_search_paths = set()
+    for template in discover_templates(config, output_folder):
+        search_paths = tuple(get_template_search_paths(template))
+        if search_paths in compiled_search_paths:
+            continue
+        compiled_search_paths.add(search_paths)
+        compiled += environment_pool.preload(list(search_paths))
+
+    bytecode_cache.prune()
+    logging.info(f"compiled {compiled} templates into '{bytecode_cache.directory}' "
+                 f"({bytecode_cache.hits} already cached)")
+    return compiled
+
+
+def _process_template_timed(environment_pool, template, roadmap_definition_file, project, profiler=None,
+                            manifest=None, project_hash=None, buffer_size=RENDER_BUFFER_SIZE, graphviz=None,
+                            pending_conversions=None):
+    """
+    Process a single template and measure its wall time and the CPU time of its thread
+
+    the inputs of the template are recorded in the manifest, if given.
+    With graphviz, a dot output is converted in the background and its conversion is appended to
+    pending_conversions to be recorded by _record_conversion, the conversion is not part of the measured time
+
+    :return: dict with template file, output file, wall and CPU time in seconds, the files loaded for rendering
+        and skipped False
+    :rtype: dict
+    """
+    # the log lines around process_template get the prefix of the template like its own log lines
+    context_token = current_template.set(template["file"])
+    try:
+        logging.info(f"processing '{os.path.join(template['path'], template['file'])}'")
+        start = time.perf_counter()
+        start_cpu_time = time.thread_time()
+        written_files = []
+        conversions = []
+        dependencies = process_template(template=template, roadmap_definition_file=roadmap_definition_file,
+                                        project=project, environment_pool=environment_pool, profiler=profiler,
+                                        written_files=written_files, buffer_size=buffer_size, graphviz=graphviz,
+                                        conversions=conversions if pending_conversions is not None else None)
+        wall_time = time.perf_counter() - start
+        logging.info(f"rendered '{template['file']}' in {wall_time:.3f}s")
+    finally:
+        current_template.reset(context_token)
+    if conversions:
+        pending_conversions.append((conversions[0], template, dependencies, written_files))
+    elif manifest is not None:
+        manifest.record(template, project_hash, dependencies, written_files)
+    timing = {"template": os.path.join(template['path'], template['file']),
+              "output_file": template["output_file"],
+              "wall_time": wall_time,
+              "cpu_time": time.thread_time() - start_cpu_time,
+              "dependencies": dependencies,
+              "skipped": False}
+    if profiler is not None:
+        profiler.add_template(timing)
+    return timing
+
+
+def _record_conversion(manifest, project_hash, conversion, template, dependencies, written_files):
+    """
+    Wait for the background conversion of a dot template, log its failure and record its outputs in the manifest
+
+    a template whose conversion failed is recorded without outputs, so it is rendered again next time
+    """
+    try:
+        converted_files = conversion.result()
+    except (OSError, subprocess.SubprocessError) as err:
+        logging.error(f"processing template '{os.path.join(template['path'], template['file'])}' failed: {err}")
+        converted_files = []
+    manifest.record(template, project_hash, dependencies, written_files + converted_files if converted_files else [])
+
+
+def _skip_template(template, manifest):
+    """
+    Timing entry of a template whose inputs are unchanged since it was rendered, see RenderManifest
+
+    :return: dict like _process_template_timed with the recorded dependencies and skipped True
+    :rtype: dict
+    """
+    logging.debug(f"skip '{os.path.join(template['path'], template['file'])}' - inputs unchanged")
+    return {"template": os.path.join(template['path'], template['file']),
+            "output_file": template["output_file"],
+            "wall_time": 0.0,
+            "cpu_time": 0.0,
+            "dependencies": manifest.get_dependencies(template),
+            "skipped": True}
+
+
+def load_config(environment_definition_file):
+    """
+    Load the configuration from the environment definition
+
+    :param str environment_definition_file: path to roadmap.env
+    :return: configuration dictionary
+    :rtype: dict
+    """
+    if not os.path.exists(environment_definition_file):
+        raise ValueError("Environment file not found!")
+    return dotenv_values(environment_definition_file)
+
+
+def build_project(roadmap_definition_file, config, skip_items, all_errors=False, force_validate=False,
+                  validation_cache=None, yaml_cache=None, profiler=None):
+    """
+    Read, validate and enrich the roadmap definition
+
+    the roadmap file is read once, its hash is used for the caches and the version of the roadmap.
+    Validation is skipped if the same roadmap was validated successfully against the same schema before,
+    see ValidationResultCache
+
+    :param str roadmap_definition_file: path to the roadmap YAML file
+    :param dict config: configuration dictionary with SCHEMA and optional CACHE_PATH
+    :param str skip_items: comma-separated dotted paths of elements to skip
+    :param bool all_errors: log all schema violations instead of the most relevant one
+    :param bool force_validate: validate even if the validation result is cached
+    :param ValidationResultCache validation_cache: cache of successful validations, created from config if not given
+    :param ParsedYamlCache yaml_cache: cache of parsed roadmaps, created from config if not given
+    :param Profiler profiler: measures the read, validate and enrich stages
+    :return: enriched project, None if the roadmap is not valid or its depends_on links contain a cycle
+    :rtype: dict
+    """
+    # Read Roadmap-Definition
+    if yaml_cache is None:
+        yaml_cache = get_parsed_yaml_cache(config)
+    with stage(profiler, "read", roadmap_file=roadmap_definition_file):
+        try:
+            source = read_yml_source(roadmap_definition_file, cache=yaml_cache)
+        except FileNotFoundError as err:
+            raise ValueError(f"Roadmap file '{roadmap_definition_file}' not found!") from err
+    project = source.data
+
+    if validation_cache is None:
+        validation_cache = get_validation_result_cache(config)
+    schema_hash = None
+    if validation_cache is not None:
+        schema_hash = get_schema_hash(config["SCHEMA"])
+
+    if not force_validate and validation_cache is not None and validation_cache.is_valid(source.hash, schema_hash):
+        logging.info(f"{roadmap_definition_file} is unchanged since its last validation - skip validation")
+    else:
+        with stage(profiler, "validate", roadmap_file=roadmap_definition_file):
+            validation_error, is_valid_yaml = validate_yaml(
+                roadmap_data=project, path_to_json_schema=config["SCHEMA"], all_errors=all_errors,
+                cache_path=get_schema_cache_path(config))
+
+        if not is_valid_yaml:
+            logging.error(f"{roadmap_definition_file} contains no valid YAML-data - see logfile for details")
+            return None
+        if validation_cache is not None:
+            validation_cache.add(source.hash, schema_hash)
+            logging.debug(f"validation result of {roadmap_definition_file} cached in '{validation_cache.directory}'")
+
+    # Enrich project data (IDs, WSJF, grouping, flat list, dependencies)
+    with stage(profiler, "enrich", roadmap_file=roadmap_definition_file):
+        try:
+            enrich_project(project, skip_items, roadmap_definition_file, source=source)
+        except DependencyCycleError as err:
+            logging.error(f"{roadmap_definition_file} contains no valid dependencies: {err}")
+            return None
+    return project
+
+
+def discover_templates(config, output_folder, profiler=None):
+    """
+    Find all templates configured by TEMPLATE_PATH and TEMPLATE_KNOWN_SUFFIXES
+
+    :param dict config: configuration dictionary with TEMPLATE_PATH and TEMPLATE_KNOWN_SUFFIXES
+    :param str output_folder: path to output directory
+    :param Profiler profiler: measures the find_templates stage
+    :return: templates
+    :rtype: list
+    """
+    with stage(profiler, "find_templates"):
+        template_known_suffixes = json.loads(config["TEMPLATE_KNOWN_SUFFIXES"])
+        return find_templates(template_path=config["TEMPLATE_PATH"],
+                              template_known_suffixes=template_known_suffixes,
+                              global_output_path=output_folder)
 
-def render_templates(project, config, output_folder, roadmap_definition_file):
+
+def render_templates(project, config, output_folder, roadmap_definition_file, workers=1, templates=None,
+                     environment_pool=None, production=False, profiler=None, force=False):
     """
     Discover templates, render them with Jinja2, and handle logo embedding/copying.
 
+    With workers > 1 the templates are rendered concurrently in a thread pool.
+    All templates are rendered with Environments from one EnvironmentPool, so every file is compiled once,
+    no matter how many templates or workers load it.
+    In production mode the templates of the outputs and their includes are preloaded and cached templates are
+    not checked for changes, so includes inside loops do not touch the filesystem.
+    Templates whose project, configuration and loaded files are unchanged since their outputs were written
+    are skipped, see RenderManifest.
+    Outputs are streamed to disk through a write buffer of RENDER_BUFFER_SIZE bytes, an output with unchanged
+    content is not written again. The output directory is locked while rendering, so parallel runs
+    into the same directory wait for each other.
+    Dot outputs are converted to GRAPHVIZ_FORMATS in background threads while the remaining templates render.
+    Every element with a description gets description_html, descriptions and {% markdown %} blocks are converted
+    once by the MarkdownRenderer of the pool, which is persisted in CACHE_PATH.
+
     :param dict project: enriched roadmap project data
     :param dict config: configuration dictionary with TEMPLATE_PATH and TEMPLATE_KNOWN_SUFFIXES
     :param str output_folder: path to output directory
     :param str roadmap_definition_file: path to the roadmap YAML file
+    :param int workers: number of templates rendered in parallel
+    :param list templates: templates to render, discovered from config if not given
+    :param EnvironmentPool environment_pool: pool to render with, a new pool is created if not given
+    :param bool production: create the pool in production mode and preload all templates
+    :param Profiler profiler: measures the render stage and every template
+    :param bool force: render all templates, also if their inputs are unchanged
+    :return: per-template timings in order of the templates
+    :rtype: list
     """
-    template_known_suffixes = json.loads(config["TEMPLATE_KNOWN_SUFFIXES"])
-    templates = find_templates(template_path=config["TEMPLATE_PATH"],
-                               template_known_suffixes=template_known_suffixes,
-                               global_output_path=output_folder)
+    if templates is None:
+        templates = discover_templates(config, output_folder, profiler=profiler)
+    if environment_pool is None:
+        environment_pool = EnvironmentPool(bytecode_cache=get_template_bytecode_cache(config), production=production,
+                                           markdown_renderer=get_markdown_renderer(config))
+    buffer_size = get_render_buffer_size(config)
+    graphviz = GraphvizConverter(get_graphviz_formats(config), get_graphviz_timeout(config), workers=workers,
+                                 profiler=profiler)
+    with OutputDirectoryLock(output_folder), stage(profiler, "render", roadmap_file=roadmap_definition_file), graphviz:
+        return _render_templates(project, output_folder, roadmap_definition_file, workers, templates,
+                                 environment_pool, profiler, force, buffer_size, graphviz)
 
-    env = Environment()
-    env.add_extension(MarkdownExtension)
 
+def _render_templates(project, output_folder, roadmap_definition_file, workers, templates, environment_pool,
+                      profiler, force, buffer_size, graphviz):
+    """
+    Render the templates, see render_templates
+    """
     # convert logo to make it embeddable in the html template
     logo_src_path = None
     if "logo" in project:
@@ -84,10 +407,60 @@ def render_templates(project, config, output_folder, roadmap_definition_file):
         ).resolve(), project["logo"]["filename"])
         project["logo"]["base64"] = convert_image_to_html_base64(logo_src_path)
 
-    for template in templates:
-        logging.info(f"processing '{os.path.join(template['path'], template['file'])}'")
-        process_template(environment=env, template=template, roadmap_definition_file=roadmap_definition_file,
-                         project=project)
+    render_start = time.perf_counter()
+    # descriptions are converted before the project is hashed, the templates see description_html
+    add_description_html(project, environment_pool.markdown_renderer)
+    # the converted formats are part of the configuration of dot templates, without graphviz the dot output is
+    # recorded alone and rendered again once graphviz is installed
+    converted_formats = graphviz.formats if graphviz.formats and is_graphviz_installed() else []
+    manifest = RenderManifest(output_folder, settings={"dot": {"graphviz_formats": converted_formats}})
+    project_hash = get_project_hash(project)
+    timings = [None] * len(templates)
+    pending = []
+    pending_conversions = []
+    for index, template in enumerate(templates):
+        if not force and manifest.is_up_to_date(template, project_hash):
+            timings[index] = _skip_template(template, manifest)
+        else:
+            pending.append(index)
+
+    # only the templates of the outputs and the templates they reference are preloaded
+    if environment_pool.production:
+        for index in pending:
+            environment_pool.preload(get_template_search_paths(templates[index]), [templates[index]["file"]])
+
+    if workers > 1 and len(pending) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render") as executor:
+            futures = {index: executor.submit(_process_template_timed, environment_pool, templates[index],
+                                              roadmap_definition_file, project, profiler, manifest, project_hash,
+                                              buffer_size, graphviz, pending_conversions)
+                       for index in pending}
+            for index, future in futures.items():
+                timings[index] = future.result()
+    else:
+        for index in pending:
+            timings[index] = _process_template_timed(environment_pool, templates[index], roadmap_definition_file,
+                                                     project, profiler, manifest, project_hash, buffer_size,
+                                                     graphviz, pending_conversions)
+    # dot outputs are converted while the remaining templates render, they are recorded when their conversion finished
+    for pending_conversion in pending_conversions:
+        _record_conversion(manifest, project_hash, *pending_conversion)
+    manifest.save()
+    environment_pool.markdown_renderer.save()
+    # the persistent template cache is pruned once, not for every compiled template
+    environment_pool.bytecode_cache.prune()
+    logging.info(f"rendered {len(pending)} templates, skipped {len(templates) - len(pending)} unchanged, "
+                 f"with {workers} worker(s) in {time.perf_counter() - render_start:.3f}s")
+    stats = environment_pool.stats.as_dict()
+    logging.debug(f"template resolutions: {stats['include_resolutions']} includes, "
+                  f"{stats['source_loads']} source loads, {stats['uptodate_checks']} uptodate checks")
+    bytecode_cache = environment_pool.bytecode_cache
+    logging.debug(f"template cache: {bytecode_cache.hits} hits, {bytecode_cache.misses} misses")
+    if bytecode_cache.persistent is not None:
+        logging.debug(f"persistent template cache: {bytecode_cache.persistent.hits} hits, "
+                      f"{bytecode_cache.persistent.misses} misses")
+    markdown_renderer = environment_pool.markdown_renderer
+    logging.debug(f"markdown cache: {markdown_renderer.hits} hits, {markdown_renderer.misses} misses")
 
     # Copy logo to output path if it exists in the project
     if logo_src_path:
@@ -97,6 +470,250 @@ def render_templates(project, config, output_folder, roadmap_definition_file):
         except shutil.SameFileError:
             logging.debug(f"copy logo file '{logo_src_path}' failed")
 
+    return timings
+
+
+def report_ranking(ranked, total=0):
+    """
+    Log the highest ranked keyresults and deliverables with their quantifiers
+
+    :param list ranked: tuples of roadmap file and element in rank order, see ranking.merge_rankings
+    :param int total: number of ranked elements the report was selected from
+    """
+    logging.info(f"top {len(ranked)} of {total} keyresults and deliverables by weighted shortest job first:")
+    for rank, (roadmap_definition_file, element) in enumerate(ranked, start=1):
+        quantifiers = element["quantifiers"]
+        logging.info(f"{rank:>4}. wsjf {quantifiers['weighted_shortest_job_first']}, "
+                     f"cost of delay {quantifiers.get('cost_of_delay')}, jobsize {quantifiers.get('jobsize')}: "
+                     f"{element.get('_id')} '{element.get('title')}' ({roadmap_definition_file})")
+
+
+def _render_batch_roadmap(roadmap_definition_file, output_folder, config, skip_items, templates, environment_pool,
+                          all_errors=False, force_validate=False, validation_cache=None, yaml_cache=None,
+                          profiler=None, force=False, top=None):
+    """
+    Build and render a single roadmap of a batch
+
+    only the top highest ranked elements of the roadmap are kept for the ranking of the batch
+
+    :return: dict with roadmap file, output folder, success, wall time in seconds, error message,
+        its top ranked elements and the number of its ranked elements
+    :rtype: dict
+    """
+    start = time.perf_counter()
+    error = None
+    ranking = []
+    ranked = 0
+    try:
+        project = build_project(roadmap_definition_file, config, skip_items, all_errors=all_errors,
+                                force_validate=force_validate, validation_cache=validation_cache,
+                                yaml_cache=yaml_cache, profiler=profiler)
+        if project is None:
+            error = "no valid YAML-data"
+        else:
+            if top:
+                ranking = project["ranking"].top(top)
+                ranked = len(project["ranking"])
+            Path(output_folder).mkdir(parents=True, exist_ok=True)
+            render_templates(project, config, output_folder, roadmap_definition_file,
+                             templates=relocate_templates(templates, output_folder),
+                             environment_pool=environment_pool, profiler=profiler, force=force)
+    except Exception as err:
+        # one broken roadmap must not stop the batch
+        logging.exception(f"rendering '{roadmap_definition_file}' failed")
+        error = str(err) or type(err).__name__
+    return {"roadmap_file": roadmap_definition_file,
+            "output_folder": output_folder,
+            "success": error is None,
+            "wall_time": time.perf_counter() - start,
+            "error": error,
+            "ranking": ranking,
+            "ranked": ranked}
+
+
+def render_batch(jobs, config, output_folder, skip_items, workers=1, production=False, all_errors=False,
+                 force_validate=False, profiler=None, force=False, top=None):
+    """
+    Render many roadmap files in one process
+
+    config, template discovery and the EnvironmentPool are shared by all roadmaps,
+    the roadmaps are rendered concurrently by a pool of workers (the templates of one roadmap sequentially).
+    A summary with success and wall time of every roadmap is logged.
+    With top, the top highest ranked keyresults and deliverables of all roadmaps are reported, see report_ranking.
+
+    :param list jobs: tuples of roadmap file and output directory from expand_roadmap_files
+    :param dict config: configuration dictionary
+    :param str output_folder: output directory of the batch, only needed to discover templates
+    :param str skip_items: comma-separated dotted paths of elements to skip
+    :param int workers: number of roadmaps rendered in parallel
+    :param bool production: render with a production EnvironmentPool
+    :param bool all_errors: log all schema violations of a roadmap instead of the most relevant one
+    :param bool force_validate: validate every roadmap even if its validation result is cached
+    :param Profiler profiler: measures the stages of every roadmap
+    :param bool force: render all outputs, also if their inputs are unchanged
+    :param int top: number of highest ranked keyresults and deliverables to report, nothing is reported if None
+    :return: per-roadmap results in order of jobs
+    :rtype: list
+    """
+    templates = discover_templates(config, output_folder, profiler=profiler)
+    environment_pool = EnvironmentPool(bytecode_cache=get_template_bytecode_cache(config), production=production,
+                                       markdown_renderer=get_markdown_renderer(config))
+    validation_cache = get_validation_result_cache(config)
+    yaml_cache = get_parsed_yaml_cache(config)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="roadmap") as executor:
+        futures = [executor.submit(_render_batch_roadmap, roadmap_definition_file, roadmap_output_folder, config,
+                                   skip_items, templates, environment_pool, all_errors, force_validate,
+                                   validation_cache, yaml_cache, profiler, force, top)
+                   for roadmap_definition_file, roadmap_output_folder in jobs]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        status = "ok" if result["success"] else f"FAILED ({result['error']})"
+        logging.info(f"{result['wall_time']:.3f}s '{result['roadmap_file']}' -> '{result['output_folder']}': {status}")
+    failed = sum(1 for result in results if not result["success"])
+    logging.info(f"batch: rendered {len(results) - failed} of {len(results)} roadmaps, {failed} failed, "
+                 f"with {workers} worker(s) in {time.perf_counter() - start:.3f}s")
+    if validation_cache is not None:
+        logging.info(f"validation cache: {validation_cache.hits} hits, {validation_cache.misses} misses")
+    if yaml_cache is not None:
+        logging.info(f"parsed roadmap cache: {yaml_cache.hits} hits, {yaml_cache.misses} misses")
+    if top:
+        report_ranking(merge_rankings([(result["roadmap_file"], result["ranking"]) for result in results], top),
+                       sum(result["ranked"] for result in results))
+    return results
+
+
+# errors of a watch cycle caused by the watched files, e.g. a roadmap saved mid-edit or renamed
+WATCH_CYCLE_ERRORS = (yaml.YAMLError, OSError, ValueError, schema_exceptions.ValidationError,
+                      schema_exceptions.SchemaError)
+
+
+def run_watch_cycle(state, changed_files, roadmap_definition_file, environment_definition_file,
+                    output_folder, skip_items, workers, added_or_removed_files=None, all_errors=False, force=False):
+    """
+    Re-run only the pipeline stages affected by the changed files
+
+    - environment file changed: reload config, discover templates, rebuild project, render all templates
+    - templates.yml changed or template files added/removed: discover templates, render all templates
+    - roadmap file changed: rebuild project, render all templates
+    - template file changed: render only the templates which load it
+
+    :param dict state: watch state with config, templates, project, the files loaded per output
+    and the EnvironmentPool - updated in place
+    :param set changed_files: absolute paths of changed files
+    :param str roadmap_definition_file: path to the roadmap YAML file
+    :param str environment_definition_file: path to roadmap.env
+    :param str output_folder: path to output directory
+    :param str skip_items: comma-separated dotted paths of elements to skip
+    :param int workers: number of templates rendered in parallel
+    :param set added_or_removed_files: absolute paths of files which were added or removed
+    :param bool all_errors: log all schema violations of the roadmap instead of the most relevant one
+    :param bool force: render the affected outputs, also if their inputs are unchanged
+    :return: names of the stages which were run
+    :rtype: list
+    """
+    stages = []
+    roadmap_file = os.path.abspath(roadmap_definition_file)
+    environment_file = os.path.abspath(environment_definition_file)
+    template_files = set(changed_files) - {roadmap_file, environment_file}
+
+    if state["config"] is None or environment_file in changed_files:
+        state["config"] = load_config(environment_definition_file)
+        state["templates"] = None
+        state["project"] = None
+        state["environment_pool"] = None
+        stages.append("config")
+
+    if state["environment_pool"] is None:
+        # the pooled Environments reload changed templates, so the pool is kept until the config changes
+        state["environment_pool"] = EnvironmentPool(bytecode_cache=get_template_bytecode_cache(state["config"]),
+                                                    markdown_renderer=get_markdown_renderer(state["config"]))
+
+    manifest_file = os.path.abspath(os.path.join(state["config"]["TEMPLATE_PATH"], "templates.yml"))
+    if (state["templates"] is None or manifest_file in template_files
+            or template_files & set(added_or_removed_files or [])):
+        state["templates"] = discover_templates(state["config"], output_folder)
+        stages.append("templates")
+
+    if state["project"] is None or roadmap_file in changed_files:
+        state["project"] = build_project(roadmap_definition_file, state["config"], skip_items, all_errors=all_errors)
+        stages.append("roadmap")
+
+    if state["project"] is None:
+        logging.error(f"{roadmap_definition_file} is not valid - waiting for changes")
+        return stages
+
+    # only changes of template files allow a partial render
+    if "templates" in stages or "roadmap" in stages:
+        templates = state["templates"]
+    else:
+        templates = get_affected_templates(state["templates"], template_files, state["dependencies"])
+
+    if templates:
+        timings = render_templates(state["project"], state["config"], output_folder, roadmap_definition_file,
+                                   workers=workers, templates=templates,
+                                   environment_pool=state["environment_pool"], force=force)
+        state["dependencies"].update({timing["output_file"]: timing["dependencies"] for timing in timings})
+    stages.append(f"render {len(templates)}/{len(state['templates'])}")
+    return stages
+
+
+def watch_roadmap(roadmap_definition_file, environment_definition_file, output_folder, skip_items, workers,
+                  config, max_cycles=None, all_errors=False, force=False):
+    """
+    Stay resident and re-render the roadmap whenever the roadmap file, the environment file
+    or a file in TEMPLATE_PATH changes
+
+    the first cycle renders everything, every further cycle only re-runs the affected stages,
+    see run_watch_cycle. Each cycle logs a timing line. A cycle failing with one of WATCH_CYCLE_ERRORS
+    is logged, the state of the previous cycle is kept and the watcher waits for the next change.
+
+    :param str roadmap_definition_file: path to the roadmap YAML file
+    :param str environment_definition_file: path to roadmap.env
+    :param str output_folder: path to output directory
+    :param str skip_items: comma-separated dotted paths of elements to skip
+    :param int workers: number of templates rendered in parallel
+    :param dict config: configuration dictionary, WATCH_INTERVAL and WATCH_DEBOUNCE are used if present
+    :param int max_cycles: stop after this number of change cycles, None watches until interrupted
+    :param bool all_errors: log all schema violations of the roadmap instead of the most relevant one
+    :param bool force: render the affected outputs, also if their inputs are unchanged
+    """
+    state = {"config": config, "templates": None, "project": None, "dependencies": {}, "environment_pool": None}
+    poll_interval = float(config.get("WATCH_INTERVAL") or 0.5)
+    debounce = float(config.get("WATCH_DEBOUNCE") or 0.3)
+
+    def get_watched_paths():
+        return [roadmap_definition_file, environment_definition_file, state["config"]["TEMPLATE_PATH"]]
+
+    snapshot = snapshot_files(get_watched_paths())
+    changed_files = set()
+    added_or_removed_files = set()
+    cycles = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                stages = run_watch_cycle(state, changed_files, roadmap_definition_file, environment_definition_file,
+                                         output_folder, skip_items, workers, added_or_removed_files, all_errors,
+                                         force)
+            except WATCH_CYCLE_ERRORS as err:
+                logging.error(f"watch cycle failed: {err} - waiting for changes")
+                stages = ["failed"]
+            logging.info(f"watch cycle: {', '.join(stages)} in {time.perf_counter() - start:.3f}s")
+            if max_cycles is not None and cycles >= max_cycles:
+                break
+            cycles += 1
+            logging.info(f"watching '{roadmap_definition_file}', '{environment_definition_file}' "
+                         f"and '{state['config']['TEMPLATE_PATH']}' for changes")
+            previous_snapshot = snapshot
+            changed_files, snapshot = wait_for_changes(get_watched_paths, snapshot,
+                                                       poll_interval=poll_interval, debounce=debounce)
+            added_or_removed_files = previous_snapshot.keys() ^ snapshot.keys()
+    except KeyboardInterrupt:
+        logging.info("watch stopped")
+
 
 def main():
     # Init
@@ -108,36 +725,67 @@ def main():
     skip_items = args.skip_items
     environment_definition_file = args.environment
 
-    if not os.path.exists(roadmap_definition_file):
-        raise ValueError("Roadmap file not found!")
-    if not os.path.exists(environment_definition_file):
-        raise ValueError("Environment file not found!")
+    batch = args.command == "render" and is_batch_roadmap_file(roadmap_definition_file)
+    if batch and args.watch:
+        raise ValueError("--watch does not support several roadmap files!")
+    if (args.profile_dir or args.profile_memory) and not args.profile:
+        raise ValueError("--profile-dir and --profile-memory require --profile!")
+    if args.top is not None and args.top < 1:
+        raise ValueError("--top must be at least 1!")
 
     # Load Config from environment definition
-    config = dotenv_values(environment_definition_file)
+    config = load_config(environment_definition_file)
 
     setup_logging(config)
-    logging.debug(f"config: {config}")
+    logging.debug("config: %s", summarize(config))
 
     if output_folder[-1] != os.sep:
         output_folder = f"{output_folder}{os.sep}"
 
+    if args.command == "compile-templates":
+        compile_templates(config, output_folder)
+        return
+
     if not create_output_folder(output_folder):
         logging.error(f"could not create '{output_folder}' - see logfile for details")
         return
 
-    # Read Roadmap-Definition
-    project = read_roadmap_definition(path_to_roadmap_yml=roadmap_definition_file)
-
-    validation_error, is_valid_yaml = validate_yaml(
-        roadmap_data=project, path_to_json_schema=config["SCHEMA"])
+    workers = get_render_workers(config, args.workers)
 
-    if not is_valid_yaml:
-        logging.error(f"{roadmap_definition_file} contains no valid YAML-data - see logfile for details")
+    if args.watch:
+        if args.production:
+            logging.warning("--production is ignored in watch mode, changed templates have to be reloaded")
+        if args.profile:
+            logging.warning("--profile is ignored in watch mode")
+        if args.top:
+            logging.warning("--top is ignored in watch mode")
+        watch_roadmap(roadmap_definition_file, environment_definition_file, output_folder, skip_items, workers,
+                      config, all_errors=args.all_errors, force=args.force)
         return
 
-    # Enrich project data (IDs, WSJF, grouping, flat list)
-    enrich_project(project, skip_items, roadmap_definition_file)
+    profiler = None
+    if args.profile:
+        profiler = Profiler(cprofile_dir=args.profile_dir, trace_memory=args.profile_memory)
+
+    try:
+        if batch:
+            render_batch(expand_roadmap_files(roadmap_definition_file, output_folder), config, output_folder,
+                         skip_items, workers=workers, production=args.production, all_errors=args.all_errors,
+                         force_validate=args.force_validate, profiler=profiler, force=args.force, top=args.top)
+            return
+
+        project = build_project(roadmap_definition_file, config, skip_items, all_errors=args.all_errors,
+                                force_validate=args.force_validate, profiler=profiler)
+        if project is None:
+            return
+        if args.top:
+            report_ranking([(roadmap_definition_file, element) for element in project["ranking"].top(args.top)],
+                           len(project["ranking"]))
 
-    render_templates(project, config, output_folder, roadmap_definition_file)
-    logging.info("roadmap conversion finished")
+        render_templates(project, config, output_folder, roadmap_definition_file, workers=workers,
+                         production=args.production, profiler=profiler, force=args.force)
+        logging.info("roadmap conversion finished")
+    finally:
+        if profiler is not None:
+            profiler.write_report(args.profile)
+            logging.info(f"profile written to '{args.profile}'")
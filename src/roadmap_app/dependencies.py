@@ -0,0 +1,102 @@
+from collections import deque
+
+
+class DependencyCycleError(ValueError):
+    """
+    The depends_on links of the roadmap contain a cycle, there is no order to finish its elements
+    """
+
+    def __init__(self, cycle: list = None):
+        """
+        :param list cycle: nodes of the cycle, every node depends on the node before it and the first on the last
+        """
+        self.cycle = cycle or []
+        super().__init__(f"depends_on cycle: {' -> '.join(str(node) for node in self.cycle + self.cycle[:1])}")
+
+
+def _find_cycle(remaining: list, predecessors: dict):
+    # every remaining node has a remaining predecessor, following them from the first node runs into a cycle
+    node = remaining[0]
+    visited = {}
+    path = []
+    while node not in visited:
+        visited[node] = len(path)
+        path.append(node)
+        node = predecessors[node][0]
+    # the path runs against the dependencies, the cycle is returned in their direction from its first node
+    cycle = list(reversed(path[visited[node]:]))
+    position = {node: index for index, node in enumerate(remaining)}
+    first = cycle.index(min(cycle, key=position.__getitem__))
+    return cycle[first:] + cycle[:first]
+
+
+def topological_order(nodes: list = None, successors: dict = None):
+    """
+    Order the nodes so that every node comes after the nodes it depends on, in O(V+E)
+
+    the nodes without dependencies come in the order of nodes, every other node follows
+    when the last of its dependencies is ordered
+
+    :param list nodes: nodes of the graph
+    :param dict successors: the nodes depending on a node, keyed by the node
+    :return: nodes in topological order
+    :rtype: list
+    :raises DependencyCycleError: if the graph contains a cycle
+    """
+    nodes = nodes or []
+    successors = successors or {}
+    indegree = dict.fromkeys(nodes, 0)
+    for node in nodes:
+        for successor in successors.get(node, ()):
+            indegree[successor] += 1
+
+    ready = deque(node for node in nodes if indegree[node] == 0)
+    order = []
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+        for successor in successors.get(node, ()):
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                ready.append(successor)
+
+    if len(order) < len(indegree):
+        remaining = [node for node in indegree if indegree[node] > 0]
+        predecessors = {node: [] for node in remaining}
+        for node in remaining:
+            for successor in successors.get(node, ()):
+                if successor in predecessors:
+                    predecessors[successor].append(node)
+        raise DependencyCycleError(_find_cycle(remaining, predecessors))
+    return order
+
+
+def critical_path(order: list = None, successors: dict = None, weights: dict = None):
+    """
+    The path with the largest sum of weights through the graph, in O(V+E)
+
+    :param list order: nodes in topological order, see topological_order
+    :param dict successors: the nodes depending on a node, keyed by the node
+    :param dict weights: weight of every node, e.g. its jobsize
+    :return: nodes of the critical path from its first to its last node and its length, the sum of their weights
+    :rtype: tuple
+    """
+    if not order:
+        return [], 0
+    successors = successors or {}
+    weights = weights or {}
+    # length of the longest path ending with a node and the node before it on this path
+    length = {node: weights.get(node, 0) for node in order}
+    previous = {}
+    for node in order:
+        for successor in successors.get(node, ()):
+            if length[node] + weights.get(successor, 0) > length[successor]:
+                length[successor] = length[node] + weights.get(successor, 0)
+                previous[successor] = node
+
+    node = max(order, key=length.__getitem__)
+    path = [node]
+    while path[-1] in previous:
+        path.append(previous[path[-1]])
+    path.reverse()
+    return path, length[node]
@@ -0,0 +1,186 @@
+import os
+import json
+import logging
+import functools
+import threading
+import contextvars
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .output import get_temp_file, replace_if_changed
+from .profiling import stage
+
+# formats a dot output is converted to by default, written as <output>.dot.<format>
+GRAPHVIZ_FORMATS = ["png"]
+# formats which can be configured in GRAPHVIZ_FORMATS
+GRAPHVIZ_KNOWN_FORMATS = ("png", "svg", "pdf")
+# default seconds a single dot conversion may take
+GRAPHVIZ_TIMEOUT = 60.0
+
+
+@functools.lru_cache(maxsize=None)
+def is_graphviz_installed():
+    """
+    Check if graphviz is installed in current environment
+
+    uses 'dot -V' and check for 'graphviz version' string in output,
+    the binary is probed once per process
+
+    :return: True if dot is installed, False if dot is not installed
+    :rtype: bool
+    """
+    try:
+        graphviz_version = subprocess.check_output(['dot', '-V'], stderr=subprocess.STDOUT)
+        if "graphviz version" in str(graphviz_version):
+            return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+    return False
+
+
+def get_graphviz_formats(config: dict = None):
+    """
+    Resolve the formats dot outputs are converted to, configured by GRAPHVIZ_FORMATS
+
+    :param dict config: configuration dictionary, may contain GRAPHVIZ_FORMATS as JSON list, e.g. ["png","svg"],
+        an empty list [] disables the conversion
+    :return: list of formats
+    :rtype: list
+    """
+    value = (config or {}).get("GRAPHVIZ_FORMATS")
+    if not value:
+        return list(GRAPHVIZ_FORMATS)
+    try:
+        formats = json.loads(value)
+    except ValueError:
+        raise ValueError(f"GRAPHVIZ_FORMATS must be a JSON list, got '{value}'")
+    unknown = [fmt for fmt in formats if fmt not in GRAPHVIZ_KNOWN_FORMATS] if isinstance(formats, list) else [value]
+    if unknown:
+        raise ValueError(f"GRAPHVIZ_FORMATS contains unknown formats {unknown}, known are {list(GRAPHVIZ_KNOWN_FORMATS)}")
+    return formats
+
+
+def get_graphviz_timeout(config: dict = None):
+    """
+    Resolve the seconds a single dot conversion may take, configured by GRAPHVIZ_TIMEOUT
+
+    :param dict config: configuration dictionary, may contain GRAPHVIZ_TIMEOUT
+    :return: timeout in seconds
+    :rtype: float
+    """
+    try:
+        return float((config or {}).get("GRAPHVIZ_TIMEOUT") or GRAPHVIZ_TIMEOUT)
+    except ValueError:
+        raise ValueError(f"GRAPHVIZ_TIMEOUT must be a number, got '{config.get('GRAPHVIZ_TIMEOUT')}'")
+
+
+def convert_dot(source: str = "", output_stem: str = "", formats: list = None, timeout: float = GRAPHVIZ_TIMEOUT,
+                profiler=None, template_name: str = ""):
+    """
+    Convert dot source into all formats with a single 'dot' process
+
+    the source is piped over stdin, every format is written to a temp file which replaces
+    <output_stem>.<format> if its content changed. The process is killed after timeout seconds.
+
+    :param str source: rendered dot source
+    :param str output_stem: path of the outputs without format, e.g. output/roadmap.dot
+    :param list formats: formats to convert to, GRAPHVIZ_FORMATS if not given, nothing is converted if empty
+    :param float timeout: seconds the conversion may take
+    :param Profiler profiler: measures the graphviz stage
+    :param str template_name: template the source was rendered from, recorded by the profiler
+    :return: paths of the converted outputs
+    :rtype: list
+    :raises subprocess.CalledProcessError: if dot failed
+    :raises subprocess.TimeoutExpired: if dot took longer than timeout
+    """
+    formats = GRAPHVIZ_FORMATS if formats is None else formats
+    if not formats:
+        return []
+    outputs = {fmt: f"{output_stem}.{fmt}" for fmt in formats}
+    temp_files = {fmt: get_temp_file(output) for fmt, output in outputs.items()}
+    command = ["dot"]
+    for fmt in formats:
+        command += [f"-T{fmt}", "-o", temp_files[fmt]]
+
+    logging.info(f"rendering '{output_stem}' to {', '.join(formats)}")
+    try:
+        with stage(profiler, "graphviz", template=template_name):
+            subprocess.run(command, input=source.encode("utf-8"), stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE, timeout=timeout, check=True)
+    except subprocess.CalledProcessError as err:
+        logging.debug(f"dot failed: {(err.stderr or b'').decode('utf-8', 'replace').strip()}")
+        raise
+    else:
+        for fmt, output in outputs.items():
+            replace_if_changed(temp_files[fmt], output)
+    finally:
+        for temp_file in temp_files.values():
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    return list(outputs.values())
+
+
+class GraphvizConverter:
+    """
+    Run dot conversions in background threads while the remaining templates render
+
+    submit returns a Future with the converted outputs, it raises the error of a failed conversion.
+    Log records of a conversion keep the template name of the submitting thread.
+    Use it as context manager, all conversions are finished when it is left.
+    """
+
+    def __init__(self, formats: list = None, timeout: float = GRAPHVIZ_TIMEOUT, workers: int = 1, profiler=None):
+        """
+        :param list formats: formats to convert to, GRAPHVIZ_FORMATS if not given, nothing is converted if empty
+        :param float timeout: seconds a single conversion may take
+        :param int workers: number of conversions running in parallel
+        :param Profiler profiler: measures the graphviz stage of every conversion
+        """
+        self.formats = list(GRAPHVIZ_FORMATS if formats is None else formats)
+        self.timeout = timeout
+        self.workers = max(1, workers)
+        self.profiler = profiler
+        self._executor = None
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, source: str = "", output_stem: str = "", template_name: str = ""):
+        """
+        Start converting dot source in the background, see convert_dot
+
+        :return: Future of the converted outputs
+        :rtype: Future
+        """
+        with self._lock:
+            if self._executor is None:
+                # the pool is only started if a dot template is rendered
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="graphviz")
+            future = self._executor.submit(contextvars.copy_context().run, convert_dot, source, output_stem,
+                                           self.formats, self.timeout, self.profiler, template_name)
+            self._futures.append(future)
+        return future
+
+    def wait(self):
+        """
+        Wait until all submitted conversions are finished
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        wait(futures)
+
+    def close(self):
+        """
+        Wait for all conversions and stop the background threads
+        """
+        self.wait()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,118 @@
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import queue
+
+# longest payload written to the log as it is, larger payloads are summarized
+LOG_MAX_LENGTH = 1000
+# number of dictionary keys listed in a summary
+SUMMARY_MAX_KEYS = 10
+
+# listener writing the records of the log queue, None if records are written synchronously
+_queue_listener = None
+
+
+class LogSummary:
+    """
+    Lazy, size-bounded representation of a log payload, e.g. the parsed roadmap or the template list
+
+    nothing is formatted when the record is filtered out, e.g. DEBUG records without DEBUG handler.
+    Payloads longer than max_length are summarized by type, size, top-level keys and a hash
+    of their representation, so a large roadmap never floods the logfile.
+    """
+
+    __slots__ = ("value", "max_length")
+
+    def __init__(self, value=None, max_length: int = LOG_MAX_LENGTH):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self):
+        text = str(self.value)
+        if len(text) <= self.max_length:
+            return text
+
+        digest = hashlib.sha256(text.encode("utf-8", "backslashreplace")).hexdigest()[:12]
+        size = f"{len(text)} chars, sha256 {digest}"
+        if isinstance(self.value, dict):
+            keys = [str(key) for key in list(self.value)[:SUMMARY_MAX_KEYS]]
+            if len(self.value) > SUMMARY_MAX_KEYS:
+                keys.append("...")
+            return f"dict with {len(self.value)} keys ({', '.join(keys)}), {size}"
+        if isinstance(self.value, (list, tuple, set)):
+            return f"{type(self.value).__name__} with {len(self.value)} items, {size}"
+        return f"{text[:self.max_length]}... ({size})"
+
+
+def summarize(value=None, max_length: int = LOG_MAX_LENGTH):
+    """
+    Wrap a log payload for lazy, size-bounded formatting
+
+    use it as argument of a %-style log call, e.g. logging.debug("yml_content: %s", summarize(content))
+
+    :param value: payload to log
+    :param int max_length: longest payload logged as it is
+    :return: payload formatted when the record is emitted
+    :rtype: LogSummary
+    """
+    return LogSummary(value, max_length)
+
+
+def is_log_async(config: dict = None):
+    """
+    Check if log records are written by a background thread, configured by LOG_ASYNC
+
+    :param dict config: configuration dictionary
+    :return: True for LOG_ASYNC=true/yes/on/1
+    :rtype: bool
+    """
+    return str((config or {}).get("LOG_ASYNC") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def start_log_queue(*filters):
+    """
+    Move the handlers of the root logger behind a queue, they are served by a background thread
+
+    writing the logfile and the console does not block rendering. Filters which read the state of
+    the calling thread (e.g. TemplateLogFilter) are applied before the record is queued.
+    The queue is flushed on exit, see stop_log_queue.
+
+    :param filters: filters applied in the calling thread before the record is queued
+    """
+    global _queue_listener
+    stop_log_queue()
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    for log_filter in filters:
+        queue_handler.addFilter(log_filter)
+    for handler in handlers:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+
+    _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+
+def stop_log_queue():
+    """
+    Write all queued records, stop the background thread and give the handlers back to the root logger
+
+    nothing happens without log queue
+    """
+    global _queue_listener
+    if _queue_listener is None:
+        return
+    listener, _queue_listener = _queue_listener, None
+    listener.stop()
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler) and handler.queue is listener.queue:
+            root_logger.removeHandler(handler)
+    for handler in listener.handlers:
+        root_logger.addHandler(handler)
+
+
+atexit.register(stop_log_queue)
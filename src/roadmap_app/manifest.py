@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+import jinja2
+
+from . import __version__
+from .utils import calculate_file_hash
+from .output import write_atomic
+
+# name of the render manifest in the output directory
+MANIFEST_FILE = ".roadmap-manifest.json"
+# keys of a template entry which locate the output directory, the manifest is valid wherever the directory is
+_OUTPUT_LOCATION_KEYS = ("output_file", "output_path")
+# keys of the project derived from the rest of it: the flat key-value list, the index, the ids, the dependency
+# graph and the ranking of the elements
+_DERIVED_PROJECT_KEYS = ("as_list", "index", "by_id", "dependencies", "ranking")
+
+
+def get_project_hash(project: dict = None):
+    """
+    Hash the enriched project as the templates see it
+
+    the render time changes on every run and is left out, as the flat key-value list, the index, the ids, the
+    dependency graph and the ranking which are derived from the rest of the project. Everything else (roadmap
+    content, skipped items, the embedded logo, ...) is part of the hash
+
+    :param dict project: enriched roadmap project data
+    :return: md5 of the project as hex string
+    :rtype: str
+    """
+    project = dict(project or {})
+    if isinstance(project.get("meta"), dict):
+        project["meta"] = {key: value for key, value in project["meta"].items() if key != "rendertime"}
+    # hashing the flat list would build it, the index, ids and ranking would hash every element again
+    for key in _DERIVED_PROJECT_KEYS:
+        project.pop(key, None)
+    return hashlib.md5(repr(project).encode("utf-8", "backslashreplace")).hexdigest()
+
+
+def get_config_hash(template: dict = None, settings: dict = None):
+    """
+    Hash the configuration a template is rendered with
+
+    the template entry (input, output name, suffix) without the location of the output directory,
+    the settings of the template and the versions of this package and Jinja2
+
+    :param dict template: template entry from find_templates
+    :param dict settings: settings which change the outputs of the template, e.g. the graphviz formats
+    :return: md5 of the configuration as hex string
+    :rtype: str
+    """
+    config = (sorted((key, str(value)) for key, value in template.items() if key not in _OUTPUT_LOCATION_KEYS),
+              sorted((key, str(value)) for key, value in (settings or {}).items()),
+              __version__, jinja2.__version__)
+    return hashlib.md5(repr(config).encode("utf-8", "backslashreplace")).hexdigest()
+
+
+class RenderManifest:
+    """
+    Record of the inputs of every output in an output directory, stored as MANIFEST_FILE
+
+    an entry is keyed by the output file of a template and records the hash of the project, of the
+    configuration and of every template and partial the template loaded, and the files it wrote.
+    An output is up to date if all of them are unchanged and the written files still exist.
+    """
+
+    def __init__(self, output_folder: str = "", settings: dict = None):
+        """
+        :param str output_folder: output directory of the manifest
+        :param dict settings: settings per template suffix, see get_config_hash
+        """
+        self.output_folder = output_folder
+        self.settings = settings or {}
+        self.path = os.path.join(output_folder, MANIFEST_FILE)
+        self.entries = {}
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)["outputs"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _get_key(self, template: dict):
+        return os.path.relpath(template["output_file"], self.output_folder)
+
+    def _get_config_hash(self, template: dict):
+        return get_config_hash(template, self.settings.get(template.get("suffix")))
+
+    def _get_file_hash(self, path: str):
+        """
+        Hash a loaded file once per run, templates share most of their partials
+        """
+        with self._lock:
+            if path not in self._file_hashes:
+                self._file_hashes[path] = calculate_file_hash(path)
+            return self._file_hashes[path]
+
+    def is_up_to_date(self, template: dict = None, project_hash: str = ""):
+        """
+        Check if the outputs of a template were rendered from unchanged inputs
+
+        :param dict template: template entry from find_templates
+        :param str project_hash: hash of the project, see get_project_hash
+        :return: True if rendering the template can be skipped
+        :rtype: bool
+        """
+        entry = self.entries.get(self._get_key(template))
+        if not entry or entry.get("project") != project_hash or entry.get("config") != self._get_config_hash(template):
+            return False
+        if not all(os.path.exists(os.path.join(self.output_folder, output)) for output in entry["outputs"]):
+            return False
+        return all(self._get_file_hash(path) == file_hash for path, file_hash in entry["files"].items())
+
+    def get_dependencies(self, template: dict = None):
+        """
+        Get the files a template loaded when it was rendered
+
+        :param dict template: template entry from find_templates
+        :return: absolute paths of the loaded files, empty if the template is not in the manifest
+        :rtype: list
+        """
+        entry = self.entries.get(self._get_key(template)) or {}
+        return sorted(entry.get("files", {}))
+
+    def record(self, template: dict = None, project_hash: str = "", dependencies: list = None,
+               written_files: list = None):
+        """
+        Record the inputs of a rendered template, nothing is recorded if the template wrote no file
+
+        :param dict template: template entry from find_templates
+        :param str project_hash: hash of the project, see get_project_hash
+        :param list dependencies: absolute paths of all files loaded for rendering
+        :param list written_files: files written by the template
+        """
+        key = self._get_key(template)
+        if not written_files:
+            with self._lock:
+                self.entries.pop(key, None)
+            return
+        entry = {"project": project_hash,
+                 "config": self._get_config_hash(template),
+                 "files": {path: self._get_file_hash(path) for path in dependencies or []},
+                 "outputs": [os.path.relpath(path, self.output_folder) for path in written_files]}
+        with self._lock:
+            self.entries[key] = entry
+
+    def save(self):
+        """
+        Write the manifest to the output directory
+        """
+        try:
+            with self._lock:
+                write_atomic(self.path, lambda f: json.dump({"outputs": self.entries}, f, indent=2, sort_keys=True))
+        except OSError as err:
+            logging.warning(f"could not write render manifest '{self.path}': {err}")
@@ -0,0 +1,153 @@
+import os
+import logging
+import pickle
+import textwrap
+import threading
+from collections import OrderedDict
+
+import markdown
+from jinja_markdown import EXTENSIONS
+
+from .output import write_atomic
+
+# default number of converted texts kept by a MarkdownRenderer
+MARKDOWN_CACHE_SIZE = 4096
+# name of the persisted cache in CACHE_PATH/markdown
+MARKDOWN_CACHE_FILE = "markdown.pickle"
+# keys of the project which do not contain elements of their own: the flat list, the groups, index, ids,
+# dependencies and ranking of elements
+_NO_ELEMENT_KEYS = ("as_list", "group", "index", "by_id", "dependencies", "ranking")
+
+
+class MarkdownRenderer:
+    """
+    Convert markdown to HTML with the extensions of jinja_markdown, converted texts are kept in an LRU cache
+
+    the cache is keyed by the source text, so a description which is converted several times (truncated and in full,
+    in the main HTML and the kanban outputs) is converted once per run. Each thread uses its own converter,
+    the renderer is safe to use from parallel renders.
+    With a directory, the cache is loaded from and saved to MARKDOWN_CACHE_FILE in this directory, keyed by
+    the versions of markdown and its extensions, so unchanged descriptions are not converted again in the next run.
+    """
+
+    def __init__(self, max_entries: int = MARKDOWN_CACHE_SIZE, directory: str = None):
+        """
+        :param int max_entries: number of converted texts kept, least recently used texts are evicted
+        :param str directory: directory of the persisted cache, the cache is kept in memory only if not given
+        """
+        self.max_entries = max(1, max_entries)
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._key = f"{markdown.__version__}|{','.join(EXTENSIONS)}"
+        self._html = OrderedDict()
+        self._changed = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if directory is not None:
+            self._load()
+
+    def _get_cache_file(self):
+        return os.path.join(self.directory, MARKDOWN_CACHE_FILE)
+
+    def _load(self):
+        try:
+            with open(self._get_cache_file(), "rb") as f:
+                key, entries = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            return
+        if key == self._key:
+            self._html.update(entries[-self.max_entries:])
+
+    def save(self):
+        """
+        Save the cache to its directory, nothing is written if no text was converted since it was loaded
+        """
+        if self.directory is None:
+            return
+        with self._lock:
+            if not self._changed:
+                return
+            entries = list(self._html.items())
+            self._changed = False
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            write_atomic(self._get_cache_file(),
+                         lambda f: pickle.dump((self._key, entries), f, protocol=pickle.HIGHEST_PROTOCOL), mode="wb")
+        except (OSError, pickle.PicklingError) as err:
+            logging.debug(f"could not save markdown cache in '{self.directory}': {err}")
+
+    def convert(self, text: str = ""):
+        """
+        Convert markdown text to HTML
+
+        :param str text: markdown text
+        :return: HTML
+        :rtype: str
+        """
+        with self._lock:
+            html = self._html.get(text)
+            if html is not None:
+                self._html.move_to_end(text)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        # the converter is stateful, so every thread has its own
+        markdowner = getattr(self._local, "markdowner", None)
+        if markdowner is None:
+            markdowner = self._local.markdowner = markdown.Markdown(extensions=EXTENSIONS)
+        html = markdowner.convert(text)
+
+        with self._lock:
+            self._html[text] = html
+            self._changed = True
+            if len(self._html) > self.max_entries:
+                self._html.popitem(last=False)
+        return html
+
+
+def get_markdown_renderer(config: dict = None):
+    """
+    Create the MarkdownRenderer configured by MARKDOWN_CACHE_SIZE and CACHE_PATH
+
+    :param dict config: configuration dictionary, may contain MARKDOWN_CACHE_SIZE and CACHE_PATH
+    :return: MarkdownRenderer, persisted in CACHE_PATH/markdown if CACHE_PATH is set
+    :rtype: MarkdownRenderer
+    """
+    config = config or {}
+    try:
+        max_entries = int(config.get("MARKDOWN_CACHE_SIZE") or MARKDOWN_CACHE_SIZE)
+    except ValueError:
+        raise ValueError(f"MARKDOWN_CACHE_SIZE must be an integer, got '{config.get('MARKDOWN_CACHE_SIZE')}'")
+    directory = os.path.join(config["CACHE_PATH"], "markdown") if config.get("CACHE_PATH") else None
+    return MarkdownRenderer(max_entries=max_entries, directory=directory)
+
+
+def add_description_html(element=None, renderer: MarkdownRenderer = None):
+    """
+    Add description_html with the converted description to every element with a description
+
+    the description is converted like a '{% markdown %}{{ element.description }}{% endmarkdown %}' block,
+    templates use element.description_html and fall back to that block without it. The flat list project.as_list is left out,
+    project.group, project.index, project.by_id, project.dependencies and project.ranking refer to the same elements.
+
+    :param element: project, element or list of elements, changed in place
+    :param MarkdownRenderer renderer: renderer converting the descriptions
+    """
+    if renderer is None:
+        renderer = MarkdownRenderer()
+    if isinstance(element, list):
+        for item in element:
+            add_description_html(item, renderer)
+    elif isinstance(element, dict):
+        if "description" in element:
+            element["description_html"] = renderer.convert(_dedent(str(element["description"])))
+        for key, value in element.items():
+            if key not in _NO_ELEMENT_KEYS and isinstance(value, (list, dict)):
+                add_description_html(value, renderer)
+
+
+def _dedent(text: str = ""):
+    # like jinja_markdown.MarkdownExtension._dedent
+    return textwrap.dedent(text.strip("\n"))
@@ -1,8 +1,21 @@
+import functools
 import logging
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from collections.abc import Mapping
 
-from .utils import calculate_roadmap_version, get_key_value_list
+from .utils import calculate_roadmap_version, LazyKeyValueList
+from .dependencies import topological_order, critical_path
+from .ranking import Ranking
+
+# every non-valid character of an id is replaced by "_", umlauts are transliterated
+_ID_TRANSLATION = str.maketrans({
+    **{char: "_" for char in (" ", ".", "-", "#", "+", "*")},
+    'ä': 'ae',
+    'ü': 'ue',
+    'ö': 'oe',
+    'ß': 'ss',
+})
 
 
 def make_id_from(input_element: str = ""):
@@ -12,23 +25,8 @@ def make_id_from(input_element: str = ""):
     :param str input_element: input element from which we want to make an id
     :return: str generated id
     """
-    # make input lower
-    _id = str(input_element).lower()
-    # this list contains every non-valid characters, which are replaced by #replacestring
-    non_valid_id_characters = [" ", ".", "-", "#", "+", "*"]
-    # this is the replacement character
-    replacement_character = "_"
-    for char in non_valid_id_characters:
-        _id = _id.replace(char, replacement_character)
-    # replace umlaut
-    special_char_map = {
-        ord('ä'): 'ae',
-        ord('ü'): 'ue',
-        ord('ö'): 'oe',
-        ord('ß'): 'ss'
-    }
-    _id = _id.translate(special_char_map)
-    return _id
+    # make input lower and replace all non-valid characters in one pass
+    return str(input_element).lower().translate(_ID_TRANSLATION)
 
 
 def calculate_cost_of_delay(
@@ -113,8 +111,10 @@ def calculate_wsjf_quantifiers_for_element_items(elements: dict = None):
     in addition: cost_of_delay is only calculated if not set
     in addition: weighted_shortest_job_first is only calculated if not set
 
+    the items are changed in place, nothing is copied
+
     :param dict elements: roadmap element data as dict, e.g. timeline, objectives...
-    :return: dict new project with added ["quantifiers"]
+    :return: the given elements with added ["quantifiers"]
     """
     # iterate over each item
     for count, item in enumerate(elements):
@@ -142,7 +142,7 @@ def calculate_wsjf_quantifiers_for_element_items(elements: dict = None):
             except (KeyError, TypeError, ValueError) as err:
                 # ignore error - we simply don't add quantifiers to item
                 logging.debug(f"weighted_shortest_job_first; calculating failed: {err}")
-    return elements.copy()
+    return elements
 
 
 # Mapping of child element keys to their ID prefixes
@@ -159,6 +159,20 @@ _CHILD_ELEMENT_PREFIXES = {
 # Elements that get WSJF quantifiers calculated
 _WSJF_ELEMENTS = {"keyresults", "deliverables"}
 
+# Fields of the project which are not part of project["as_list"]: the list itself, the index, the id registry,
+# the dependency graph and the ranking, see get_as_list_skip_keys
+_AS_LIST_SKIP_KEYS = ("as_list", "index", "by_id", "dependencies", "ranking")
+
+# Fields the elements are grouped by in project["index"], e.g. index.milestones.by_state
+INDEX_GROUP_FIELDS = ("state", "date", "requirement", "tag")
+
+# Elements which can depend on each other with depends_on
+DEPENDENCY_ELEMENTS = ("milestones", "deliverables", "keyresults")
+# weight of an element without a valid quantifiers.jobsize on the critical path
+DEFAULT_JOBSIZE = 1
+# Elements ranked by weighted shortest job first in project["ranking"]
+RANKING_ELEMENTS = ("keyresults", "deliverables")
+
 
 def calculate_ids_for_element_items(elements: dict = None, prefix: str = "", parent_id: str = ""):
     """
@@ -170,11 +184,13 @@ def calculate_ids_for_element_items(elements: dict = None, prefix: str = "", par
     :param str parent_id: id of parent element,
     used to make id unique
     it is used to make a prefix before _id
-    :return: dict new project with added ["_id"] and ["id]
+    :return: the given elements with added ["_id"] and ["id], changed in place on every nesting level
     """
 
     # this is the id of the element before current element in a list - already used during dot-processing
     _previous_id = ""
+    # the _parent_id of all items, made once and shared by them
+    _parent_id_of_items = make_id_from(parent_id)
 
     # let's iterate over each element and add "id", "_id" and "_parent_id"
     # because we like to have a human-readable id, we start at 1
@@ -185,7 +201,7 @@ def calculate_ids_for_element_items(elements: dict = None, prefix: str = "", par
 
         # # parent_id is set from function call
         if "_parent_id" not in item or item["_parent_id"] == "":
-            item["_parent_id"] = make_id_from(parent_id)
+            item["_parent_id"] = _parent_id_of_items
 
         # if parent_id is empty, we create id without parent_id
         if parent_id == "":
@@ -204,17 +220,17 @@ def calculate_ids_for_element_items(elements: dict = None, prefix: str = "", par
         # check each dict-object and calculate the id's and quantifiers
         for key, child_prefix in _CHILD_ELEMENT_PREFIXES.items():
             if key in item:
-                item[key] = calculate_ids_for_element_items(item[key], child_prefix, parent_id=_parent_id)
+                calculate_ids_for_element_items(item[key], child_prefix, parent_id=_parent_id)
                 if key in _WSJF_ELEMENTS:
-                    item[key] = calculate_wsjf_quantifiers_for_element_items(item[key])
+                    calculate_wsjf_quantifiers_for_element_items(item[key])
 
-    return elements.copy()
+    return elements
 
 
 def get_items_grouped_by_date(elements=None):
     """
     Groups items by similar dates, maintaining the original order. If an item has no date attribute,
-    it is grouped under "None".
+    it is grouped under "None". The groups contain the items, not copies.
 
     :param elements: List of items where each item is a dictionary that may contain a "date" key.
     :type elements: list, optional
@@ -229,11 +245,307 @@ def get_items_grouped_by_date(elements=None):
         for item in elements:
             # Use the item's date if it exists, otherwise use "None" and add it to the group
             date = item.get("date", "None")
-            grouped_items[date].append(item.copy())
+            grouped_items[date].append(item)
 
     return dict(grouped_items)
 
 
+def _iter_child_items(element: dict = None):
+    # the nested elements of an element or the project as tuples of key, position and element, in document order
+    for key in _CHILD_ELEMENT_PREFIXES:
+        items = element.get(key)
+        if isinstance(items, list):
+            for position, item in enumerate(items):
+                if isinstance(item, dict):
+                    yield key, position, item
+
+
+class ElementChildren(Mapping):
+    """
+    The nested elements of every registered element with children, keyed by _id
+
+    the children are read from the element when they are used, nothing is stored per element
+    """
+
+    def __init__(self, by_id: dict = None):
+        """
+        :param dict by_id: every element by its _id, see build_element_index
+        """
+        self._by_id = by_id if by_id is not None else {}
+
+    def __getitem__(self, _id):
+        children = [item for _, _, item in _iter_child_items(self._by_id[_id])]
+        if not children:
+            raise KeyError(_id)
+        return children
+
+    def __iter__(self):
+        return (_id for _id, element in self._by_id.items() if next(_iter_child_items(element), None) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class ElementPaths(Mapping):
+    """
+    The dotted path of every registered element in the project, keyed by _id, e.g. objectives.1.milestones.0
+
+    a path is computed when it is used, following the parents of the element up to the project in time of its
+    depth. The positions of the nested elements of a parent are looked up once, when a path through the parent
+    is used first. Only the parent of an element without _id or whose _id collides with another element is
+    stored, by the identity of the element.
+    """
+
+    def __init__(self, project: dict = None, by_id: dict = None, parent: dict = None):
+        """
+        :param dict project: the indexed project
+        :param dict by_id: every element by its _id, see build_element_index
+        :param dict parent: the parent of every nested registered element by its _id
+        """
+        self._project = project or {}
+        self._by_id = by_id if by_id is not None else {}
+        self._parent = parent if parent is not None else {}
+        # parent of the elements which are not in by_id, by id() of the element
+        self._unregistered = {}
+        # location (key.position) of the nested elements by id() of the element, by id() of the parent
+        self._locations = {}
+
+    def __getitem__(self, _id):
+        return self.get_path(self._by_id[_id])
+
+    def __iter__(self):
+        return iter(self._by_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add_unregistered(self, element: dict = None, parent: dict = None):
+        """
+        Add the parent of an element without _id or whose _id is already used by another element
+
+        :param dict element: element of the project
+        :param dict parent: the element the element belongs to, None for elements of the project
+        """
+        self._unregistered[id(element)] = parent
+
+    def get_parent(self, element: dict = None):
+        """
+        :param dict element: element of the project, also one whose _id collides with another element
+        :return: the element the element belongs to, None for elements of the project and unknown elements
+        :rtype: dict
+        """
+        _id = element.get("_id")
+        if self._by_id.get(_id) is element:
+            return self._parent.get(_id)
+        return self._unregistered.get(id(element))
+
+    def get_path(self, element: dict = None):
+        """
+        :param dict element: element of the project, also one whose _id collides with another element
+        :return: dotted path of the element, None if it is not part of the project
+        :rtype: str
+        """
+        parts = []
+        while element is not None:
+            _id = element.get("_id")
+            if self._by_id.get(_id) is not element and id(element) not in self._unregistered:
+                return None
+            parent = self.get_parent(element)
+            location = self._get_locations(parent if parent is not None else self._project).get(id(element))
+            if location is None:
+                return None
+            parts.append(location)
+            element = parent
+        return ".".join(reversed(parts))
+
+    def _get_locations(self, container: dict = None):
+        locations = self._locations.get(id(container))
+        if locations is None:
+            locations = {id(item): f"{key}.{position}" for key, position, item in _iter_child_items(container)}
+            self._locations[id(container)] = locations
+        return locations
+
+
+class ElementParentLookup:
+    """
+    index.parent_of(element): the parent of an element by its identity, see ElementPaths.get_parent
+
+    two lookups are equal if the paths of their indexes are equal
+    """
+
+    def __init__(self, paths: ElementPaths = None):
+        """
+        :param ElementPaths paths: the paths of the index
+        """
+        self._paths = paths
+
+    def __call__(self, element: dict = None):
+        return self._paths.get_parent(element)
+
+    def __eq__(self, other):
+        return isinstance(other, ElementParentLookup) and self._paths == other._paths
+
+    __hash__ = None
+
+
+def get_as_list_skip_keys(project: dict = None, element: dict = None):
+    """
+    The derived fields of an element of the project, which are not part of project["as_list"]
+
+    the fields added to the project by enrich_project, the embedded logo (logo.base64) and the converted
+    description (description_html) of every element with a description. Fields of the roadmap with the same
+    name somewhere else are part of the list.
+
+    :param dict project: enriched project
+    :param dict element: the project or a dict in it
+    :return: keys of the element which are left out of project["as_list"]
+    :rtype: tuple
+    """
+    skip_keys = _AS_LIST_SKIP_KEYS if element is project else ()
+    if element is project.get("logo"):
+        skip_keys += ("base64",)
+    if "description" in element:
+        skip_keys += ("description_html",)
+    return skip_keys
+
+
+def build_element_index(project: dict = None):
+    """
+    Index all elements of the project by type, across all nesting levels
+
+    for every element type (objectives, keyresults, milestones, deliverables, todos, timeline, releases):
+    - all: every element in document order, elements closer to the project root first
+    - by_state, by_date, by_requirement, by_tag: elements grouped by the value of the field,
+      elements without the field are left out
+    and the id registry, keyed by _id:
+    - by_id: every element
+    - path: the dotted path of the element in the project, e.g. objectives.1.milestones.0, see ElementPaths
+    - parent: the element each nested element belongs to
+    - children: the nested elements of an element, in document order, see ElementChildren
+    - collisions: _id, path and first path of every element whose _id was registered before,
+      e.g. the ids "A.B" and "A-B" both become a_b - by_id, path, parent and children keep the first element
+    and parent_of(element), the parent of an element by its identity, also of an element whose _id collides,
+    see ElementParentLookup.
+    The index contains the elements, not copies, so a template renders e.g. a kanban column in one pass
+    over index.milestones.by_state.IDEA instead of scanning all milestones of the project and the objectives.
+    Paths and children are computed when they are used, only by_id and parent are stored per element.
+
+    :param dict project: enriched roadmap data with ids, see calculate_ids_for_element_items
+    :return: index
+    :rtype: dict
+    """
+    index = {key: {"all": [], **{f"by_{field}": {} for field in INDEX_GROUP_FIELDS}} for key in _CHILD_ELEMENT_PREFIXES}
+    index.update(by_id={}, parent={}, collisions=[])
+    index.update(path=ElementPaths(project, index["by_id"], index["parent"]), children=ElementChildren(index["by_id"]))
+    index["parent_of"] = ElementParentLookup(index["path"])
+    # breadth first, e.g. the milestones of the project come before the milestones of its objectives
+    pending = deque((key, project[key], None) for key in _CHILD_ELEMENT_PREFIXES
+                    if isinstance((project or {}).get(key), list))
+    while pending:
+        key, items, parent = pending.popleft()
+        element_index = index[key]
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            element_index["all"].append(item)
+            _id = item.get("_id")
+            if _id is None or _id in index["by_id"]:
+                index["path"].add_unregistered(item, parent)
+                if _id is not None:
+                    path = index["path"].get_path(item)
+                    logging.warning(f"_id '{_id}' of {path} is already used by {index['path'][_id]}")
+                    index["collisions"].append({"_id": _id, "path": path, "first_path": index["path"][_id]})
+            else:
+                index["by_id"][_id] = item
+                if parent is not None:
+                    index["parent"][_id] = parent
+            for field in INDEX_GROUP_FIELDS:
+                if field in item:
+                    try:
+                        element_index[f"by_{field}"].setdefault(item[field], []).append(item)
+                    except TypeError:
+                        logging.debug(f"index: {key}.{field} '{item[field]}' is not groupable")
+            for child_key in _CHILD_ELEMENT_PREFIXES:
+                if isinstance(item.get(child_key), list):
+                    pending.append((child_key, item[child_key], item))
+    return index
+
+
+def get_jobsize(element: dict = None):
+    """
+    jobsize of an element, see docs/wsjf.md
+
+    :param dict element: element with optional quantifiers.jobsize
+    :return: quantifiers.jobsize if it is an integer of at least 1, DEFAULT_JOBSIZE otherwise
+    :rtype: int
+    """
+    jobsize = ((element or {}).get("quantifiers") or {}).get("jobsize")
+    if isinstance(jobsize, int) and not isinstance(jobsize, bool) and jobsize >= 1:
+        return jobsize
+    return DEFAULT_JOBSIZE
+
+
+def build_dependency_graph(index: dict = None):
+    """
+    Build the graph of the depends_on links between milestones, deliverables and keyresults
+
+    depends_on lists the ids of the elements which have to be finished before an element, across objectives
+    and milestones. A reference is resolved like an _id, e.g. "M1.D2" or "m1_d2" is the second deliverable of
+    the first milestone. Unknown references and references to other elements are logged and left out.
+    Only elements with at least one link are part of the graph:
+    - edges: source (the element depended on) and target (the depending element) as _id, critical if the edge
+      is part of the critical path
+    - depends_on and dependents: the linked elements of an element, keyed by its _id
+    - order: the elements in topological order, every element after the elements it depends on
+    - critical_path: the chain of dependent elements with the largest sum of jobsizes, see get_jobsize
+    - critical: the _ids of the critical path, length: the sum of its jobsizes
+    Everything is computed in linear time of elements and links.
+
+    :param dict index: index of the elements, see build_element_index
+    :return: dependency graph
+    :rtype: dict
+    :raises DependencyCycleError: if elements depend on each other in a cycle
+    """
+    index = index or {}
+    by_id = index.get("by_id") or {}
+    graph = {"edges": [], "depends_on": {}, "dependents": {}, "order": [], "critical_path": [], "critical": set(),
+             "length": 0}
+    linkable = {item.get("_id") for key in DEPENDENCY_ELEMENTS for item in (index.get(key) or {}).get("all", [])}
+    successors = {}
+    # the links already added, a set keeps checking for duplicates constant for elements with many dependents
+    links = set()
+    for key in DEPENDENCY_ELEMENTS:
+        for item in (index.get(key) or {}).get("all", []):
+            _id = item.get("_id")
+            for reference in item.get("depends_on") or []:
+                dependency_id = make_id_from(reference)
+                if dependency_id not in linkable:
+                    logging.warning(f"depends_on '{reference}' of {index.get('path', {}).get(_id, _id)} is not "
+                                    f"the id of a milestone, deliverable or keyresult")
+                    continue
+                if (dependency_id, _id) in links:
+                    continue
+                links.add((dependency_id, _id))
+                successors.setdefault(dependency_id, []).append(_id)
+                successors.setdefault(_id, [])
+                graph["edges"].append({"source": dependency_id, "target": _id, "critical": False})
+                graph["depends_on"].setdefault(_id, []).append(by_id[dependency_id])
+                graph["dependents"].setdefault(dependency_id, []).append(item)
+
+    # the linked elements in document order, see build_element_index
+    nodes = [_id for _id in by_id if _id in successors]
+    order = topological_order(nodes, successors)
+    path, length = critical_path(order, successors, {_id: get_jobsize(by_id[_id]) for _id in order})
+    graph["order"] = [by_id[_id] for _id in order]
+    graph["critical_path"] = [by_id[_id] for _id in path]
+    graph["critical"] = set(path)
+    graph["length"] = length
+    critical_edges = set(zip(path, path[1:]))
+    for edge in graph["edges"]:
+        edge["critical"] = (edge["source"], edge["target"]) in critical_edges
+    return graph
+
+
 def remove_element(element_name: str = "", project: dict = None):
     """
     Remove given element from project - we are working with project by reference
@@ -286,22 +598,36 @@ def remove_element(element_name: str = "", project: dict = None):
     _remove(project, parts)
 
 
-def enrich_project(project, skip_items, roadmap_definition_file):
+def enrich_project(project, skip_items, roadmap_definition_file, source=None):
     """
-    Enrich the project dict with computed fields:
+    Enrich the project dict in place with computed fields:
     - meta (version, rendertime)
     - IDs for all elements
     - WSJF quantifiers
     - grouped items by date
-    - flattened key-value list
+    - flattened key-value list, built when it is used first
+    - index of all elements by type, state, date, requirement and release tag, see build_element_index
+    - by_id: every element by its _id, see build_element_index for parent, children and _id collisions
+    - dependencies: order and critical path of the depends_on links, see build_dependency_graph
+    - ranking: keyresults and deliverables of all objectives and milestones by weighted shortest job first,
+      see ranking.Ranking
+
+    the elements are never copied: groups, the index and the flat list refer to the elements of the project,
+    so enrichment adds only the computed fields to the parsed roadmap
 
     :param dict project: roadmap data as dict
     :param str skip_items: comma-separated dotted paths of elements to skip
     :param str roadmap_definition_file: path to roadmap.yml (for version calculation)
+    :param YmlSource source: source the project was read from, its version is used instead of reading the file again
+    :raises DependencyCycleError: if elements depend on each other in a cycle
     """
     # add version and rendertime
+    if source is not None:
+        version = source.version
+    else:
+        version = calculate_roadmap_version(path_to_roadmap_yml=roadmap_definition_file)
     project['meta'] = {
-        "version": calculate_roadmap_version(path_to_roadmap_yml=roadmap_definition_file),
+        "version": version,
         "rendertime": time.strftime("%Y%m%d%H%M%S")
     }
     logging.info(f"version of roadmap.yml is '{project['meta']['version']}'")
@@ -315,26 +641,32 @@ def enrich_project(project, skip_items, roadmap_definition_file):
 
     # calculate IDs and group by date
     if "timeline" in project:
-        project['timeline'] = calculate_ids_for_element_items(project['timeline'], prefix="Timeline")
+        calculate_ids_for_element_items(project['timeline'], prefix="Timeline")
         project["group"]['timeline_by']['date'] = get_items_grouped_by_date(project["timeline"])
     else:
         del project["group"]['timeline_by']
 
     if "objectives" in project:
-        project['objectives'] = calculate_ids_for_element_items(project['objectives'], prefix="O")
+        calculate_ids_for_element_items(project['objectives'], prefix="O")
         project["group"]['objectives_by']['date'] = get_items_grouped_by_date(project["objectives"])
     else:
         del project["group"]['objectives_by']
 
     if "milestones" in project:
-        project['milestones'] = calculate_ids_for_element_items(project['milestones'], prefix="M")
+        calculate_ids_for_element_items(project['milestones'], prefix="M")
     if "releases" in project:
-        project['releases'] = calculate_ids_for_element_items(project['releases'], prefix="Release")
+        calculate_ids_for_element_items(project['releases'], prefix="Release")
 
     # remove skipped elements after all enrichment is complete
     if skip_items is not None:
         for skip in skip_items.replace(" ", "").split(","):
             remove_element(skip, project=project)
 
-    # flatten project to key-value list
-    project["as_list"] = get_key_value_list(element=project)
+    # flatten project to key-value list, only if a template uses it
+    project["as_list"] = LazyKeyValueList(project, get_skip_keys=functools.partial(get_as_list_skip_keys, project))
+
+    # index the elements after skipped elements are removed, the index is not part of the flat list
+    project["index"] = build_element_index(project)
+    project["by_id"] = project["index"]["by_id"]
+    project["dependencies"] = build_dependency_graph(project["index"])
+    project["ranking"] = Ranking(item for key in RANKING_ELEMENTS for item in project["index"][key]["all"])
@@ -0,0 +1,176 @@
+import os
+import time
+import logging
+import threading
+
+from .utils import calculate_file_hash
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# name of the advisory lock file in the output directory
+LOCK_FILE = ".roadmap.lock"
+# seconds between two attempts to get a lock which is held by another process (windows only)
+LOCK_RETRY_INTERVAL = 0.1
+
+
+def get_temp_file(output_file: str = ""):
+    """
+    Path of a temp file next to output_file, unique per process and thread
+
+    the temp file is in the same directory, so it can replace output_file atomically
+
+    :param str output_file: path of the output
+    :return: path of the temp file
+    :rtype: str
+    """
+    return f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def write_atomic(path: str = "", write=None, mode: str = "w"):
+    """
+    Write a file through a temp file which replaces it atomically
+
+    readers, also other processes, see either the old or the new content. If writing fails, the temp file
+    is removed, path is left untouched and the error is raised.
+
+    :param str path: path of the file
+    :param write: function writing the content into the open temp file, e.g. lambda f: json.dump(data, f)
+    :param str mode: mode of the temp file, "w" or "wb"
+    """
+    temp_file = get_temp_file(path)
+    try:
+        with open(temp_file, mode) as f:
+            write(f)
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+def replace_if_changed(temp_file: str = "", output_file: str = ""):
+    """
+    Move temp_file to output_file if the content differs, otherwise remove temp_file
+
+    an identical output_file is left untouched, so its mtime stays the same and sync tools do not copy it again.
+    A changed output_file is replaced atomically, readers see either the old or the new content.
+
+    :param str temp_file: path of the completely written temp file
+    :param str output_file: path of the output
+    :return: True if output_file was written, False if it was unchanged
+    :rtype: bool
+    """
+    if (os.path.exists(output_file) and os.path.getsize(output_file) == os.path.getsize(temp_file)
+            and calculate_file_hash(output_file) == calculate_file_hash(temp_file)):
+        os.remove(temp_file)
+        logging.debug(f"'{output_file}' is unchanged")
+        return False
+    os.replace(temp_file, output_file)
+    return True
+
+
+def write_output(output_file: str = "", chunks=(), buffer_size: int = -1):
+    """
+    Write chunks of text to output_file through a temp file, see replace_if_changed
+
+    if writing fails, e.g. because producing a chunk raised an error, the temp file is removed and
+    output_file is left untouched.
+
+    :param str output_file: path of the output
+    :param chunks: iterable of strings, e.g. Template.generate()
+    :param int buffer_size: size of the write buffer in bytes, -1 for the default of open()
+    :return: True if output_file was written, False if it was unchanged
+    :rtype: bool
+    """
+    temp_file = get_temp_file(output_file)
+    try:
+        with open(temp_file, "w", buffering=buffer_size) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return replace_if_changed(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+def _lock_file(f, blocking: bool = True):
+    """
+    Lock the open lock file f, return False if it is locked by someone else and blocking is False
+    """
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+    if msvcrt is not None:
+        while True:
+            try:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(LOCK_RETRY_INTERVAL)
+    # no advisory locks on this platform
+    return True
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class OutputDirectoryLock:
+    """
+    Advisory lock on an output directory, held while rendering into it
+
+    parallel runs (e.g. CI jobs) into the same output directory render one after another instead of
+    interleaving their writes and the render manifest. The lock is the file LOCK_FILE in the output directory,
+    it is released when the process ends, also if it crashed. Use it as context manager.
+    """
+
+    def __init__(self, output_folder: str = ""):
+        self.path = os.path.join(output_folder, LOCK_FILE)
+        self._file = None
+
+    def acquire(self):
+        """
+        Wait until the lock is free and take it
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a+")
+        if not _lock_file(self._file, blocking=False):
+            logging.info(f"waiting for lock '{self.path}' held by another run")
+            _lock_file(self._file, blocking=True)
+
+    def release(self):
+        """
+        Give the lock back, nothing happens if it is not held
+        """
+        if self._file is None:
+            return
+        try:
+            _unlock_file(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
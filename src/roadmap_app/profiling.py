@@ -0,0 +1,146 @@
+import cProfile
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+
+class Profiler:
+    """
+    Collect wall time, CPU time and peak memory of the pipeline stages and of every rendered template
+
+    - stages measure CPU time of the whole process, templates and nested stages of worker threads
+      measure the CPU time of their thread
+    - with cprofile_dir, every stage started from the main thread without an enclosing stage is profiled
+      with cProfile and dumped to '<cprofile_dir>/<number>-<stage>.prof'
+    - with trace_memory, tracemalloc is started and the peak memory of the whole run and of every stage
+      started from the main thread without an enclosing stage is reported
+
+    Stages and templates can be recorded from parallel threads.
+    """
+
+    def __init__(self, cprofile_dir: str = None, trace_memory: bool = False):
+        """
+        :param str cprofile_dir: directory for cProfile dumps, no dumps if not given
+        :param bool trace_memory: trace memory allocations with tracemalloc
+        """
+        self.cprofile_dir = cprofile_dir
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.templates = []
+        self._lock = threading.Lock()
+        self._active_stages = 0
+        self._started_tracemalloc = False
+        self._start_wall_time = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+        if cprofile_dir:
+            os.makedirs(cprofile_dir, exist_ok=True)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    @contextlib.contextmanager
+    def stage(self, name: str = "", **details):
+        """
+        Measure a stage of the pipeline, e.g. 'read', 'validate' or 'render'
+
+        :param str name: name of the stage
+        :param details: additional values reported with the stage, e.g. roadmap_file
+        """
+        is_main_thread = threading.current_thread() is threading.main_thread()
+        with self._lock:
+            # stages of the main thread without enclosing stage own the process: cProfile and peak memory
+            is_outermost = is_main_thread and self._active_stages == 0
+            self._active_stages += 1
+        clock = time.process_time if is_main_thread else time.thread_time
+
+        profile = None
+        if is_outermost and self.cprofile_dir:
+            profile = cProfile.Profile()
+        if is_outermost and self.trace_memory:
+            tracemalloc.reset_peak()
+
+        start_wall_time = time.perf_counter()
+        start_cpu_time = clock()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            record = {"name": name,
+                      "wall_time": time.perf_counter() - start_wall_time,
+                      "cpu_time": clock() - start_cpu_time}
+            if is_outermost and self.trace_memory:
+                record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            record.update(details)
+            with self._lock:
+                self._active_stages -= 1
+                if profile is not None:
+                    file_name = re.sub(r"[^\w.-]+", "_", f"{len(self.stages):03d}-{name}")
+                    record["cprofile"] = os.path.join(self.cprofile_dir, f"{file_name}.prof")
+                self.stages.append(record)
+            if profile is not None:
+                profile.dump_stats(record["cprofile"])
+
+    def add_template(self, timing: dict = None):
+        """
+        Record the timing of a rendered template
+
+        :param dict timing: dict with at least template, output_file, wall_time and cpu_time
+        """
+        with self._lock:
+            self.templates.append({key: timing[key] for key in ("template", "output_file", "wall_time", "cpu_time")})
+
+    def report(self):
+        """
+        Create the profiling report
+
+        :return: dict with total wall/CPU time, peak memory, stages and templates
+        :rtype: dict
+        """
+        report = {"wall_time": time.perf_counter() - self._start_wall_time,
+                  "cpu_time": time.process_time() - self._start_cpu_time,
+                  "peak_memory": None}
+        if self.trace_memory and tracemalloc.is_tracing():
+            # peaks of the stages are measured after a reset, the peak of the run is the largest of them
+            stage_peaks = [stage.get("peak_memory", 0) for stage in self.stages]
+            report["peak_memory"] = max(stage_peaks + [tracemalloc.get_traced_memory()[1]])
+        with self._lock:
+            report["stages"] = list(self.stages)
+            report["templates"] = list(self.templates)
+        return report
+
+    def write_report(self, path: str = ""):
+        """
+        Write the profiling report as JSON and stop tracing memory allocations
+
+        :param str path: path/to/profile.json
+        """
+        report = self.report()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def stage(profiler: Profiler = None, name: str = "", **details):
+    """
+    Measure a stage with the profiler, do nothing without profiler
+
+    :param Profiler profiler: profiler or None
+    :param str name: name of the stage
+    :param details: additional values reported with the stage
+    :return: context manager
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, **details)
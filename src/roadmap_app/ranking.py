@@ -0,0 +1,111 @@
+import heapq
+import math
+import threading
+from collections.abc import Sequence
+from itertools import islice
+
+
+def is_rankable(element: dict = None):
+    """
+    :param dict element: element with optional quantifiers
+    :return: True if quantifiers.weighted_shortest_job_first of the element is a number
+    :rtype: bool
+    """
+    wsjf = ((element or {}).get("quantifiers") or {}).get("weighted_shortest_job_first")
+    return isinstance(wsjf, (int, float)) and not isinstance(wsjf, bool)
+
+
+def get_rank_key(element: dict = None):
+    """
+    Sort key of a rankable element, the highest ranked element has the smallest key
+
+    elements are ranked by weighted_shortest_job_first, equal values by cost_of_delay (elements without
+    cost_of_delay last) and then by _id
+
+    :param dict element: element with quantifiers.weighted_shortest_job_first, see is_rankable
+    :return: sort key
+    :rtype: tuple
+    """
+    quantifiers = element["quantifiers"]
+    cost_of_delay = quantifiers.get("cost_of_delay")
+    if not isinstance(cost_of_delay, (int, float)) or isinstance(cost_of_delay, bool):
+        cost_of_delay = -math.inf
+    return -quantifiers["weighted_shortest_job_first"], -cost_of_delay, str(element.get("_id") or "")
+
+
+class Ranking(Sequence):
+    """
+    Elements ranked by weighted shortest job first, highest first, see get_rank_key
+
+    elements without weighted_shortest_job_first are left out, the ranked elements are not copied.
+    top(k) selects the k highest ranked elements with a heap in O(n log k), the full order is sorted once
+    when it is used first. Elements with equal keys keep the order in which they were given.
+    """
+
+    def __init__(self, elements=None):
+        """
+        :param elements: iterable of elements, e.g. all keyresults and deliverables of the project
+        """
+        # the position is the last part of the key, so elements are never compared themselves
+        rankable = (element for element in elements or () if is_rankable(element))
+        self._entries = [(get_rank_key(element), position, element) for position, element in enumerate(rankable)]
+        self._sorted = None
+        self._lock = threading.Lock()
+
+    def __getitem__(self, index):
+        return self._get_sorted()[index]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._get_sorted())
+
+    def __eq__(self, other):
+        if isinstance(other, Ranking):
+            other = other._get_sorted()
+        return self._get_sorted() == other
+
+    def __repr__(self):
+        # the elements are not sorted to represent the ranking
+        return f"Ranking({len(self._entries)} elements)"
+
+    def _get_sorted(self):
+        # templates may be rendered in parallel, the order is sorted once
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = [element for _, _, element in sorted(self._entries)]
+            return self._sorted
+
+    def top(self, k: int = None):
+        """
+        The k highest ranked elements
+
+        :param int k: number of elements, all elements if None
+        :return: elements in rank order
+        :rtype: list
+        """
+        if k is None:
+            return list(self._get_sorted())
+        if self._sorted is not None:
+            return self._sorted[:max(0, k)]
+        return [element for _, _, element in heapq.nsmallest(max(0, k), self._entries)]
+
+
+def merge_rankings(rankings=None, k: int = None):
+    """
+    Merge the rankings of several roadmaps into one ranking of a portfolio
+
+    every ranking only has to contribute its own k highest ranked elements, e.g. Ranking.top(k), so the k highest
+    ranked elements of R roadmaps are merged in O(R k) without keeping the roadmaps.
+    Elements with equal keys are ordered by the order of the rankings.
+
+    :param rankings: iterable of tuples of a source, e.g. the roadmap file, and its elements in rank order
+    :param int k: number of elements, all elements if None
+    :return: tuples of source and element in rank order
+    :rtype: list
+    """
+    merged = heapq.merge(*[[(get_rank_key(element), number, position, source, element)
+                            for position, element in enumerate(elements)]
+                           for number, (source, elements) in enumerate(rankings or ())])
+    return [(source, element) for *_, source, element in islice(merged, None if k is None else max(0, k))]
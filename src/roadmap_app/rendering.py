@@ -1,68 +1,72 @@
-import json
 import os
 import logging
 import subprocess
-import jsonschema
-from jsonschema import validate
-from jinja2 import FileSystemLoader, Environment, TemplateError
+import contextvars
+import threading
+from jinja2 import FileSystemLoader, Environment, TemplateError, TemplateNotFound, meta
+from jinja_markdown import MarkdownExtension
 from pathlib import Path
 
-from .utils import read_yml_to_dict
+from .utils import read_yml_to_dict, get_filtered_key_value_list
+from .cache import SharedBytecodeCache
+from .validation import validate_roadmap
+from .logs import summarize
+from .output import write_output
+from .graphviz import is_graphviz_installed, convert_dot
+from .svg import generate_roadmap_svg
+from .markdown_cache import MarkdownRenderer
 
+# default size of the write buffer of a rendered output file in bytes
+RENDER_BUFFER_SIZE = 64 * 1024
 
-def validate_yaml(roadmap_data: dict = None, path_to_json_schema: str = ""):
-    """
-    Validate roadmap-dictionary under the given jsonSchema
+# name of the template processed in the current thread - makes log records of parallel renders attributable
+current_template = contextvars.ContextVar("current_template", default="")
+# files loaded while processing the current template, None outside of process_template
+loaded_template_files = contextvars.ContextVar("loaded_template_files", default=None)
 
-    Return tuple, True: if conversion to dict was successfully
-    Return None, False: if conversion failed
 
-    :param dict roadmap_data: dictionary containing roadmap-data
-    :param str path_to_json_schema: path/to/schema/roadmap.json
-    :return: None/Error, validationResult as boolean
-    :rtype: tuple
+class TemplateLogFilter(logging.Filter):
     """
-    schema = None
-    instance = None
+    Add the name of the currently processed template to every log record as 'record.template'
 
-    try:
-        # Read Schema from File
-        with open(path_to_json_schema, "r") as f:
-            schema = f.read()
-        # Convert Schema to Python Dict
-        schema = json.loads(schema)
-        logging.debug(f"schema: {schema}")
-
-        # Convert ymlData to Python Dict
-        instance = json.loads(json.dumps(
-            roadmap_data, indent=4, sort_keys=True, default=str))
-        logging.debug(f"instance: {instance}")
-        validate(instance=instance, schema=schema)
-        return None, True
-    except jsonschema.exceptions.ValidationError as err:
-        logging.error(f"schema: {schema}")
-        logging.error(f"instance: {instance}")
-        logging.error(f"ValidationError: {err}")
-        return err, False
+    the attribute is empty outside of process_template, otherwise it is '[<template file>] '.
+    An attribute set before, e.g. by the thread which queued the record, is kept
+    """
+
+    def filter(self, record):
+        if getattr(record, "template", None) is not None:
+            return True
+        template_name = current_template.get()
+        record.template = f"[{template_name}] " if template_name else ""
+        return True
 
 
-def is_graphviz_installed():
+def validate_yaml(roadmap_data: dict = None, path_to_json_schema: str = "", all_errors: bool = False,
+                  cache_path: str = None):
     """
-    Check if graphviz is installed in current environment
+    Validate roadmap-dictionary under the given jsonSchema
 
-    uses 'dot -V' and check for 'graphviz version' string in output
+    Return None, True: if roadmap-data is valid
+    Return Error, False: if roadmap-data is not valid, with all_errors a list of all errors
 
-    :return: True if dot is installed, False if dot is not installed
-    :rtype: bool
+    The schema is compiled once per process, see validation.get_validator
+
+    :param dict roadmap_data: dictionary containing roadmap-data
+    :param str path_to_json_schema: path/to/schema/roadmap.json
+    :param bool all_errors: collect all errors instead of the most relevant one
+    :param str cache_path: directory for checked schemas, e.g. CACHE_PATH/schema
+    :return: None/Error, validationResult as boolean
+    :rtype: tuple
     """
-    try:
-        graphviz_version = subprocess.check_output(['dot', '-V'], stderr=subprocess.STDOUT)
-        if "graphviz version" in str(graphviz_version):
-            return True
-    except FileNotFoundError:
-        return False
+    errors = validate_roadmap(roadmap_data, path_to_json_schema, all_errors=all_errors, cache_path=cache_path)
+    if not errors:
+        return None, True
 
-    return False
+    for err in errors:
+        # the string of a ValidationError contains the whole schema and instance, only the message is logged
+        logging.error("ValidationError: %s (at %s)", summarize(err.message), err.json_path)
+        logging.debug("failed validating %r in schema %s", err.validator, summarize(err.schema))
+    return (errors if all_errors else errors[0]), False
 
 
 def _resolve_output_paths(output_name: str, global_output_path: str):
@@ -127,6 +131,7 @@ def _find_templates_from_manifest(template_path, template_known_suffixes, global
                 "output_file": output_file,
                 "output_file_basename": output_file_basename,
                 "output_path": output_file_path,
+                "output_name": template["output"],
                 "suffix": input_file_suffix,
                 "type": input_file_type
             })
@@ -167,6 +172,7 @@ def _find_templates_from_directory(template_path, template_known_suffixes, globa
                         "output_file": output_file,
                         "output_file_basename": output_file_basename,
                         "output_path": output_file_path,
+                        "output_name": file,
                         "suffix": input_file_suffix,
                         "type": Path(dirname).parts[-1]
                     })
@@ -196,19 +202,348 @@ def find_templates(template_path: str = "", template_known_suffixes: list = None
     else:
         templates = _find_templates_from_directory(template_path, template_known_suffixes, global_output_path)
 
-    logging.debug(f"templates: {templates}")
+    logging.debug("templates: %s", summarize(templates))
     return templates
 
 
+def relocate_templates(templates: list = None, global_output_path: str = ""):
+    """
+    Copy templates from find_templates with their output paths moved to another output directory
+
+    used to render several roadmaps with one discovery of the templates
+
+    :param list templates: templates from find_templates
+    :param str global_output_path: global directory for template-rendering-output
+    :return: templates
+    :rtype: list
+    """
+    relocated = []
+    for template in templates or []:
+        output_file, output_file_path, output_file_basename = _resolve_output_paths(
+            template["output_name"], global_output_path)
+        relocated.append(dict(template, output_file=output_file, output_path=output_file_path,
+                              output_file_basename=output_file_basename))
+    return relocated
+
+
+class TrackingFileSystemLoader(FileSystemLoader):
+    """
+    FileSystemLoader which records the filename of every template it loads in loaded_template_files
+
+    used to know which files (template, includes, css...) a rendered output depends on,
+    if the loader is not shared between templates
+    """
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        loaded_files = loaded_template_files.get()
+        if loaded_files is not None:
+            loaded_files.add(filename)
+        return source, filename, uptodate
+
+
+class ThreadSafeMarkdownExtension(MarkdownExtension):
+    """
+    MarkdownExtension which converts with the MarkdownRenderer of the Environment
+
+    the converter of MarkdownExtension is stateful and shared by all templates of an Environment,
+    which breaks if the Environment is used by parallel renders. The MarkdownRenderer has one converter
+    per thread and caches converted texts, EnvironmentPool shares one renderer between all its Environments
+    """
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(markdown_renderer=MarkdownRenderer())
+
+    def _render_markdown(self, caller):
+        return self.environment.markdown_renderer.convert(self._dedent(caller()))
+
+
+class RenderStats:
+    """
+    Thread-safe counters of template resolutions
+
+    - include_resolutions: {% include %} / {% import %} / {% extends %} statements resolved while rendering
+    - source_loads: template sources read from the filesystem
+    - uptodate_checks: checks of cached templates against the filesystem (one os.stat each)
+    """
+
+    KEYS = ("include_resolutions", "source_loads", "uptodate_checks")
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.KEYS, 0)
+        self._lock = threading.Lock()
+
+    def increment(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def as_dict(self):
+        """
+        :return: copy of the counters
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._counts)
+
+
+class CountingFileSystemLoader(FileSystemLoader):
+    """
+    FileSystemLoader which counts source loads and uptodate checks in a RenderStats object
+    """
+
+    def __init__(self, searchpath, stats: RenderStats = None, encoding="utf-8", followlinks=False):
+        super().__init__(searchpath, encoding=encoding, followlinks=followlinks)
+        self.stats = stats or RenderStats()
+        # sources read ahead of loading their template, see prefetch_source
+        self._prefetched = {}
+
+    def prefetch_source(self, environment, template):
+        """
+        Read the source of a template, the following load of the template uses it instead of reading it again
+
+        :return: source, filename and uptodate function like get_source
+        :rtype: tuple
+        """
+        source = self.get_source(environment, template)
+        self._prefetched[template] = source
+        return source
+
+    def discard_prefetched(self, template):
+        """
+        Forget the prefetched source of a template, e.g. if the template was taken from the cache of the Environment
+        """
+        self._prefetched.pop(template, None)
+
+    def get_source(self, environment, template):
+        prefetched = self._prefetched.pop(template, None)
+        if prefetched is not None:
+            return prefetched
+        source, filename, uptodate = super().get_source(environment, template)
+        self.stats.increment("source_loads")
+
+        def counting_uptodate():
+            self.stats.increment("uptodate_checks")
+            return uptodate()
+
+        return source, filename, counting_uptodate
+
+
+# globals of every Environment rendering roadmap templates, pooled or not
+ROADMAP_GLOBALS = {
+    "roadmap_graph_svg": generate_roadmap_svg,
+    "get_filtered_key_value_list": get_filtered_key_value_list,
+}
+
+
+class RoadmapEnvironment(Environment):
+    """
+    Environment which records the filename of every template it loads in loaded_template_files
+
+    in contrast to TrackingFileSystemLoader templates from the cache of the Environment are recorded, too.
+    Include resolutions are counted in stats.
+    Templates can draw the roadmap graph without graphviz with the global roadmap_graph_svg(project)
+    and filter project.as_list with the global get_filtered_key_value_list, see KeyValueIndex.
+    """
+
+    def __init__(self, stats: RenderStats = None, **options):
+        super().__init__(**options)
+        self.stats = stats or RenderStats()
+        self.globals.update(ROADMAP_GLOBALS)
+
+    def get_template(self, name, parent=None, globals=None):
+        # templates loaded from a template (include, import, extends) have a parent
+        if parent is not None:
+            self.stats.increment("include_resolutions")
+        return super().get_template(name, parent, globals)
+
+    def _load_template(self, name, globals):
+        template = super()._load_template(name, globals)
+        loaded_files = loaded_template_files.get()
+        if loaded_files is not None:
+            loaded_files.add(template.filename)
+        return template
+
+
+class EnvironmentPool:
+    """
+    Jinja2 Environments keyed by the resolved search paths of templates
+
+    all templates with the same search paths share one Environment and its template cache,
+    all Environments share one bytecode cache, so each file is compiled once per process,
+    even if it is loaded by Environments with different search paths (e.g. html/roadmap.css).
+    The pool is safe to use from parallel renders.
+
+    In production mode the Environments do not check cached templates against the filesystem
+    (auto_reload off) and keep every template they loaded, after preload() of the templates of the outputs
+    an include inside a loop is a dictionary lookup instead of an os.stat per item.
+    All Environments convert {% markdown %} blocks with one MarkdownRenderer, so a text is converted once
+    for all templates.
+    """
+
+    def __init__(self, bytecode_cache=None, extensions=(ThreadSafeMarkdownExtension,), production: bool = False,
+                 markdown_renderer: MarkdownRenderer = None):
+        """
+        :param bytecode_cache: optional persistent cache for compiled templates, used below the in-memory cache
+        :param extensions: Jinja2 extensions of every Environment
+        :param bool production: disable reload checks of cached templates
+        :param MarkdownRenderer markdown_renderer: converts the {% markdown %} blocks of all Environments,
+            an in-memory renderer is created if not given
+        """
+        self.bytecode_cache = SharedBytecodeCache(persistent=bytecode_cache)
+        self.extensions = list(extensions)
+        self.production = production
+        self.markdown_renderer = markdown_renderer or MarkdownRenderer()
+        self.stats = RenderStats()
+        self._environments = {}
+        self._preloaded = set()
+        self._lock = threading.Lock()
+
+    def get_environment(self, search_paths: list = None):
+        """
+        Get the Environment for the given search paths, create it on first use
+
+        :param list search_paths: directories the loader searches for templates
+        :return: Environment shared by all templates with the same search paths
+        :rtype: RoadmapEnvironment
+        """
+        key = tuple(Path(path).resolve().as_posix() for path in search_paths)
+        with self._lock:
+            environment = self._environments.get(key)
+            if environment is None:
+                environment = RoadmapEnvironment(stats=self.stats,
+                                                 loader=CountingFileSystemLoader(list(key), stats=self.stats),
+                                                 extensions=self.extensions,
+                                                 bytecode_cache=self.bytecode_cache,
+                                                 auto_reload=not self.production,
+                                                 # never evict a loaded template in production mode
+                                                 cache_size=-1 if self.production else 400)
+                environment.markdown_renderer = self.markdown_renderer
+                self._environments[key] = environment
+        return environment
+
+    def preload(self, search_paths: list = None, names: list = None):
+        """
+        Load templates and the templates they include, import or extend into the Environment for the search paths
+
+        with names only these templates, e.g. the templates of the outputs, and the templates reachable from them
+        are loaded, otherwise every template in the search paths. Every source is read once, files which are no
+        valid templates (e.g. binary files) are skipped, templates which were preloaded before are not loaded again.
+        Templates referenced by a dynamic name are loaded when they are rendered.
+
+        :param list search_paths: directories the loader searches for templates
+        :param list names: names of the templates to start from, all templates of the search paths if not given
+        :return: number of loaded templates
+        :rtype: int
+        """
+        environment = self.get_environment(search_paths)
+        pending = list(environment.list_templates() if names is None else names)
+        loaded = 0
+        while pending:
+            name = pending.pop()
+            with self._lock:
+                if (environment, name) in self._preloaded:
+                    continue
+                self._preloaded.add((environment, name))
+            try:
+                source, filename, _ = environment.loader.prefetch_source(environment, name)
+                try:
+                    environment.get_template(name)
+                finally:
+                    environment.loader.discard_prefetched(name)
+                references = meta.find_referenced_templates(environment.parse(source, name, filename))
+            except TemplateNotFound as err:
+                logging.debug(f"preloading '{name}' from {search_paths}: template {err} not found")
+                continue
+            except (TemplateError, UnicodeDecodeError) as err:
+                logging.warning(f"preloading '{name}' from {search_paths} failed: {err}")
+                continue
+            loaded += 1
+            pending.extend(reference for reference in references if reference is not None)
+        return loaded
+
+
+def get_template_search_paths(template: dict = None):
+    """
+    Get the directories the loader searches for the template and its includes
+
+    the template directory comes first, the html/ sibling directory is added as fallback
+    for shared assets (CSS, JS)
+
+    :param dict template: template from find_templates
+    :return: list of directories
+    :rtype: list
+    """
+    search_paths = [template["path"]]
+    html_path = str(Path(template["path"]).parent / "html")
+    if html_path != template["path"] and Path(html_path).is_dir():
+        search_paths.append(html_path)
+    return search_paths
+
+
+def get_render_buffer_size(config: dict = None):
+    """
+    Resolve the size of the write buffer for rendered output files, configured by RENDER_BUFFER_SIZE
+
+    :param dict config: configuration dictionary, may contain RENDER_BUFFER_SIZE
+    :return: buffer size in bytes, at least 1
+    :rtype: int
+    """
+    try:
+        buffer_size = int((config or {}).get("RENDER_BUFFER_SIZE") or RENDER_BUFFER_SIZE)
+    except ValueError:
+        raise ValueError(f"RENDER_BUFFER_SIZE must be an integer, got '{config.get('RENDER_BUFFER_SIZE')}'")
+    return max(1, buffer_size)
+
+
+def stream_template_to_file(template_file=None, output_file: str = "", buffer_size: int = RENDER_BUFFER_SIZE,
+                            source: list = None, **context):
+    """
+    Render a template chunk by chunk into output_file, the output is never held as a whole in memory
+
+    the chunks of Template.generate are written through a buffered writer to a temp file next to output_file,
+    which replaces output_file when rendering is finished and the content changed, see output.write_output.
+    If rendering fails, the temp file is removed and an existing output_file is left untouched.
+
+    :param Template template_file: loaded Jinja2 template
+    :param str output_file: path of the rendered output
+    :param int buffer_size: size of the write buffer in bytes
+    :param list source: the rendered chunks are also appended to this list, e.g. to pipe a dot output to graphviz
+    :param context: template variables, e.g. project
+    :return: True if output_file was written, False if it was unchanged
+    :rtype: bool
+    """
+    chunks = template_file.generate(**context)
+    if source is not None:
+        chunks = _collect_chunks(chunks, source)
+    return write_output(output_file, chunks, buffer_size=buffer_size)
+
+
+def _collect_chunks(chunks, source: list):
+    for chunk in chunks:
+        source.append(chunk)
+        yield chunk
+
+
 def process_template(
         environment: Environment = None,
         template: dict = None,
         roadmap_definition_file: str = "",
-        project=None
+        project=None,
+        environment_pool: EnvironmentPool = None,
+        profiler=None,
+        written_files: list = None,
+        buffer_size: int = RENDER_BUFFER_SIZE,
+        graphviz=None,
+        conversions: list = None
 ):
     """
     Process the template and write rendered output-data to filesystem.
 
+    If an environment_pool is given, the template is rendered with the pooled Environment for its search paths,
+    otherwise an overlay of environment with a loader for the search paths and ROADMAP_GLOBALS is used.
+    The output of a dot template is piped to graphviz, by the background threads of graphviz if given.
+
     :param environment: Jinja2 Environment object for template rendering.
     :type environment: Environment, optional
     :param template: Dictionary containing the template data.
@@ -217,7 +552,22 @@ def process_template(
     :type roadmap_definition_file: str, optional
     :param project: Roadmap data as a dictionary.
     :type project: dict, optional
-    :return: None
+    :param environment_pool: pool of Environments shared by all templates
+    :type environment_pool: EnvironmentPool, optional
+    :param profiler: measures the graphviz stage
+    :type profiler: Profiler, optional
+    :param written_files: the output files (and the converted outputs of a dot template) are appended
+        if processing succeeded
+    :type written_files: list, optional
+    :param buffer_size: size of the write buffer of the output file in bytes
+    :type buffer_size: int, optional
+    :param graphviz: converts dot outputs in the background, dot outputs are converted to png synchronously if not given
+    :type graphviz: GraphvizConverter, optional
+    :param conversions: with graphviz, the Future of the conversion is appended instead of waiting for it,
+        its converted outputs are not appended to written_files
+    :type conversions: list, optional
+    :return: absolute paths of all files loaded for rendering, also if processing failed afterwards
+    :rtype: list
     """
     # Set default template and environment if not provided
     if environment is None:
@@ -225,16 +575,21 @@ def process_template(
     if template is None:
         raise ValueError("Template file not given!")
 
+    # every log record written while processing this template is tagged with its name
+    context_token = current_template.set(template["file"])
+    loaded_files = set()
+    loaded_files_token = loaded_template_files.set(loaded_files)
+    output_files = []
     try:
         # Render the template and write the output file.
-        search_paths = [template["path"]]
-        # Add html/ sibling directory as fallback for shared assets (CSS, JS)
-        html_path = str(Path(template["path"]).parent / "html")
-        if html_path != template["path"] and Path(html_path).is_dir():
-            search_paths.append(html_path)
-        environment.loader = FileSystemLoader(search_paths)
+        search_paths = get_template_search_paths(template)
+        if environment_pool is not None:
+            environment = environment_pool.get_environment(search_paths)
+        else:
+            environment = environment.overlay(loader=TrackingFileSystemLoader(search_paths))
+            # the overlay gets its own globals, the globals of the given environment take precedence
+            environment.globals = {**ROADMAP_GLOBALS, **environment.globals}
         template_file = environment.get_template(template["file"])
-        rendered_template = template_file.render(project=project)
         output_basename = template["output_file_basename"]
         output_file = template["output_file"]
         output_path = template["output_path"]
@@ -243,29 +598,48 @@ def process_template(
         if not Path(output_path).exists():
             Path(output_path).mkdir(parents=True, exist_ok=True)
 
-        with open(output_file, "w") as f:
-            f.write(rendered_template)
+        # the rendered dot source is kept to pipe it to graphviz
+        dot_source = [] if template["suffix"] == "dot" else None
+        stream_template_to_file(template_file, output_file, buffer_size=buffer_size, source=dot_source,
+                                project=project)
+        output_files.append(output_file)
 
         # If the template is a dot file, try converting it to png
         if template["suffix"] == "dot":
+            # the dot output is written, it is kept and recorded if there is nothing to convert it with
+            if graphviz is not None and not graphviz.formats:
+                logging.debug(f"GRAPHVIZ_FORMATS is empty - '{output_file}' is not converted")
             # first check if we have graphviz installed
-            if is_graphviz_installed():
-                output_png = os.path.join(
-                    template["output_path"], f"{output_basename}.dot.png")
-                # log info about converting
-                logging.info(f"rendering '{output_file}' to '{output_png}'")
-                subprocess.check_call(
-                    ['dot', '-Tpng', output_file, '-o', output_png])
-            # if 'dot -V' failed, we assume that graphviz is not installed
+            elif is_graphviz_installed():
+                output_stem = os.path.join(template["output_path"], f"{output_basename}.dot")
+                template_name = os.path.join(template['path'], template['file'])
+                if graphviz is None:
+                    output_files.extend(convert_dot("".join(dot_source), output_stem, profiler=profiler,
+                                                    template_name=template_name))
+                else:
+                    conversion = graphviz.submit("".join(dot_source), output_stem, template_name)
+                    if conversions is None:
+                        output_files.extend(conversion.result())
+                    else:
+                        conversions.append(conversion)
+            # if 'dot -V' failed, we assume that graphviz is not installed, the dot output is still recorded
             else:
-                raise EnvironmentError(
+                skipped_formats = graphviz.formats if graphviz is not None else ["png"]
+                logging.error(
                     "graphviz not installed \n"
                     "   dot-template processed\n"
-                    "   png rendering skipped \n"
+                    f"   {', '.join(skipped_formats)} rendering skipped \n"
                     "   follow https://www.graphviz.org/ for install instructions")
 
         logging.info(f"processed '{roadmap_definition_file}' with template "
                      f"'{os.path.join(template['path'], template['file'])}' to '{output_file}'")
+        if written_files is not None:
+            written_files.extend(output_files)
 
-    except (TemplateError, OSError, subprocess.CalledProcessError) as err:
+    except (TemplateError, OSError, subprocess.SubprocessError) as err:
         logging.error(f"processing template '{os.path.join(template['path'], template['file'])}' failed: {err}")
+    finally:
+        current_template.reset(context_token)
+        loaded_template_files.reset(loaded_files_token)
+
+    return sorted(loaded_files)
@@ -0,0 +1,215 @@
+import html
+
+# size of a node in px
+NODE_WIDTH = 160
+NODE_HEIGHT = 28
+# horizontal space between two clusters and vertical space between two nodes of a cluster in px
+GAP_X = 40
+GAP_Y = 8
+# space between a cluster border and its nodes, indentation of the children of a cluster in px
+CLUSTER_PADDING = 8
+CHILD_INDENT = 16
+# space around the graph, above a row and between two rows in px
+MARGIN = 20
+ROW_HEADER = 24
+ROW_GAP = 32
+POINT_RADIUS = 4
+FONT_SIZE = 10
+# longest node label, longer titles are truncated - the full title is the tooltip of the node
+LABEL_MAX_LENGTH = 28
+
+# rows of the graph: a chain of root elements, each in a cluster with the children of these keys
+GRAPH_ROWS = (
+    ("objectives", "Objectives", ("keyresults", "milestones")),
+    ("milestones", "Milestones", ("deliverables",)),
+)
+ROOT_COLOR = "orange"
+# fill color by state of an element, like templates/dot/roadmap.dot
+STATE_COLORS = {
+    "DOING": "lightblue",
+    "COMMITTED": "lightblue",
+    "DONE": "palegreen",
+    "REACHED": "palegreen",
+    "ACHIEVED": "palegreen",
+    "SKIP": "pink",
+}
+DEFAULT_COLOR = "lightgrey"
+DONE_STATES = ("DONE", "REACHED", "ACHIEVED")
+
+
+def _get_label(item: dict = None):
+    label = str(item.get("title") or item.get("_id") or "")
+    if item.get("state") in DONE_STATES:
+        label = "✓ " + label
+    if len(label) > LABEL_MAX_LENGTH:
+        label = label[:LABEL_MAX_LENGTH - 1].rstrip() + "…"
+    return label
+
+
+def _make_node(item: dict, x: float, y: float, width: float, color: str):
+    return {"id": item.get("_id", ""),
+            "label": _get_label(item),
+            "tooltip": str(item.get("description") or item.get("title") or "").strip(),
+            "x": x, "y": y, "width": width, "height": NODE_HEIGHT,
+            "color": color}
+
+
+def _make_point(point_id: str, x: float, y: float, tooltip: str):
+    return {"id": point_id, "label": "", "tooltip": tooltip,
+            "x": x - POINT_RADIUS, "y": y - POINT_RADIUS, "width": 2 * POINT_RADIUS, "height": 2 * POINT_RADIUS,
+            "color": "black", "point": True}
+
+
+def _layout_row(items: list, child_keys: tuple, top: float, row_id: str):
+    """
+    Lay out one row: start point, one cluster per root element in list order, end point
+
+    :return: nodes, edges, clusters, width and height of the row
+    :rtype: tuple
+    """
+    nodes = []
+    clusters = []
+    edges = []
+    root_y = top + CLUSTER_PADDING
+    chain_y = root_y + NODE_HEIGHT / 2
+    start = _make_point(f"{row_id}_start", MARGIN + POINT_RADIUS, chain_y, "This is the start of your roadmap.")
+    nodes.append(start)
+
+    positions = {start["id"]: start}
+    x = MARGIN + 2 * POINT_RADIUS + GAP_X
+    height = NODE_HEIGHT + 2 * CLUSTER_PADDING
+    for item in items:
+        root = _make_node(item, x + CLUSTER_PADDING, root_y, NODE_WIDTH + CHILD_INDENT, ROOT_COLOR)
+        nodes.append(root)
+        positions[root["id"]] = root
+        # the chain follows _previous_id, the first element follows the start point
+        edges.append({"source": item.get("_previous_id") or start["id"], "target": root["id"], "type": "chain"})
+
+        child_y = root_y
+        for key in child_keys:
+            for child in item.get(key) or []:
+                child_y += NODE_HEIGHT + GAP_Y
+                node = _make_node(child, x + CLUSTER_PADDING + CHILD_INDENT, child_y, NODE_WIDTH,
+                                  STATE_COLORS.get(child.get("state"), DEFAULT_COLOR))
+                nodes.append(node)
+                positions[node["id"]] = node
+                edges.append({"source": node["id"], "target": child.get("_parent_id") or root["id"],
+                              "type": "parent"})
+        cluster_height = child_y + NODE_HEIGHT + CLUSTER_PADDING - top
+        clusters.append({"id": f"cluster_{root['id']}", "x": x, "y": top,
+                         "width": NODE_WIDTH + CHILD_INDENT + 2 * CLUSTER_PADDING, "height": cluster_height})
+        height = max(height, cluster_height)
+        x += NODE_WIDTH + CHILD_INDENT + 2 * CLUSTER_PADDING + GAP_X
+
+    end = _make_point(f"{row_id}_end", x + POINT_RADIUS, chain_y, "This is the end of your roadmap.")
+    nodes.append(end)
+    positions[end["id"]] = end
+    edges.append({"source": root["id"], "target": end["id"], "type": "chain"})
+
+    for edge in edges:
+        edge["points"] = _route_edge(edge, positions)
+    return nodes, [edge for edge in edges if edge["points"]], clusters, x + 2 * POINT_RADIUS + MARGIN, height
+
+
+def _route_edge(edge: dict, positions: dict):
+    """
+    Points of an edge: chain edges run from the right of the previous to the left of the next element,
+    parent edges from the left of a child along the indentation of its cluster up to the bottom of its parent
+    """
+    source = positions.get(edge["source"])
+    target = positions.get(edge["target"])
+    if source is None or target is None:
+        return []
+    if edge["type"] == "chain":
+        return [(source["x"] + source["width"], source["y"] + source["height"] / 2),
+                (target["x"], target["y"] + target["height"] / 2)]
+    spine_x = source["x"] - CHILD_INDENT / 2
+    return [(source["x"], source["y"] + source["height"] / 2),
+            (spine_x, source["y"] + source["height"] / 2),
+            (spine_x, target["y"] + target["height"])]
+
+
+def layout_roadmap_graph(project: dict = None):
+    """
+    Lay out the objective/keyresult/milestone graph of templates/dot/roadmap.dot without graphviz
+
+    every row is a chain of root elements (objectives, milestones) in list order linked by _previous_id,
+    each root is a cluster with its children (keyresults and milestones of an objective, deliverables of
+    a milestone) linked by _parent_id. The layout runs in linear time of the number of elements.
+
+    :param dict project: enriched roadmap project data, see enrich_project
+    :return: dict with width, height, nodes, edges and clusters; positions in px
+    :rtype: dict
+    """
+    project = project or {}
+    layout = {"width": 0, "height": 0, "nodes": [], "edges": [], "clusters": [], "rows": []}
+    top = MARGIN + ROW_HEADER
+    for key, title, child_keys in GRAPH_ROWS:
+        items = project.get(key)
+        if not items:
+            continue
+        nodes, edges, clusters, width, height = _layout_row(items, child_keys, top + ROW_HEADER, key)
+        layout["rows"].append({"title": title, "x": MARGIN, "y": top + ROW_HEADER / 2})
+        layout["nodes"].extend(nodes)
+        layout["edges"].extend(edges)
+        layout["clusters"].extend(clusters)
+        layout["width"] = max(layout["width"], width)
+        top += ROW_HEADER + height + ROW_GAP
+    layout["width"] = max(layout["width"], 2 * MARGIN + NODE_WIDTH)
+    layout["height"] = top + ROW_HEADER
+    return layout
+
+
+def _attribute(value):
+    return html.escape(str(value), quote=True)
+
+
+def _number(value: float):
+    # no exponent notation for wide graphs
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def generate_roadmap_svg(project: dict = None):
+    """
+    Draw the graph of layout_roadmap_graph as SVG
+
+    the SVG is generated element by element, so a large graph can be streamed to disk.
+    Used by templates/svg/roadmap.svg as roadmap_graph_svg(project).
+
+    :param dict project: enriched roadmap project data, see enrich_project
+    :return: generator of SVG chunks
+    :rtype: Generator
+    """
+    project = project or {}
+    layout = layout_roadmap_graph(project)
+    width, height = _number(layout["width"]), _number(layout["height"])
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'viewBox="0 0 {width} {height}" font-family="Arial" font-size="{FONT_SIZE}">\n')
+    yield f'<title>{_attribute(project.get("title", ""))}</title>\n'
+    yield (f'<text x="{_number(layout["width"] / 2)}" y="{MARGIN}" text-anchor="middle" font-size="14">'
+           f'{_attribute(project.get("title", ""))}</text>\n')
+    for row in layout["rows"]:
+        yield (f'<text x="{_number(row["x"])}" y="{_number(row["y"])}" font-weight="bold">'
+               f'{_attribute(row["title"])}</text>\n')
+    for cluster in layout["clusters"]:
+        yield (f'<rect id="{_attribute(cluster["id"])}" x="{_number(cluster["x"])}" y="{_number(cluster["y"])}" '
+               f'width="{_number(cluster["width"])}" height="{_number(cluster["height"])}" rx="4" '
+               f'fill="none" stroke="grey" stroke-width="0.6"/>\n')
+    for edge in layout["edges"]:
+        points = " ".join(f"{_number(x)},{_number(y)}" for x, y in edge["points"])
+        stroke = 'stroke="black"' if edge["type"] == "chain" else 'stroke="grey" stroke-width="0.6"'
+        yield f'<polyline points="{points}" fill="none" {stroke}/>\n'
+    for node in layout["nodes"]:
+        yield f'<g id="{_attribute(node["id"])}"><title>{_attribute(node["tooltip"])}</title>'
+        if node.get("point"):
+            yield (f'<circle cx="{_number(node["x"] + POINT_RADIUS)}" cy="{_number(node["y"] + POINT_RADIUS)}" '
+                   f'r="{POINT_RADIUS}" fill="{node["color"]}"/></g>\n')
+            continue
+        yield (f'<rect x="{_number(node["x"])}" y="{_number(node["y"])}" width="{_number(node["width"])}" '
+               f'height="{_number(node["height"])}" fill="{node["color"]}"/>'
+               f'<text x="{_number(node["x"] + 4)}" y="{_number(node["y"] + NODE_HEIGHT / 2 + FONT_SIZE / 3)}">'
+               f'{_attribute(node["label"])}</text></g>\n')
+    meta = project.get("meta") or {}
+    yield (f'<text x="{MARGIN}" y="{_number(layout["height"] - MARGIN / 2)}" font-size="7">'
+           f'version: {_attribute(meta.get("version", ""))}/{_attribute(meta.get("rendertime", ""))}</text>\n')
+    yield '</svg>\n'
@@ -1,34 +1,127 @@
+import os
+import mmap
 import yaml
 import logging
 import hashlib
 import base64
+import threading
+from collections.abc import Sequence
 from pathlib import Path
 
+from .logs import summarize
 
-def read_yml_to_dict(path_to_yml: str = ""):
+# C-accelerated safe loader if PyYAML is built with libyaml, otherwise the pure-Python safe loader
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# files of at least this size in bytes are memory-mapped instead of read into a buffer
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def load_yml(content=b""):
     """
-    Read some yml file and return this as a dict
+    Parse YAML content with YAML_LOADER
 
-    Return Dict: if conversion to dict was successfully
-    Return None: if conversion failed
+    the safe loader constructs the same values as yaml.FullLoader (e.g. dates), only python-specific
+    tags like '!!python/tuple' are unknown to it - content using them is parsed with yaml.FullLoader
+
+    :param content: YAML content as str, bytes or a readable buffer like mmap
+    :return: parsed content
+    """
+    try:
+        return yaml.load(content, Loader=YAML_LOADER)
+    except yaml.constructor.ConstructorError:
+        if hasattr(content, "seek"):
+            content.seek(0)
+        return yaml.load(content, Loader=yaml.FullLoader)
+
+
+class YmlSource:
+    """
+    A YAML file read once: its parsed data with hash, size and modification time of the content it was parsed from
+
+    later stages use the source instead of the file, e.g. the version of the roadmap or the key of
+    the validation result cache, so the file is never read again and can not change in between
+    """
+
+    def __init__(self, path: str = "", data=None, file_hash: str = "", size: int = 0, mtime_ns: int = 0):
+        self.path = path
+        self.data = data
+        self.hash = file_hash
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @property
+    def version(self):
+        """
+        Version of the file: first and last 4 characters of its md5 hash, see calculate_roadmap_version
+
+        :rtype: str
+        """
+        return self.hash[0:4] + self.hash[-4:]
+
+
+def _parse_yml(path_to_yml, content, file_hash: str, cache=None):
+    """
+    Parse YAML content, with a cache an unchanged file is not parsed again, see cache.ParsedYamlCache
+    """
+    if cache is None:
+        return load_yml(content)
+    key = cache.get_key(file_hash, YAML_LOADER.__name__)
+    yml_content = cache.load(path_to_yml, key)
+    if yml_content is None:
+        yml_content = load_yml(content)
+        cache.store(path_to_yml, key, yml_content)
+    return yml_content
+
+
+def read_yml_source(path_to_yml: str = "", cache=None):
+    """
+    Read a yml file once, hash and parse it from the same buffer
+
+    files of at least MMAP_THRESHOLD bytes are memory-mapped, the md5 hash is calculated and
+    the content is parsed without copying the file into a buffer
 
     :param str path_to_yml: path/to/your.yml
-    :return: dict on Success, None on Error
-    :rtype: dict
+    :param ParsedYamlCache cache: cache of parsed YAML files
+    :return: source with parsed data, md5 hash, size and modification time
+    :rtype: YmlSource
     """
     try:
-        with open(path_to_yml, "r") as f:
-            yml_content = yaml.load(f, Loader=yaml.FullLoader)
-            logging.debug(f"yml_content: {yml_content}")
-            return yml_content
+        with open(path_to_yml, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    file_hash = hashlib.md5(content).hexdigest()
+                    data = _parse_yml(path_to_yml, content, file_hash, cache)
+            else:
+                content = f.read()
+                file_hash = hashlib.md5(content).hexdigest()
+                data = _parse_yml(path_to_yml, content, file_hash, cache)
     except OSError as err:
         # in case of an error log file name and error message
         logging.debug(f"yml-definition-file '{path_to_yml}' not readable")
         logging.debug(f"Error: {err.strerror}")
         raise err
 
+    logging.debug("yml_content: %s", summarize(data))
+    return YmlSource(path_to_yml, data, file_hash, stat.st_size, stat.st_mtime_ns)
 
-def read_roadmap_definition(path_to_roadmap_yml: str = ""):
+
+def read_yml_to_dict(path_to_yml: str = "", cache=None):
+    """
+    Read some yml file and return this as a dict
+
+    Return Dict: if conversion to dict was successfully
+    Return None: if conversion failed
+
+    :param str path_to_yml: path/to/your.yml
+    :param ParsedYamlCache cache: cache of parsed YAML files
+    :return: dict on Success, None on Error
+    :rtype: dict
+    """
+    return read_yml_source(path_to_yml, cache=cache).data
+
+
+def read_roadmap_definition(path_to_roadmap_yml: str = "", cache=None):
     """
     Read the Roadmap-Definition-YML
 
@@ -36,10 +129,55 @@ def read_roadmap_definition(path_to_roadmap_yml: str = ""):
     Return None: if conversion failed
 
     :param str path_to_roadmap_yml: path/to/roadmap.yml
+    :param ParsedYamlCache cache: cache of parsed YAML files
     :return: dict on Success, None on Error
     :rtype: dict
     """
-    return read_yml_to_dict(path_to_yml=path_to_roadmap_yml)
+    return read_yml_to_dict(path_to_yml=path_to_roadmap_yml, cache=cache)
+
+
+def iter_key_value_list(element=None, prefix_for_key: str = None, keep_index=False, skip_keys=(),
+                        get_skip_keys=None):
+    """
+    iterate over all given elements and yield each element key and value, see get_key_value_list
+
+    the pairs are generated one by one in linear time of the size of element, nothing is copied
+
+    :param Any element: anything you like to make a flat list
+    :param str prefix_for_key: prefix_for_key is used to prefix the key of every pair
+    :param bool keep_index: if true, key contains loop index of all dict and list elements
+    :param tuple skip_keys: dict keys which are left out on every level, with everything below them
+    :param callable get_skip_keys: called with every dict, returns the keys of the dict which are left out
+        with everything below them in addition to skip_keys
+
+    :return: generator of key/value pairs as dict
+    :rtype: Generator
+    """
+    # add dot to prefix if prefix is given and there is no dot present
+    if prefix_for_key and prefix_for_key[-1] != ".":
+        prefix_for_key += "."
+
+    # the elements still to visit with their prefix, the next element is on top
+    pending = [(element, prefix_for_key or "")]
+    # every distinct key is kept once, the pairs with the same key share it
+    keys = {}
+    while pending:
+        element, prefix = pending.pop()
+        # if we get a list, only its dicts are visited
+        if isinstance(element, list):
+            children = [(item, f"{prefix}{index}." if keep_index else prefix)
+                        for index, item in enumerate(element) if isinstance(item, dict)]
+        # if we get a dict, we go further into each of its values
+        elif isinstance(element, dict):
+            skipped = get_skip_keys(element) if get_skip_keys is not None else ()
+            children = [(value, f"{prefix}{key}.") for key, value in element.items()
+                        if key not in skip_keys and key not in skipped]
+        # we got our value, the key is the prefix without its dot - or None if there is no prefix
+        else:
+            key = prefix[:-1] if prefix.endswith(".") else (prefix or None)
+            yield {'key': keys.setdefault(key, key), 'value': element}
+            continue
+        pending.extend(reversed(children))
 
 
 def get_key_value_list(element=None, key_value_list: list = None, prefix_for_key: str = None, keep_index=False):
@@ -59,7 +197,7 @@ def get_key_value_list(element=None, key_value_list: list = None, prefix_for_key
     - milestones.0.deliverables.0.title
     - milestones.0.deliverables.1.title
 
-    the ordering from element is kept
+    the ordering from element is kept, the list is built from iter_key_value_list
 
     :param Any element: anything you like to make a flat list
     :param list key_value_list: an optional list, we have to append our key value pairs
@@ -68,63 +206,178 @@ def get_key_value_list(element=None, key_value_list: list = None, prefix_for_key
 
     :return: list with key/value pairs as dict for given elements
     """
-    # add dot to prefix if prefix is given and there is no dot present
-    if prefix_for_key is None:
-        prefix_for_key = ""
-    elif prefix_for_key is not None and prefix_for_key[-1] != ".":
-        prefix_for_key += "."
-
     # make sure to have a list
     if key_value_list is None:
         key_value_list = list()
 
-    # if we get a list
-    if isinstance(element, list):
-        # iterate over list
-        for index, item in enumerate(element):
-            if isinstance(item, dict):
-                # should we add index to prefix?
-                if keep_index:
-                    sub_prefix = prefix_for_key + str(index)
-                else:
-                    sub_prefix = prefix_for_key
-                # if we got a dict we recall this function
-                get_key_value_list(element=item,
-                                   prefix_for_key=sub_prefix,
-                                   key_value_list=key_value_list,
-                                   keep_index=keep_index)
-    elif isinstance(element, dict):
-        # iterate over dict
-        for index, key in enumerate(element.keys()):
-            # make a sub-prefix for this element
-            sub_prefix = prefix_for_key + str(key)
-
-            # we got an element
-            if not isinstance(element[key], (list, dict, tuple)):
-                key_value_list.append({'key': sub_prefix,
-                                       'value': element[key]})
-            # we got a list,dict or tuple, so we have to go further into the element
-            else:
-                get_key_value_list(element=element[key],
-                                   prefix_for_key=sub_prefix,
-                                   key_value_list=key_value_list,
-                                   keep_index=keep_index)
-                # we got our value
-    else:
-        # remove the dot from prefix
-        if len(prefix_for_key) >= 1 and prefix_for_key[-1] == ".":
-            prefix_for_key = prefix_for_key[:-1]
-        # we need SOME key, so we use none if prefix is not present
-        # this is, because we set prefix = "" if it is none
-        if prefix_for_key == "":
-            prefix_for_key = None
-        # add element to the list
-        key_value_list.append({'key': prefix_for_key, 'value': element})
+    key_value_list.extend(iter_key_value_list(element, prefix_for_key=prefix_for_key, keep_index=keep_index))
 
     # return a copy of our list
     return key_value_list.copy()
 
 
+class LazyKeyValueList(Sequence):
+    """
+    Key value list of an element, see get_key_value_list, which is built when it is used first
+
+    e.g. project["as_list"] is only built if a template (roadmap.csv) iterates over it.
+    The list is built once, also if parallel renders use it at the same time.
+    """
+
+    def __init__(self, element=None, skip_keys=(), get_skip_keys=None):
+        """
+        :param Any element: element to flatten, it is flattened as it is when the list is used first
+        :param tuple skip_keys: dict keys which are left out on every level, see iter_key_value_list
+        :param callable get_skip_keys: returns the keys of a dict which are left out, see iter_key_value_list
+        """
+        self.element = element
+        self.skip_keys = tuple(skip_keys)
+        self.get_skip_keys = get_skip_keys
+        self._list = None
+        self._key_index = None
+        self._lock = threading.Lock()
+
+    def _get_list(self):
+        if self._list is None:
+            with self._lock:
+                if self._list is None:
+                    self._list = list(iter_key_value_list(self.element, skip_keys=self.skip_keys,
+                                                          get_skip_keys=self.get_skip_keys))
+        return self._list
+
+    @property
+    def key_index(self):
+        """
+        KeyValueIndex of the list, built once when it is used first
+
+        :rtype: KeyValueIndex
+        """
+        if self._key_index is None:
+            key_value_list = self._get_list()
+            with self._lock:
+                if self._key_index is None:
+                    self._key_index = KeyValueIndex(key_value_list)
+        return self._key_index
+
+    def __getitem__(self, index):
+        return self._get_list()[index]
+
+    def __len__(self):
+        return len(self._get_list())
+
+    def __iter__(self):
+        return iter(self._get_list())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyKeyValueList):
+            other = other._get_list()
+        return self._get_list() == other
+
+    def __repr__(self):
+        # the list is not built to represent it
+        return f"LazyKeyValueList(skip_keys={self.skip_keys})"
+
+
+class KeyValueIndex:
+    """
+    Index of a key value list by its dotted keys, see get_key_value_list
+
+    the positions of the pairs are kept per key and the keys in a tree of their segments, so a query
+    takes time of the matching keys and pairs instead of all pairs of the list:
+    - get("milestones.title"): pairs with exactly this key
+    - find("milestones.deliverables."): pairs with a key below a prefix ending with a dot
+    - find("*.todos.*"): every '*' matches exactly one segment, can be combined with a prefix
+    - search(".todos."): pairs with a key containing the text, only the distinct keys are searched
+
+    the pairs are returned in the order of the list
+    """
+
+    def __init__(self, key_value_list: list = None):
+        """
+        :param list key_value_list: list with key/value pairs as dict, pairs without 'key' are left out
+        """
+        self.key_value_list = key_value_list if key_value_list is not None else []
+        # positions of the pairs by key
+        self._positions = {}
+        # tree of the key segments, every node has its children by segment and its key in None
+        self._tree = {}
+        for position, item in enumerate(self.key_value_list):
+            if 'key' not in item:
+                continue
+            positions = self._positions.get(item["key"])
+            if positions is None:
+                positions = self._positions[item["key"]] = []
+                if item["key"] is not None:
+                    node = self._tree
+                    for segment in item["key"].split("."):
+                        node = node.setdefault(segment, {})
+                    node[None] = item["key"]
+            positions.append(position)
+
+    def _get_pairs(self, keys: list):
+        # pairs of all keys in list order, the positions of every key are in order already
+        if len(keys) == 1:
+            positions = self._positions[keys[0]]
+        else:
+            positions = sorted(position for key in keys for position in self._positions[key])
+        return [self.key_value_list[position] for position in positions]
+
+    def keys(self):
+        """
+        :return: the distinct keys in order of their first pair
+        :rtype: list
+        """
+        return list(self._positions)
+
+    def get(self, key: str = None):
+        """
+        :param str key: dotted key, e.g. milestones.title
+        :return: list with the key/value pairs having this key
+        :rtype: list
+        """
+        if key not in self._positions:
+            return []
+        return self._get_pairs([key])
+
+    def find(self, query: str = ""):
+        """
+        :param str query: dotted key, '*' matches one segment, with a trailing dot all keys below are matched
+        :return: list with the matching key/value pairs
+        :rtype: list
+        """
+        segments = query.split(".")
+        below = segments[-1] == ""
+        if below:
+            segments = segments[:-1]
+        nodes = [self._tree]
+        for segment in segments:
+            if segment == "*":
+                nodes = [child for node in nodes for key, child in node.items() if key is not None]
+            else:
+                nodes = [node[segment] for node in nodes if segment in node]
+        keys = []
+        while nodes:
+            node = nodes.pop()
+            if None in node:
+                keys.append(node[None])
+            if below:
+                nodes.extend(child for key, child in node.items() if key is not None)
+        if not keys:
+            return []
+        return self._get_pairs(keys)
+
+    def search(self, text: str = ""):
+        """
+        :param str text: part of the key
+        :return: list with the key/value pairs with a key containing text
+        :rtype: list
+        """
+        keys = [key for key in self._positions if key is not None and text in key]
+        if not keys:
+            return []
+        return self._get_pairs(keys)
+
+
 def get_filtered_key_value_list(element=None, key_value_list: list = None, prefix_for_key: str = None,
                                 filter_for_keys: str = "", precise_search: bool = True):
     """
@@ -148,6 +401,9 @@ def get_filtered_key_value_list(element=None, key_value_list: list = None, prefi
     :param bool precise_search: if true, the exact strings from filter_keys are searched,
     if false, we look if any filter_key is part of key
 
+    the list is searched with its KeyValueIndex, the index of a LazyKeyValueList (project.as_list)
+    is built once and reused by every call
+
     :return: list with key/value pairs as dict for given elements
     """
     # we need a key_value list without index
@@ -157,43 +413,36 @@ def get_filtered_key_value_list(element=None, key_value_list: list = None, prefi
     elif key_value_list is None and element is None:
         raise ValueError("neither 'key_value_list' nor 'element' is present")
 
+    key_index = getattr(key_value_list, "key_index", None) or KeyValueIndex(key_value_list)
+
     # our result list
     filtered_key_value_list = list()
     # we iterate over the filter_keys
     for filter_item in filter_for_keys.split(","):
         # let's remove any whitespaces just for convenience
         filter_key = filter_item.strip(" ")
-        # we iterate over our original list
-        for item in key_value_list:
-            # make sure we have 'key' in our list
-            if 'key' in item:
-                if precise_search:
-                    # check the exact key
-                    if item["key"] == filter_key:
-                        filtered_key_value_list.append(item)
-                else:
-                    if filter_key in item["key"]:
-                        filtered_key_value_list.append(item)
+        if precise_search:
+            # check the exact key
+            filtered_key_value_list.extend(key_index.get(filter_key))
+        else:
+            filtered_key_value_list.extend(key_index.search(filter_key))
 
-    return filtered_key_value_list.copy()
+    return filtered_key_value_list
 
 
-def calculate_roadmap_version(path_to_roadmap_yml: str = ""):
+def calculate_file_hash(path_to_file: str = ""):
     """
-    Calculate a version of roadmap.yml
-
-    version is calculated using md5 of the roadmap.yml and
-    id contains the first and last 4 characters of md5 hash as a version
+    Calculate the md5 hash of a file
 
     note: part of this code is from https://stackoverflow.com/questions/1131220/get-the-md5-hash-of-big-files-in-python
 
-    :param str path_to_roadmap_yml: path/to/roadmap.yml
-    :return: md5sum of roadmap.yml
+    :param str path_to_file: path/to/file
+    :return: md5 hash of the file as hex string
     :rtype: string of md5 or None in case of error
     """
     try:
         # we use the whole file and open in binary
-        with open(path_to_roadmap_yml, "rb") as f:
+        with open(path_to_file, "rb") as f:
             # init hashlib for md5 hashing
             file_hash = hashlib.md5()
             # we only read chunks of the file to fill in the MD5 128-byte digest blocks
@@ -202,14 +451,29 @@ def calculate_roadmap_version(path_to_roadmap_yml: str = ""):
                 # update the hash with chunk data
                 file_hash.update(chunk)
             # get the hash as string
-            version_hash = file_hash.hexdigest()
-        # version uses first and last 4 characters from hash
-        version = version_hash[0:4] + version_hash[-4:]
-        return version
+            return file_hash.hexdigest()
     except OSError:
         return None
 
 
+def calculate_roadmap_version(path_to_roadmap_yml: str = ""):
+    """
+    Calculate a version of roadmap.yml
+
+    version is calculated using md5 of the roadmap.yml and
+    id contains the first and last 4 characters of md5 hash as a version
+
+    :param str path_to_roadmap_yml: path/to/roadmap.yml
+    :return: md5sum of roadmap.yml
+    :rtype: string of md5 or None in case of error
+    """
+    version_hash = calculate_file_hash(path_to_roadmap_yml)
+    if version_hash is None:
+        return None
+    # version uses first and last 4 characters from hash
+    return version_hash[0:4] + version_hash[-4:]
+
+
 def convert_image_to_html_base64(image_filename: str = ""):
     """
     Converts an image file in the given path to html compatible base64 string
@@ -0,0 +1,232 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from importlib.metadata import version
+
+from jsonschema import exceptions
+from jsonschema.validators import extend, validator_for
+
+from .output import write_atomic
+
+# validators by absolute schema path, modification time and size - each schema is compiled once per process
+_validators = {}
+_validators_lock = threading.Lock()
+# sha256 of schema files by absolute schema path, modification time and size
+_schema_hashes = {}
+
+
+# keywords which compare the value of a string, dates are compared as their string representation
+_STRING_VALUE_KEYWORDS = ("pattern", "minLength", "maxLength", "format", "enum", "const")
+
+
+def _is_string(checker, instance):
+    """
+    Type check for 'string' which accepts dates, YAML reads unquoted dates as date or datetime
+    """
+    return isinstance(instance, (str, datetime.date))
+
+
+def _date_as_string(keyword_validator):
+    """
+    Wrap a keyword validator to validate dates as their string representation
+    """
+    def validate_keyword(validator, value, instance, schema):
+        if isinstance(instance, datetime.date):
+            instance = str(instance)
+        return keyword_validator(validator, value, instance, schema)
+
+    return validate_keyword
+
+
+def _create_validator(schema: dict = None):
+    """
+    Create a validator for the schema with a date-aware type checker
+
+    :param dict schema: JSON schema, already checked against its meta-schema
+    :return: validator instance
+    """
+    validator_class = validator_for(schema)
+    type_checker = validator_class.TYPE_CHECKER.redefine("string", _is_string)
+    keyword_validators = {keyword: _date_as_string(validator_class.VALIDATORS[keyword])
+                          for keyword in _STRING_VALUE_KEYWORDS if keyword in validator_class.VALIDATORS}
+    return extend(validator_class, validators=keyword_validators, type_checker=type_checker)(schema)
+
+
+def _load_checked_schema(schema_source: bytes = b"", cache_path: str = None):
+    """
+    Parse the schema and check it against its meta-schema
+
+    checking is the expensive part of compiling a schema, a checked schema is stored in
+    cache_path keyed by the hash of the schema file and loaded from there by later processes
+
+    :param bytes schema_source: content of the schema file
+    :param str cache_path: directory for checked schemas, nothing is cached if not given
+    :return: schema
+    :rtype: dict
+    """
+    cache_file = None
+    if cache_path:
+        schema_hash = hashlib.sha256(schema_source).hexdigest()
+        cache_file = os.path.join(cache_path, f"{schema_hash}.pickle")
+        try:
+            with open(cache_file, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    schema = json.loads(schema_source)
+    validator_for(schema).check_schema(schema)
+
+    if cache_file:
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            write_atomic(cache_file, lambda f: pickle.dump(schema, f, protocol=pickle.HIGHEST_PROTOCOL), mode="wb")
+        except (OSError, pickle.PicklingError) as err:
+            logging.debug(f"could not cache schema in '{cache_file}': {err}")
+    return schema
+
+
+def get_validator(path_to_json_schema: str = "", cache_path: str = None):
+    """
+    Get the compiled validator for a JSON schema file
+
+    the validator is created once per process and schema file version,
+    see _load_checked_schema for the cache in cache_path
+
+    :param str path_to_json_schema: path/to/schema/roadmap.json
+    :param str cache_path: directory for checked schemas, e.g. CACHE_PATH/schema
+    :return: validator instance
+    """
+    stat = os.stat(path_to_json_schema)
+    key = (os.path.abspath(path_to_json_schema), stat.st_mtime_ns, stat.st_size)
+    validator = _validators.get(key)
+    if validator is None:
+        with _validators_lock:
+            validator = _validators.get(key)
+            if validator is None:
+                with open(path_to_json_schema, "rb") as f:
+                    schema = _load_checked_schema(f.read(), cache_path)
+                validator = _validators[key] = _create_validator(schema)
+    return validator
+
+
+def get_schema_hash(path_to_json_schema: str = ""):
+    """
+    Get the sha256 hash of a JSON schema file, calculated once per process and schema file version
+
+    :param str path_to_json_schema: path/to/schema/roadmap.json
+    :return: sha256 of the schema file as hex string
+    :rtype: str
+    """
+    stat = os.stat(path_to_json_schema)
+    key = (os.path.abspath(path_to_json_schema), stat.st_mtime_ns, stat.st_size)
+    schema_hash = _schema_hashes.get(key)
+    if schema_hash is None:
+        with open(path_to_json_schema, "rb") as f:
+            schema_hash = _schema_hashes[key] = hashlib.sha256(f.read()).hexdigest()
+    return schema_hash
+
+
+class ValidationResultCache:
+    """
+    Persistent cache of successful validations
+
+    an entry is keyed by roadmap hash, schema hash and jsonschema version, so an unchanged roadmap
+    validated against an unchanged schema is not validated again. Invalid roadmaps are never cached,
+    they are validated on every run to report their errors.
+    """
+
+    def __init__(self, directory: str = ""):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _get_entry(self, roadmap_hash: str, schema_hash: str):
+        key = hashlib.sha256(f"{roadmap_hash}|{schema_hash}|{version('jsonschema')}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}.valid")
+
+    def is_valid(self, roadmap_hash: str = "", schema_hash: str = ""):
+        """
+        Check if the roadmap was validated successfully against the schema before
+
+        :param str roadmap_hash: hash of the roadmap file
+        :param str schema_hash: hash of the schema file
+        :return: True on a cache hit
+        :rtype: bool
+        """
+        hit = bool(roadmap_hash) and os.path.exists(self._get_entry(roadmap_hash, schema_hash))
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def add(self, roadmap_hash: str = "", schema_hash: str = ""):
+        """
+        Remember a successful validation of the roadmap against the schema
+
+        :param str roadmap_hash: hash of the roadmap file
+        :param str schema_hash: hash of the schema file
+        """
+        if not roadmap_hash:
+            return
+        try:
+            with open(self._get_entry(roadmap_hash, schema_hash), "w"):
+                pass
+        except OSError as err:
+            logging.debug(f"could not cache validation result in '{self.directory}': {err}")
+
+
+def get_validation_result_cache(config: dict = None):
+    """
+    Create the validation result cache configured by CACHE_PATH
+
+    :param dict config: configuration dictionary
+    :return: ValidationResultCache in CACHE_PATH/validation, None if CACHE_PATH is not set
+    :rtype: ValidationResultCache
+    """
+    if not config or not config.get("CACHE_PATH"):
+        return None
+    return ValidationResultCache(os.path.join(config["CACHE_PATH"], "validation"))
+
+
+def get_schema_cache_path(config: dict = None):
+    """
+    Get the directory for checked schemas configured by CACHE_PATH
+
+    :param dict config: configuration dictionary
+    :return: CACHE_PATH/schema, None if CACHE_PATH is not set
+    :rtype: str
+    """
+    if not config or not config.get("CACHE_PATH"):
+        return None
+    return os.path.join(config["CACHE_PATH"], "schema")
+
+
+def validate_roadmap(roadmap_data: dict = None, path_to_json_schema: str = "", all_errors: bool = False,
+                     cache_path: str = None):
+    """
+    Validate the parsed roadmap against the JSON schema
+
+    dates read by YAML are valid strings, the roadmap is validated as it is without conversion
+
+    :param dict roadmap_data: dictionary containing roadmap-data
+    :param str path_to_json_schema: path/to/schema/roadmap.json
+    :param bool all_errors: return all errors, otherwise only the most relevant error
+    :param str cache_path: directory for checked schemas
+    :return: validation errors, empty if the roadmap is valid
+    :rtype: list
+    """
+    validator = get_validator(path_to_json_schema, cache_path)
+    errors = validator.iter_errors(roadmap_data)
+    if all_errors:
+        return list(errors)
+    error = exceptions.best_match(errors)
+    return [error] if error is not None else []
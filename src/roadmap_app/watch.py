@@ -0,0 +1,111 @@
+import os
+import time
+
+from .rendering import get_template_search_paths
+
+
+def snapshot_files(paths: list = None):
+    """
+    Take a snapshot of the modification times of all given files and directories
+
+    directories are walked recursively, files which do not exist are left out of the snapshot
+
+    :param list paths: files or directories to watch
+    :return: dict with absolute file path as key and modification time in ns as value
+    :rtype: dict
+    """
+    snapshot = {}
+    for path in paths or []:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for dirname, dir_names, filenames in os.walk(path):
+                for filename in filenames:
+                    file_path = os.path.join(dirname, filename)
+                    try:
+                        snapshot[file_path] = os.stat(file_path).st_mtime_ns
+                    except OSError:
+                        # file was removed during walk
+                        continue
+        else:
+            try:
+                snapshot[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+    return snapshot
+
+
+def diff_snapshots(old_snapshot: dict = None, new_snapshot: dict = None):
+    """
+    Compare two snapshots from snapshot_files
+
+    :param dict old_snapshot: snapshot before
+    :param dict new_snapshot: snapshot after
+    :return: set of absolute paths which were added, removed or modified
+    :rtype: set
+    """
+    old_snapshot = old_snapshot or {}
+    new_snapshot = new_snapshot or {}
+    changed = set(old_snapshot.keys() ^ new_snapshot.keys())
+    for path in old_snapshot.keys() & new_snapshot.keys():
+        if old_snapshot[path] != new_snapshot[path]:
+            changed.add(path)
+    return changed
+
+
+def wait_for_changes(get_paths, snapshot: dict = None, poll_interval: float = 0.5, debounce: float = 0.3):
+    """
+    Block until some watched file changed and the changes settled
+
+    a burst of saves (e.g. an editor writing a backup and the file) is collected into one change set:
+    after the first change we wait until the snapshot is stable for the debounce interval
+
+    :param callable get_paths: returns the list of files and directories to watch
+    :param dict snapshot: snapshot to compare with
+    :param float poll_interval: seconds between two polls
+    :param float debounce: seconds the files have to be unchanged before the change set is returned
+    :return: tuple of changed paths and the new snapshot
+    :rtype: tuple
+    """
+    while True:
+        time.sleep(poll_interval)
+        current = snapshot_files(get_paths())
+        if current == snapshot:
+            continue
+        # wait until the burst of changes settled
+        while True:
+            time.sleep(debounce)
+            settled = snapshot_files(get_paths())
+            if settled == current:
+                break
+            current = settled
+        return diff_snapshots(snapshot, current), current
+
+
+def get_affected_templates(templates: list = None, changed_files: set = None, dependencies: dict = None):
+    """
+    Get all templates which load one of the changed files
+
+    if the files loaded by the last render of a template are known, the template is affected
+    if one of these files changed, e.g. a change of html/roadmap.css affects the html and the html-kanban templates.
+    Otherwise, a template is affected if a changed file is inside one of its search paths.
+
+    :param list templates: templates from find_templates
+    :param set changed_files: absolute paths of changed files
+    :param dict dependencies: output file as key, list of files loaded for rendering it as value
+    :return: affected templates in order of templates
+    :rtype: list
+    """
+    changed_files = {os.path.abspath(path) for path in changed_files or []}
+    changed_dirs = {os.path.dirname(path) for path in changed_files}
+    dependencies = dependencies or {}
+    affected = []
+    for template in templates or []:
+        loaded_files = dependencies.get(template.get("output_file"))
+        if loaded_files:
+            is_affected = bool(changed_files & {os.path.abspath(path) for path in loaded_files})
+        else:
+            search_paths = {os.path.abspath(path) for path in get_template_search_paths(template)}
+            is_affected = bool(search_paths & changed_dirs)
+        if is_affected:
+            affected.append(template)
+    return affected
@@ -0,0 +1,64 @@
+import unittest
+import tempfile
+import os
+from roadmap_app.batch import is_batch_roadmap_file, expand_roadmap_files
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.teams_path = os.path.join(self.tmpdir.name, "teams")
+        self.output_path = os.path.join(self.tmpdir.name, "output")
+        for team in ["beta", "alpha"]:
+            os.makedirs(os.path.join(self.teams_path, team))
+            with open(os.path.join(self.teams_path, team, "roadmap.yml"), "w") as f:
+                f.write(f"title: {team}\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _roadmap_file(self, team):
+        return os.path.join(self.teams_path, team, "roadmap.yml")
+
+    def _output_folder(self, *parts):
+        return os.path.join(self.output_path, *parts) + os.sep
+
+    def test_is_batch_roadmap_file(self):
+        self.assertTrue(is_batch_roadmap_file("teams/*/roadmap.yml"))
+        self.assertTrue(is_batch_roadmap_file("roadmap.[ab].yml"))
+        self.assertTrue(is_batch_roadmap_file("@roadmaps.txt"))
+        self.assertFalse(is_batch_roadmap_file("examples/roadmap.yml"))
+
+    def test_expand_glob(self):
+        jobs = expand_roadmap_files(os.path.join(self.teams_path, "*", "roadmap.yml"), self.output_path)
+        # sorted by path, output directory mirrors the path below the glob base directory
+        self.assertEqual(jobs, [(self._roadmap_file("alpha"), self._output_folder("alpha", "roadmap")),
+                                (self._roadmap_file("beta"), self._output_folder("beta", "roadmap"))])
+
+    def test_expand_list_file(self):
+        list_file = os.path.join(self.tmpdir.name, "roadmaps.txt")
+        with open(list_file, "w") as f:
+            f.write("# nightly roadmaps\n\n"
+                    "teams/beta/roadmap.yml\n"
+                    "teams/alpha/roadmap.yml  public/alpha\n")
+        jobs = expand_roadmap_files(f"@{list_file}", self.output_path)
+        # order of the list file, relative paths are relative to the list file
+        self.assertEqual(jobs, [(self._roadmap_file("beta"), self._output_folder("teams", "beta", "roadmap")),
+                                (self._roadmap_file("alpha"),
+                                 os.path.join(self.tmpdir.name, "public", "alpha") + os.sep)])
+
+    def test_expand_errors(self):
+        with self.assertRaises(ValueError):
+            expand_roadmap_files(os.path.join(self.teams_path, "*", "missing.yml"), self.output_path)
+        with self.assertRaises(ValueError):
+            expand_roadmap_files(f"@{os.path.join(self.tmpdir.name, 'missing.txt')}", self.output_path)
+        # two roadmaps must not overwrite each other's output
+        list_file = os.path.join(self.tmpdir.name, "roadmaps.txt")
+        with open(list_file, "w") as f:
+            f.write("teams/alpha/roadmap.yml out\nteams/beta/roadmap.yml out/\n")
+        with self.assertRaises(ValueError):
+            expand_roadmap_files(f"@{list_file}", self.output_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import os
+from unittest.mock import patch
+from jinja2 import Environment, FileSystemLoader
+from roadmap_app.cache import (TemplateBytecodeCache, SharedBytecodeCache, get_template_bytecode_cache, ParsedYamlCache,
+                               get_parsed_yaml_cache)
+
+
+class TestTemplateBytecodeCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.template_dir = os.path.join(self.tmpdir.name, "templates")
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+        os.makedirs(self.template_dir)
+        self._write_template("roadmap.html", "Hello {{ project.title }}")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write_template(self, name, content):
+        with open(os.path.join(self.template_dir, name), "w") as f:
+            f.write(content)
+
+    def _render_with_fresh_environment(self, cache, name="roadmap.html"):
+        """Render with a new Environment (like a new process) and return (output, number of compiles)."""
+        env = Environment(loader=FileSystemLoader(self.template_dir), bytecode_cache=cache)
+        with patch.object(env, "compile", wraps=env.compile) as compile_mock:
+            output = env.get_template(name).render(project={"title": "cached"})
+        return output, compile_mock.call_count
+
+    def test_cache_hit_skips_compile(self):
+        cache = TemplateBytecodeCache(self.cache_dir)
+        self.assertEqual(self._render_with_fresh_environment(cache), ("Hello cached", 1))
+        # second environment loads the compiled template from disk
+        self.assertEqual(self._render_with_fresh_environment(cache), ("Hello cached", 0))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_changed_source_is_recompiled(self):
+        cache = TemplateBytecodeCache(self.cache_dir)
+        self._render_with_fresh_environment(cache)
+        self._write_template("roadmap.html", "Bye {{ project.title }}")
+        self.assertEqual(self._render_with_fresh_environment(cache), ("Bye cached", 1))
+
+    def test_cache_key_contains_jinja_version(self):
+        cache = TemplateBytecodeCache(self.cache_dir)
+        self._render_with_fresh_environment(cache)
+        with patch("jinja2.__version__", "0.0.0"):
+            self.assertEqual(self._render_with_fresh_environment(cache)[1], 1)
+
+    def test_prune_evicts_least_recently_used(self):
+        cache = TemplateBytecodeCache(self.cache_dir)
+        for index in range(3):
+            self._write_template(f"partial{index}.html", f"partial {index} " + "x" * 1000)
+            self._render_with_fresh_environment(cache, f"partial{index}.html")
+            # make sure every entry has its own modification time
+            for filename in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, filename)
+                os.utime(path, ns=(os.stat(path).st_mtime_ns - 10 ** 9,) * 2)
+        entries = os.listdir(self.cache_dir)
+        self.assertEqual(len(entries), 3)
+        # shrink the cache to the size of one entry: the two oldest entries are evicted
+        cache.max_size = max(os.path.getsize(os.path.join(self.cache_dir, entry)) for entry in entries)
+        # storing entries does not prune, the shared cache prunes once if entries were stored
+        self.assertEqual(cache.stored, 3)
+        self.assertEqual(SharedBytecodeCache(persistent=cache).prune(), 2)
+        self.assertEqual(cache.stored, 0)
+        self.assertEqual(SharedBytecodeCache(persistent=cache).prune(), 0)
+        self.assertEqual(SharedBytecodeCache().prune(), 0)
+        self.assertEqual(cache.prune(), 0)
+        self.assertEqual(self._render_with_fresh_environment(cache, "partial2.html")[1], 0)
+        self.assertEqual(self._render_with_fresh_environment(cache, "partial0.html")[1], 1)
+
+    def test_get_template_bytecode_cache(self):
+        # caching is disabled without CACHE_PATH
+        self.assertIsNone(get_template_bytecode_cache({}))
+        self.assertIsNone(get_template_bytecode_cache({"CACHE_PATH": ""}))
+        cache = get_template_bytecode_cache({"CACHE_PATH": self.cache_dir, "TEMPLATE_CACHE_MAX_SIZE": "1024"})
+        self.assertEqual(cache.directory, os.path.join(self.cache_dir, "templates"))
+        self.assertEqual(cache.max_size, 1024)
+        self.assertTrue(os.path.isdir(cache.directory))
+        with self.assertRaises(ValueError) as context:
+            get_template_bytecode_cache({"CACHE_PATH": self.cache_dir, "TEMPLATE_CACHE_MAX_SIZE": "32MB"})
+        self.assertIn("TEMPLATE_CACHE_MAX_SIZE", str(context.exception))
+
+    def test_shared_cache_compiles_once_across_environments(self):
+        persistent = TemplateBytecodeCache(self.cache_dir)
+        cache = SharedBytecodeCache(persistent=persistent)
+        self.assertEqual(self._render_with_fresh_environment(cache), ("Hello cached", 1))
+        # another Environment in the same process gets the compiled template from memory
+        self.assertEqual(self._render_with_fresh_environment(cache), ("Hello cached", 0))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # the compiled template is written through to the persistent cache
+        self.assertEqual(self._render_with_fresh_environment(SharedBytecodeCache(persistent=persistent)),
+                         ("Hello cached", 0))
+        self.assertEqual(persistent.hits, 1)
+
+    def test_shared_cache_recompiles_changed_source(self):
+        cache = SharedBytecodeCache()
+        self._render_with_fresh_environment(cache)
+        self._write_template("roadmap.html", "Bye {{ project.title }}")
+        self.assertEqual(self._render_with_fresh_environment(cache), ("Bye cached", 1))
+
+    def test_parsed_yaml_cache(self):
+        self.assertIsNone(get_parsed_yaml_cache({"CACHE_PATH": ""}))
+        cache = get_parsed_yaml_cache({"CACHE_PATH": self.cache_dir})
+        self.assertEqual(cache.directory, os.path.join(self.cache_dir, "yaml"))
+        key = cache.get_key("hash of cached", "CSafeLoader")
+        self.assertIsNone(cache.load("roadmap.yml", key))
+        cache.store("roadmap.yml", key, {"title": "cached"})
+        self.assertEqual(cache.load("roadmap.yml", key), {"title": "cached"})
+        # changed content hash or loader misses the cache
+        changed_key = cache.get_key("hash of changed", "CSafeLoader")
+        self.assertIsNone(cache.load("roadmap.yml", changed_key))
+        self.assertIsNone(cache.load("roadmap.yml", cache.get_key("hash of cached", "SafeLoader")))
+        # a changed file replaces its entry
+        cache.store("roadmap.yml", changed_key, {"title": "changed"})
+        self.assertEqual(len(os.listdir(cache.directory)), 1)
+        self.assertEqual(ParsedYamlCache(cache.directory).load("roadmap.yml", changed_key), {"title": "changed"})
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import time
+
+from roadmap_app.dependencies import topological_order, critical_path, DependencyCycleError
+
+
+class TestDependencies(unittest.TestCase):
+    def setUp(self):
+        # b and c depend on a, d depends on b and c
+        self.nodes = ["d", "c", "b", "a"]
+        self.successors = {"a": ["b", "c"], "b": ["d"], "c": ["d"]}
+
+    def test_topological_order(self):
+        order = topological_order(self.nodes, self.successors)
+        self.assertEqual(order, ["a", "b", "c", "d"])
+        # nodes without dependencies keep their order
+        self.assertEqual(topological_order(["x", "y", "z"], {}), ["x", "y", "z"])
+        self.assertEqual(topological_order(None, None), [])
+
+    def test_cycle_is_reported(self):
+        with self.assertRaises(DependencyCycleError) as context:
+            topological_order(["a", "b", "c", "d"], {"a": ["b"], "b": ["c"], "c": ["a", "d"]})
+        self.assertEqual(context.exception.cycle, ["a", "b", "c"])
+        self.assertEqual(str(context.exception), "depends_on cycle: a -> b -> c -> a")
+        self.assertIsInstance(context.exception, ValueError)
+        # an element depending on itself
+        with self.assertRaises(DependencyCycleError) as context:
+            topological_order(["a"], {"a": ["a"]})
+        self.assertEqual(context.exception.cycle, ["a"])
+
+    def test_critical_path(self):
+        order = topological_order(self.nodes, self.successors)
+        self.assertEqual(critical_path(order, self.successors, {"a": 1, "b": 2, "c": 5, "d": 1}), (["a", "c", "d"], 7))
+        self.assertEqual(critical_path(order, self.successors, {"a": 1, "b": 8, "c": 5, "d": 1}), (["a", "b", "d"], 10))
+        # a single heavy node is longer than a chain
+        self.assertEqual(critical_path(["x", "y", "z"], {"x": ["y"]}, {"x": 1, "y": 1, "z": 3}), (["z"], 3))
+        self.assertEqual(critical_path([], {}, {}), ([], 0))
+
+    def test_large_graph(self):
+        # 50000 nodes in a chain with a shortcut at every node are ordered in linear time
+        count = 50000
+        nodes = [f"n{index}" for index in reversed(range(count))]
+        successors = {f"n{index}": [f"n{index + 1}", f"n{index + 2}"] for index in range(count - 2)}
+        successors[f"n{count - 2}"] = [f"n{count - 1}"]
+        start = time.perf_counter()
+        order = topological_order(nodes, successors)
+        path, length = critical_path(order, successors, dict.fromkeys(nodes, 1))
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(order[0], "n0")
+        self.assertEqual(len(path), count)
+        self.assertEqual(length, count)
+
+
+if __name__ == '__main__':
+    unittest.main()
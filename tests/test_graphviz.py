@@ -0,0 +1,111 @@
+import unittest
+import tempfile
+import subprocess
+import time
+import os
+from unittest.mock import patch
+
+from roadmap_app.graphviz import (is_graphviz_installed, convert_dot, get_graphviz_formats, get_graphviz_timeout,
+                                  GraphvizConverter, GRAPHVIZ_FORMATS)
+
+# stand-in for graphviz: 'dot -V' prints a version, otherwise stdin is copied to every '-o' file
+FAKE_DOT = """#!/bin/sh
+echo "$@" >> "$FAKE_DOT_LOG"
+if [ "$1" = "-V" ]; then echo "dot - graphviz version 2.43.0 (0)" >&2; exit 0; fi
+if [ -n "$FAKE_DOT_SLEEP" ]; then sleep "$FAKE_DOT_SLEEP"; fi
+source=$(cat)
+while [ $# -gt 0 ]; do
+  if [ "$1" = "-o" ]; then printf '%s' "$source" > "$2"; shift; fi
+  shift
+done
+"""
+
+
+def install_fake_dot(directory):
+    """Write the fake dot executable to directory and return the environment to find it."""
+    path = os.path.join(directory, "dot")
+    with open(path, "w") as f:
+        f.write(FAKE_DOT)
+    os.chmod(path, 0o755)
+    return {"PATH": directory + os.pathsep + os.environ.get("PATH", ""),
+            "FAKE_DOT_LOG": os.path.join(directory, "dot.log")}
+
+
+@unittest.skipUnless(os.name == "posix", "fake dot is a shell script")
+class TestGraphviz(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output_stem = os.path.join(self.tmpdir.name, "roadmap.dot")
+        self.environ = patch.dict(os.environ, install_fake_dot(self.tmpdir.name))
+        self.environ.start()
+        is_graphviz_installed.cache_clear()
+
+    def tearDown(self):
+        self.environ.stop()
+        is_graphviz_installed.cache_clear()
+        self.tmpdir.cleanup()
+
+    def _dot_calls(self):
+        with open(os.environ["FAKE_DOT_LOG"]) as f:
+            return f.read().splitlines()
+
+    def _read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_is_graphviz_installed_probes_once(self):
+        self.assertTrue(is_graphviz_installed())
+        self.assertTrue(is_graphviz_installed())
+        self.assertEqual(self._dot_calls(), ["-V"])
+        is_graphviz_installed.cache_clear()
+        with patch.dict(os.environ, {"PATH": os.path.join(self.tmpdir.name, "missing")}):
+            self.assertFalse(is_graphviz_installed())
+
+    def test_convert_dot_writes_all_formats_with_one_process(self):
+        outputs = convert_dot("digraph { a -> b }", self.output_stem, ["png", "svg", "pdf"])
+        self.assertEqual(outputs, [f"{self.output_stem}.png", f"{self.output_stem}.svg", f"{self.output_stem}.pdf"])
+        # the source is piped over stdin, the dot output file is never read
+        self.assertEqual([self._read(output) for output in outputs], ["digraph { a -> b }"] * 3)
+        calls = self._dot_calls()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([argument for argument in calls[0].split() if argument.startswith("-T")],
+                         ["-Tpng", "-Tsvg", "-Tpdf"])
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)),
+                         ["dot", "dot.log", "roadmap.dot.pdf", "roadmap.dot.png", "roadmap.dot.svg"])
+
+    def test_convert_dot_without_formats(self):
+        self.assertEqual(convert_dot("digraph {}", self.output_stem, []), [])
+        self.assertEqual(GraphvizConverter([]).formats, [])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "dot.log")))
+
+    def test_convert_dot_timeout(self):
+        start = time.perf_counter()
+        with patch.dict(os.environ, {"FAKE_DOT_SLEEP": "5"}):
+            with self.assertRaises(subprocess.TimeoutExpired):
+                convert_dot("digraph {}", self.output_stem, timeout=0.2)
+        self.assertLess(time.perf_counter() - start, 4)
+        self.assertFalse([name for name in os.listdir(self.tmpdir.name) if name.startswith("roadmap")])
+
+    def test_converter_runs_in_background(self):
+        with patch.dict(os.environ, {"FAKE_DOT_SLEEP": "0.3"}):
+            with GraphvizConverter(["svg"], workers=2) as converter:
+                conversion = converter.submit("digraph {}", self.output_stem)
+                self.assertFalse(conversion.done())
+            # leaving the converter waits for all conversions
+            self.assertTrue(conversion.done())
+        self.assertEqual(conversion.result(), [f"{self.output_stem}.svg"])
+
+    def test_get_graphviz_formats_and_timeout(self):
+        self.assertEqual(get_graphviz_formats({}), GRAPHVIZ_FORMATS)
+        self.assertEqual(get_graphviz_formats({"GRAPHVIZ_FORMATS": '["png","svg"]'}), ["png", "svg"])
+        self.assertEqual(get_graphviz_formats({"GRAPHVIZ_FORMATS": '[]'}), [])
+        for value in ('["png","exe"]', "png", '"png"'):
+            with self.assertRaises(ValueError):
+                get_graphviz_formats({"GRAPHVIZ_FORMATS": value})
+        self.assertEqual(get_graphviz_timeout({"GRAPHVIZ_TIMEOUT": "2.5"}), 2.5)
+        with self.assertRaises(ValueError):
+            get_graphviz_timeout({"GRAPHVIZ_TIMEOUT": "never"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,12 @@ import os
 import logging
 from unittest.mock import patch
 
-from roadmap_app.cli import main, render_templates
+from roadmap_app.cli import (main, render_templates, get_render_workers, run_watch_cycle, render_batch, build_project,
+                             watch_roadmap)
+from roadmap_app.watch import snapshot_files
 from roadmap_app.utils import read_roadmap_definition
-from roadmap_app.rendering import validate_yaml
+from roadmap_app.rendering import validate_yaml, EnvironmentPool, find_templates, process_template
+from roadmap_app.markdown_cache import add_description_html
 from roadmap_app.model import enrich_project
 
 
@@ -41,6 +44,11 @@ class TestIntegration(unittest.TestCase):
             f.write(env_content)
         return env_path
 
+    def _load_config(self, **overrides):
+        """Load config/roadmap.env with CACHE_PATH in the temp directory, tests never write caches to the repo."""
+        from dotenv import dotenv_values
+        return {**dotenv_values(self.env_file), "CACHE_PATH": os.path.join(self.tmpdir, "cache"), **overrides}
+
     def _run_main(self, extra_args=None):
         """Run main() with test fixture, temp output, and temp logfile."""
         env_path = self._create_test_env_file(self.tmpdir)
@@ -143,6 +151,32 @@ class TestIntegration(unittest.TestCase):
             kanban_del = f.read()
         self.assertIn("Milestone 1 - Deliverable 1 - title", kanban_del)
 
+    def test_kanban_cards_show_parent_of_colliding_ids(self):
+        # the milestones "A.B" and "A-B" and their deliverables "D" have the same _id
+        project = {"title": "Collisions",
+                   "objectives": [{"id": "x", "title": "Objective X", "milestones": [
+                                      {"id": "y.z", "title": "First", "state": "IDEA"}]},
+                                  {"id": "x.y", "title": "Objective XY", "milestones": [
+                                      {"id": "z", "title": "Second", "state": "REACHED"}]}],
+                   "milestones": [{"id": "A.B", "title": "Milestone AB", "state": "IDEA",
+                                   "deliverables": [{"id": "D", "title": "Deliverable of AB", "state": "TODO"}]},
+                                  {"id": "A-B", "title": "Milestone A-B", "state": "IDEA",
+                                   "deliverables": [{"id": "D", "title": "Deliverable of A-B", "state": "DONE"}]}]}
+        with self.assertLogs(level="WARNING"):
+            enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        os.makedirs(output_folder)
+        render_templates(project, self._load_config(), output_folder, self.test_existing_file)
+        with open(os.path.join(output_folder, "kanban", "milestones.html")) as f:
+            milestones = f.read()
+        with open(os.path.join(output_folder, "kanban", "deliverables.html")) as f:
+            deliverables = f.read()
+        # every card names its own parent
+        self.assertRegex(milestones, r"Objective XY</span>\s*</div>\s*<h4 id=\"x_y_z\">z - Second")
+        self.assertRegex(milestones, r"Objective X</span>\s*</div>\s*<h4 id=\"x_y_z\">y.z - First")
+        self.assertRegex(deliverables, r"(?s)Milestone A-B</span>(?:(?!</h4>).)*Deliverable of A-B</h4>")
+        self.assertRegex(deliverables, r"(?s)Milestone AB</span>(?:(?!</h4>).)*Deliverable of AB</h4>")
+
     # ── Group 2: CLI argument variations ──
 
     def test_main_skip_items_removes_todos_from_output(self):
@@ -188,11 +222,10 @@ class TestIntegration(unittest.TestCase):
         self.assertIn("timeline_by", project["group"])
 
     def test_enrichment_rendering_pipeline(self):
-        from dotenv import dotenv_values
         project = dict(read_roadmap_definition(self.test_existing_file))
         enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
 
-        config = dotenv_values(self.env_file)
+        config = self._load_config()
         # override logfile to temp dir
         config["LOGFILE"] = os.path.join(self.tmpdir, "roadmap.log")
         output_folder = os.path.join(self.tmpdir, "output") + os.sep
@@ -207,6 +240,26 @@ class TestIntegration(unittest.TestCase):
             self.assertTrue(os.path.exists(filepath), f"Missing: {filename}")
             self.assertGreater(os.path.getsize(filepath), 0, f"Empty: {filename}")
 
+    def test_templates_convert_descriptions_without_description_html(self):
+        # process_template with an enriched project renders the same descriptions as render_templates,
+        # the templates convert the descriptions themselves if description_html is missing
+        project = dict(read_roadmap_definition(self.test_existing_file))
+        enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
+        outputs = {}
+        for name in ("plain", "description_html"):
+            if name == "description_html":
+                add_description_html(project)
+            output_path = os.path.join(self.tmpdir, name)
+            templates = find_templates(self.template_path, ["html"], output_path)
+            for template in templates:
+                process_template(template=template, project=project, environment_pool=EnvironmentPool(),
+                                 roadmap_definition_file=self.test_existing_file)
+            for template in templates:
+                with open(template["output_file"]) as f:
+                    outputs.setdefault(name, []).append(f.read())
+        self.assertIn(project["milestones"][0]["description_html"].strip(), "".join(outputs["plain"]))
+        self.assertEqual(outputs["plain"], outputs["description_html"])
+
     def test_hierarchical_ids_propagate_correctly(self):
         project = dict(read_roadmap_definition(self.test_existing_file))
         enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
@@ -327,11 +380,10 @@ class TestIntegration(unittest.TestCase):
             )
 
         # Run the pipeline
-        from dotenv import dotenv_values
         project = dict(read_roadmap_definition(roadmap_path))
         enrich_project(project, skip_items=None, roadmap_definition_file=roadmap_path)
 
-        config = dotenv_values(self.env_file)
+        config = self._load_config()
         config["LOGFILE"] = os.path.join(self.tmpdir, "roadmap.log")
         output_folder = os.path.join(self.tmpdir, "output") + os.sep
         os.makedirs(output_folder, exist_ok=True)
@@ -415,6 +467,515 @@ class TestIntegration(unittest.TestCase):
             magic = f.read(8)
         self.assertEqual(magic[:4], b'\x89PNG', "File does not have valid PNG magic bytes")
 
+    # ── Group 6: Parallel rendering ──
+
+    def _render_enriched_project(self, output_name, workers, environment_pool=None, force=False):
+        """Enrich the test fixture and render all templates into output_name with given workers."""
+        project = dict(read_roadmap_definition(self.test_existing_file))
+        with patch("time.strftime", return_value="20240101000000"):
+            enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
+        config = self._load_config()
+        output_folder = os.path.join(self.tmpdir, output_name) + os.sep
+        os.makedirs(output_folder, exist_ok=True)
+        timings = render_templates(project, config, output_folder, self.test_existing_file, workers=workers,
+                                   environment_pool=environment_pool, force=force)
+        return output_folder, timings
+
+    @staticmethod
+    def _read_output_tree(output_folder):
+        """Return a dict of relative path -> file content for all files in output_folder."""
+        contents = {}
+        for dirname, _, filenames in os.walk(output_folder):
+            for filename in filenames:
+                path = os.path.join(dirname, filename)
+                with open(path, "rb") as f:
+                    contents[os.path.relpath(path, output_folder)] = f.read()
+        return contents
+
+    def test_parallel_render_output_identical_to_sequential(self):
+        sequential_folder, _ = self._render_enriched_project("sequential", workers=1)
+        parallel_folder, _ = self._render_enriched_project("parallel", workers=4)
+        sequential = self._read_output_tree(sequential_folder)
+        parallel = self._read_output_tree(parallel_folder)
+        self.assertGreater(len(sequential), 0)
+        self.assertEqual(sequential.keys(), parallel.keys())
+        for filename in sequential:
+            self.assertEqual(sequential[filename], parallel[filename], f"output differs: {filename}")
+
+    def test_render_templates_reports_wall_time_per_template(self):
+        from roadmap_app.rendering import TemplateLogFilter
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        handler.addFilter(TemplateLogFilter())
+        with self.assertLogs(level="INFO"):
+            logging.getLogger().addHandler(handler)
+            _, timings = self._render_enriched_project("timed", workers=2)
+        # the timing log lines of parallel workers carry the prefix of their template
+        messages = [f"{record.template}{record.getMessage()}" for record in records
+                    if record.getMessage().startswith(("processing '", "rendered '"))]
+        self.assertEqual(len(messages), 12)
+        for message in messages:
+            self.assertRegex(message, r"^\[(\S+)\] (processing '.*\1'|rendered '\1' in )")
+        self.assertEqual(len(timings), 6)
+        for timing in timings:
+            self.assertIn("template", timing)
+            self.assertIn("output_file", timing)
+            self.assertGreaterEqual(timing["wall_time"], 0)
+        # timings keep the order of templates.yml
+        self.assertTrue(timings[0]["output_file"].endswith("roadmap.html"))
+
+    def test_get_render_workers(self):
+        # commandline takes precedence over environment file
+        self.assertEqual(get_render_workers({"RENDER_WORKERS": "4"}, 2), 2)
+        self.assertEqual(get_render_workers({"RENDER_WORKERS": "4"}), 4)
+        # default is sequential rendering
+        self.assertEqual(get_render_workers({}), 1)
+        self.assertEqual(get_render_workers({}, 0), 1)
+        with self.assertRaises(ValueError):
+            get_render_workers({"RENDER_WORKERS": "many"})
+
+    # ── Group 7: Watch mode ──
+
+    def test_watch_cycle_reruns_only_affected_stages(self):
+        from dotenv import dotenv_values
+        env_path = self._create_test_env_file(self.tmpdir)
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        os.makedirs(output_folder)
+        state = {"config": dotenv_values(env_path), "templates": None, "project": None, "dependencies": {},
+                 "environment_pool": None}
+
+        def cycle(changed_files, added_or_removed_files=None):
+            return run_watch_cycle(state, {os.path.abspath(path) for path in changed_files},
+                                   self.test_existing_file, env_path, output_folder, None, 1,
+                                   added_or_removed_files)
+
+        # first cycle discovers templates, builds the project and renders everything
+        self.assertEqual(cycle(set()), ["templates", "roadmap", "render 6/6"])
+        self.assertTrue(os.path.exists(os.path.join(output_folder, "roadmap.html")))
+        templates = state["templates"]
+
+        # a css change re-renders only the html outputs (html + 2 kanban boards)
+        css_file = os.path.join(self.template_path, "html", "roadmap.css")
+        self.assertEqual(cycle({css_file}), ["render 3/6"])
+        # a markdown template change re-renders only the markdown output
+        md_file = os.path.join(self.template_path, "markdown", "roadmap.md")
+        self.assertEqual(cycle({md_file}), ["render 1/6"])
+
+        # a roadmap change skips template discovery
+        self.assertEqual(cycle({self.test_existing_file}), ["roadmap", "render 6/6"])
+        self.assertIs(state["templates"], templates)
+
+        # a new template file leads to a new discovery
+        self.assertEqual(cycle({md_file}, {os.path.abspath(md_file)}), ["templates", "render 6/6"])
+
+        # an environment change reloads everything
+        self.assertEqual(cycle({env_path}), ["config", "templates", "roadmap", "render 6/6"])
+
+    def test_watch_cycle_waits_for_valid_roadmap(self):
+        from dotenv import dotenv_values
+        invalid_yml = os.path.join(self.tmpdir, "invalid.yml")
+        with open(invalid_yml, "w") as f:
+            f.write("not_a_valid_key: value\n")
+        env_path = self._create_test_env_file(self.tmpdir)
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        state = {"config": dotenv_values(env_path), "templates": None, "project": None, "dependencies": {},
+                 "environment_pool": None}
+        stages = run_watch_cycle(state, set(), invalid_yml, env_path, output_folder, None, 1)
+        # nothing is rendered, but the watch loop keeps running
+        self.assertEqual(stages, ["templates", "roadmap"])
+        self.assertIsNone(state["project"])
+
+    def test_watch_survives_broken_and_missing_roadmap(self):
+        from dotenv import dotenv_values
+        roadmap_file = os.path.join(self.tmpdir, "roadmap.yml")
+        shutil.copy(self.test_existing_file, roadmap_file)
+        with open(roadmap_file) as f:
+            valid_yml = f.read()
+        env_path = self._create_test_env_file(self.tmpdir)
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        os.makedirs(output_folder)
+        output_file = os.path.join(output_folder, "roadmap.html")
+
+        def save_broken_yaml():
+            with open(roadmap_file, "w") as f:
+                f.write("title: [unclosed\n")
+
+        def save_valid_yaml():
+            os.remove(output_file)
+            with open(roadmap_file, "w") as f:
+                f.write(valid_yml)
+
+        # every wait for changes saves the roadmap like an editor would
+        saves = iter([save_broken_yaml, lambda: os.remove(roadmap_file), save_valid_yaml])
+
+        def fake_wait_for_changes(get_paths, snapshot, **kwargs):
+            next(saves)()
+            return {os.path.abspath(roadmap_file)}, snapshot_files(get_paths())
+
+        with patch("roadmap_app.cli.wait_for_changes", fake_wait_for_changes), \
+                self.assertLogs(level="INFO") as logs:
+            watch_roadmap(roadmap_file, env_path, output_folder, None, 1, dotenv_values(env_path), max_cycles=3)
+        errors = [line for line in logs.output if line.startswith("ERROR:root:watch cycle failed")]
+        self.assertEqual(len(errors), 2)
+        self.assertIn("not found", errors[1])
+        # the next valid save renders again
+        self.assertTrue(os.path.exists(output_file))
+        self.assertEqual(sum("watch cycle: roadmap, render 6/6" in line for line in logs.output), 1)
+
+    # ── Group 8: Compiled template cache ──
+
+    def test_compile_templates_command_fills_cache(self):
+        env_path = self._create_test_env_file(self.tmpdir)
+        cache_path = os.path.join(self.tmpdir, "cache")
+        with open(env_path, "a") as f:
+            f.write(f"CACHE_PATH={cache_path}\n")
+        output_dir = os.path.join(self.tmpdir, "output")
+        argv = ["roadmap", "compile-templates", "--output-dir", output_dir, "--environment", env_path]
+        with patch("sys.argv", argv):
+            main()
+        # every file from the template directories is compiled, nothing is rendered
+        cached = os.listdir(os.path.join(cache_path, "templates"))
+        self.assertGreater(len(cached), 20)
+        self.assertFalse(os.path.exists(output_dir))
+
+        # rendering afterwards uses the cache and produces the same outputs
+        with patch("sys.argv", ["roadmap", "--roadmap-file", self.test_existing_file, "--output-dir", output_dir,
+                                "--environment", env_path]):
+            main()
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "roadmap.html")))
+        self.assertEqual(sorted(os.listdir(os.path.join(cache_path, "templates"))), sorted(cached))
+
+    def test_parallel_render_compiles_every_file_once(self):
+        from jinja2 import Environment
+        compiled = []
+        original_compile = Environment.compile
+
+        def counting_compile(env, source, name=None, filename=None, *args, **kwargs):
+            compiled.append(filename)
+            return original_compile(env, source, name, filename, *args, **kwargs)
+
+        # without persistent cache every file has to be compiled in this process - but only once
+        with patch("roadmap_app.cli.get_template_bytecode_cache", return_value=None), \
+                patch.object(Environment, "compile", counting_compile):
+            self._render_enriched_project("compiled", workers=4)
+        self.assertIn(os.path.abspath(os.path.join(self.template_path, "html", "roadmap.css")), compiled)
+        self.assertEqual(len(compiled), len(set(compiled)))
+
+    def test_production_render_output_identical_without_reload_checks(self):
+        default_pool = EnvironmentPool()
+        default_folder, _ = self._render_enriched_project("default", workers=1, environment_pool=default_pool)
+        pool = EnvironmentPool(production=True)
+        production_folder, _ = self._render_enriched_project("production", workers=2, environment_pool=pool)
+        self.assertEqual(self._read_output_tree(default_folder), self._read_output_tree(production_folder))
+        stats = pool.stats.as_dict()
+        # the kanban boards include a card per milestone/deliverable, no include touches the filesystem
+        self.assertGreater(stats["include_resolutions"], 50)
+        self.assertEqual(stats["uptodate_checks"], 0)
+        # the templates reachable from the outputs are read once, the 2 dependency partials are not rendered
+        # without depends_on in the fixture, files which no output references are not read
+        self.assertEqual(stats["source_loads"], default_pool.stats.as_dict()["source_loads"] + 2)
+
+    # ── Group 9: Batch mode ──
+
+    def test_main_renders_batch_from_list_file(self):
+        invalid_yml = os.path.join(self.tmpdir, "invalid.yml")
+        with open(invalid_yml, "w") as f:
+            f.write("not_a_valid_key: value\n")
+        list_file = os.path.join(self.tmpdir, "roadmaps.txt")
+        with open(list_file, "w") as f:
+            f.write(f"{os.path.abspath(self.test_existing_file)} first\n"
+                    f"{invalid_yml} invalid\n"
+                    f"{os.path.abspath(self.test_existing_file)} second\n")
+        env_path = self._create_test_env_file(self.tmpdir)
+        argv = ["roadmap", "--roadmap-file", f"@{list_file}", "--output-dir", os.path.join(self.tmpdir, "output"),
+                "--environment", env_path, "--workers", "2"]
+        with patch("sys.argv", argv), patch("time.strftime", return_value="20240101000000"), \
+                self.assertLogs(level="INFO") as logs:
+            main()
+        first = self._read_output_tree(os.path.join(self.tmpdir, "first"))
+        self.assertIn(os.path.join("kanban", "milestones.html"), first)
+        # both roadmaps of the batch are rendered identically, the invalid roadmap does not stop the batch
+        self.assertEqual(first, self._read_output_tree(os.path.join(self.tmpdir, "second")))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "invalid")))
+        self.assertTrue(any("batch: rendered 2 of 3 roadmaps, 1 failed" in line for line in logs.output))
+
+    def test_render_batch_output_identical_to_single_render(self):
+        single_folder, _ = self._render_enriched_project("single", workers=1)
+        config = self._load_config()
+        jobs = [(self.test_existing_file, os.path.join(self.tmpdir, "batch", "roadmap") + os.sep),
+                (os.path.join(self.tmpdir, "missing.yml"), os.path.join(self.tmpdir, "batch", "missing") + os.sep)]
+        with patch("time.strftime", return_value="20240101000000"):
+            results = render_batch(jobs, config, os.path.join(self.tmpdir, "batch"), None, workers=2)
+        self.assertEqual([result["success"] for result in results], [True, False])
+        self.assertEqual(results[1]["roadmap_file"], jobs[1][0])
+        self.assertIsNotNone(results[1]["error"])
+        self.assertEqual(self._read_output_tree(single_folder), self._read_output_tree(jobs[0][1]))
+
+    # ── Group 10: Roadmap caches ──
+
+    def test_build_project_skips_validation_of_unchanged_roadmap(self):
+        from roadmap_app.validation import ValidationResultCache
+        config = self._load_config()
+        roadmap_file = os.path.join(self.tmpdir, "roadmap.yml")
+        shutil.copy(self.test_existing_file, roadmap_file)
+        validation_cache = ValidationResultCache(os.path.join(self.tmpdir, "cache", "validation"))
+
+        def build(**kwargs):
+            with patch("roadmap_app.cli.validate_yaml", wraps=validate_yaml) as validate_mock:
+                project = build_project(roadmap_file, config, None, validation_cache=validation_cache, **kwargs)
+            self.assertIsNotNone(project)
+            return validate_mock.call_count
+
+        self.assertEqual(build(), 1)
+        self.assertEqual(build(), 0)
+        self.assertEqual(build(force_validate=True), 1)
+        # a changed roadmap is validated again
+        with open(roadmap_file, "a") as f:
+            f.write("\n# changed\n")
+        self.assertEqual(build(), 1)
+        self.assertEqual((validation_cache.hits, validation_cache.misses), (1, 2))
+
+        # invalid roadmaps are validated on every run
+        with open(roadmap_file, "w") as f:
+            f.write("not_a_valid_key: value\n")
+        for _ in range(2):
+            self.assertIsNone(build_project(roadmap_file, config, None, validation_cache=validation_cache))
+        self.assertEqual(validation_cache.hits, 1)
+
+    def test_build_project_reads_unchanged_roadmap_from_cache(self):
+        config = self._load_config()
+        with patch("time.strftime", return_value="20240101000000"):
+            project = build_project(self.test_existing_file, config, None)
+            with patch("roadmap_app.utils.load_yml", side_effect=AssertionError("parsed again")):
+                cached_project = build_project(self.test_existing_file, config, None)
+        self.assertEqual(cached_project, project)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmpdir, "cache", "yaml"))), 1)
+
+    def test_build_project_reads_roadmap_once(self):
+        config = self._load_config()
+        with patch("roadmap_app.utils.open", create=True, side_effect=open) as open_mock, \
+                patch("roadmap_app.model.calculate_roadmap_version", side_effect=AssertionError("read again")):
+            project = build_project(self.test_existing_file, config, None)
+        self.assertEqual(project["meta"]["version"], self.version_existing_roadmap)
+        self.assertEqual(open_mock.call_count, 1)
+        with self.assertRaises(ValueError):
+            build_project(os.path.join(self.tmpdir, "missing.yml"), config, None)
+
+    # ── Group 11: Profiling ──
+
+    def test_main_writes_profile_report(self):
+        import json
+        env_path = self._create_test_env_file(self.tmpdir)
+        profile_path = os.path.join(self.tmpdir, "profile.json")
+        argv = ["roadmap", "--roadmap-file", self.test_existing_file, "--output-dir", os.path.join(self.tmpdir, "output"),
+                "--environment", env_path, "--profile", profile_path, "--profile-dir", os.path.join(self.tmpdir, "prof")]
+        with patch("sys.argv", argv):
+            main()
+        with open(profile_path) as f:
+            report = json.load(f)
+        self.assertEqual([record["name"] for record in report["stages"]],
+                         ["read", "validate", "enrich", "find_templates", "render"])
+        self.assertTrue(all(os.path.exists(record["cprofile"]) for record in report["stages"]))
+        self.assertEqual(len(report["templates"]), 6)
+        self.assertIsNone(report["peak_memory"])
+        # profiling options without report are rejected
+        with patch("sys.argv", argv[:-4] + ["--profile-memory"]), self.assertRaises(ValueError):
+            main()
+
+    # ── Group 12: Render manifest ──
+
+    def test_render_skips_outputs_with_unchanged_inputs(self):
+        template_path = os.path.join(self.tmpdir, "templates")
+        shutil.copytree(self.template_path, template_path)
+        config = self._load_config(TEMPLATE_PATH=template_path + os.sep)
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        os.makedirs(output_folder)
+
+        def render(**kwargs):
+            project = build_project(self.test_existing_file, config, None)
+            timings = render_templates(project, config, output_folder, self.test_existing_file, **kwargs)
+            return {os.path.relpath(timing["output_file"], output_folder) for timing in timings
+                    if not timing["skipped"]}
+
+        all_outputs = render()
+        self.assertIn("roadmap.html", all_outputs)
+        self.assertIn("roadmap.dot", all_outputs)
+        first_output = self._read_output_tree(output_folder)
+        self.assertEqual(render(), set())
+        self.assertEqual(render(force=True), all_outputs)
+        # a changed partial renders only the outputs which loaded it
+        with open(os.path.join(template_path, "html", "roadmap.css"), "a") as f:
+            f.write("/* changed */")
+        changed = {"roadmap.html", os.path.join("kanban", "deliverables.html"), os.path.join("kanban", "milestones.html")}
+        self.assertEqual(render(workers=2), changed)
+        self.assertLess(changed, all_outputs)
+        # a deleted output is rendered again
+        os.remove(os.path.join(output_folder, "roadmap.md"))
+        self.assertEqual(render(), {"roadmap.md"})
+        self.assertEqual(self._read_output_tree(output_folder).keys(), first_output.keys())
+
+    # ── Group 13: Output writer ──
+
+    def test_forced_render_keeps_unchanged_outputs(self):
+        output_folder, _ = self._render_enriched_project("output", workers=1)
+        outputs = [os.path.join(root, name) for root, _, names in os.walk(output_folder)
+                   for name in names if not name.startswith(".")]
+        for output in outputs:
+            os.utime(output, (1000000000, 1000000000))
+        # same project and render time, every output is rendered again with identical content
+        _, timings = self._render_enriched_project("output", workers=2, force=True)
+        self.assertFalse(any(timing["skipped"] for timing in timings))
+        self.assertEqual([os.stat(output).st_mtime for output in outputs], [1000000000] * len(outputs))
+        self.assertTrue(os.path.exists(os.path.join(output_folder, ".roadmap.lock")))
+        self.assertFalse([name for name in os.listdir(output_folder) if name.endswith(".tmp")])
+
+    # ── Group 14: Graphviz pipeline ──
+
+    @unittest.skipUnless(os.name == "posix", "fake dot is a shell script")
+    def test_dot_output_converted_in_background_into_all_formats(self):
+        from test_graphviz import install_fake_dot
+        from roadmap_app.graphviz import is_graphviz_installed
+        fake_dot_dir = os.path.join(self.tmpdir, "bin")
+        os.makedirs(fake_dot_dir)
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        os.makedirs(output_folder)
+        config = self._load_config(GRAPHVIZ_FORMATS='["png","svg"]')
+        project = build_project(self.test_existing_file, config, None)
+
+        def render():
+            timings = render_templates(project, config, output_folder, self.test_existing_file, workers=2)
+            return [os.path.basename(timing["output_file"]) for timing in timings if not timing["skipped"]]
+
+        is_graphviz_installed.cache_clear()
+        try:
+            with patch.dict(os.environ, install_fake_dot(fake_dot_dir)):
+                self.assertEqual(len(render()), 6)
+                with open(os.path.join(output_folder, "roadmap.dot")) as f:
+                    dot = f.read()
+                # the fake dot writes its stdin to every format
+                for fmt in ("png", "svg"):
+                    with open(os.path.join(output_folder, f"roadmap.dot.{fmt}")) as f:
+                        self.assertEqual(f.read(), dot.rstrip("\n"))
+                # converted outputs are recorded in the manifest
+                self.assertEqual(render(), [])
+                # other formats render the dot template only
+                config["GRAPHVIZ_FORMATS"] = '["pdf"]'
+                self.assertEqual(render(), ["roadmap.dot"])
+                self.assertTrue(os.path.exists(os.path.join(output_folder, "roadmap.dot.pdf")))
+                # a conversion running into GRAPHVIZ_TIMEOUT is logged and not recorded
+                config["GRAPHVIZ_TIMEOUT"] = "0.2"
+                config["GRAPHVIZ_FORMATS"] = '["svg"]'
+                with patch.dict(os.environ, {"FAKE_DOT_SLEEP": "5"}):
+                    with self.assertLogs(level="ERROR") as captured:
+                        self.assertEqual(render(), ["roadmap.dot"])
+                    self.assertIn("timed out after 0.2 seconds", "\n".join(captured.output))
+                    with self.assertLogs(level="ERROR"):
+                        self.assertEqual(render(), ["roadmap.dot"])
+                # without formats the dot output is recorded unconverted
+                config["GRAPHVIZ_FORMATS"] = '[]'
+                self.assertEqual(render(), ["roadmap.dot"])
+                self.assertEqual(render(), [])
+        finally:
+            is_graphviz_installed.cache_clear()
+
+    # ── Group 15: Markdown cache ──
+
+    def test_markdown_converted_once_and_persisted(self):
+        from roadmap_app.markdown_cache import get_markdown_renderer
+        config = self._load_config()
+        project = build_project(self.test_existing_file, config, None)
+
+        def render(output_name):
+            output_folder = os.path.join(self.tmpdir, output_name) + os.sep
+            os.makedirs(output_folder)
+            pool = EnvironmentPool(markdown_renderer=get_markdown_renderer(config))
+            render_templates(project, config, output_folder, self.test_existing_file, environment_pool=pool)
+            outputs = self._read_output_tree(output_folder)
+            return {name: content for name, content in outputs.items() if not name.startswith(".")}, pool
+
+        first_outputs, pool = render("first")
+        milestone = project["milestones"][0]
+        self.assertIn(milestone["description_html"].encode("utf-8"), first_outputs["roadmap.html"])
+        # texts shared by several elements and outputs are converted once
+        self.assertGreater(pool.markdown_renderer.hits, 0)
+        # the next run takes all conversions from CACHE_PATH/markdown
+        second_outputs, pool = render("second")
+        self.assertEqual(pool.markdown_renderer.misses, 0)
+        self.assertEqual(second_outputs, first_outputs)
+
+    # ── Group 16: Dependencies ──
+
+    def _write_roadmap_with_dependencies(self, cycle=False):
+        import yaml
+        roadmap = read_roadmap_definition(self.test_existing_file)
+        roadmap["milestones"][1]["depends_on"] = ["M1"]
+        roadmap["milestones"][0]["deliverables"][1]["depends_on"] = ["m1_d1"]
+        roadmap["objectives"][0]["keyresults"][0]["depends_on"] = ["M2", "M1.D2"]
+        if cycle:
+            roadmap["milestones"][0]["deliverables"][0]["depends_on"] = ["o1_r1"]
+        roadmap_file = os.path.join(self.tmpdir, "roadmap.yml")
+        with open(roadmap_file, "w") as f:
+            yaml.safe_dump(roadmap, f, sort_keys=False, allow_unicode=True)
+        return roadmap_file
+
+    def test_dependencies_are_rendered(self):
+        config = self._load_config()
+        roadmap_file = self._write_roadmap_with_dependencies()
+        project = build_project(roadmap_file, config, None)
+        dependencies = project["dependencies"]
+        self.assertEqual([element["_id"] for element in dependencies["critical_path"]], ["m1_d1", "m1_d2", "o1_r1"])
+        self.assertEqual([element["_id"] for element in dependencies["order"]], ["m1", "m1_d1", "m2", "m1_d2", "o1_r1"])
+
+        output_folder = os.path.join(self.tmpdir, "output") + os.sep
+        os.makedirs(output_folder)
+        render_templates(project, config, output_folder, roadmap_file)
+        with open(os.path.join(output_folder, "roadmap.dot")) as f:
+            dot = f.read()
+        self.assertIn("m1 -> m2;", dot)
+        self.assertIn('m1_d2 -> o1_r1 [color="red"', dot)
+        with open(os.path.join(output_folder, "roadmap.html")) as f:
+            html = f.read()
+        self.assertIn("<h2>Critical Path</h2>", html)
+        self.assertIn('<r-deliverable id="m1_d2" class="DONE critical">', html)
+        self.assertIn('depends on <a href="#m1">', html)
+        # a cycle makes the roadmap invalid
+        roadmap_file = self._write_roadmap_with_dependencies(cycle=True)
+        with self.assertLogs(level="ERROR") as captured:
+            self.assertIsNone(build_project(roadmap_file, config, None))
+        self.assertIn("depends_on cycle: o1_r1 -> m1_d1 -> m1_d2 -> o1_r1", "\n".join(captured.output))
+
+    # ── Group 17: Ranking ──
+
+    def test_main_reports_top_ranked_items(self):
+        env_path = self._create_test_env_file(self.tmpdir)
+        argv = ["roadmap", "--roadmap-file", self.test_existing_file, "--output-dir",
+                os.path.join(self.tmpdir, "output"), "--environment", env_path, "--top", "2"]
+        with patch("sys.argv", argv), self.assertLogs(level="INFO") as logs:
+            main()
+        report = [line for line in logs.output if "wsjf" in line or line.startswith("INFO:root:top")]
+        self.assertEqual(report[0], "INFO:root:top 2 of 9 keyresults and deliverables by weighted shortest job first:")
+        self.assertEqual(len(report), 3)
+        self.assertIn("1. wsjf 3.0, cost of delay 12, jobsize 4: m1_d4", report[1])
+
+        # a batch reports the top items of all its roadmaps
+        list_file = os.path.join(self.tmpdir, "roadmaps.txt")
+        with open(list_file, "w") as f:
+            f.write(f"{os.path.abspath(self.test_existing_file)} first\n"
+                    f"{os.path.abspath(self.test_existing_file)} second\n")
+        argv[2] = f"@{list_file}"
+        with patch("sys.argv", argv), self.assertLogs(level="INFO") as logs:
+            main()
+        report = [line for line in logs.output if "wsjf" in line or line.startswith("INFO:root:top")]
+        self.assertEqual(report[0], "INFO:root:top 2 of 18 keyresults and deliverables by weighted shortest job first:")
+        # equal items are ranked in the order of the roadmaps
+        self.assertIn("1. wsjf 3.0, cost of delay 12, jobsize 4: m1_d4", report[1])
+        self.assertIn("2. wsjf 3.0, cost of delay 12, jobsize 4: m1_d4", report[2])
+        self.assertTrue(report[1].endswith(f"({os.path.abspath(self.test_existing_file)})"))
+
+        with patch("sys.argv", argv[:-1] + ["0"]), self.assertRaises(ValueError):
+            main()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import logging
+import threading
+
+from roadmap_app import logs
+from roadmap_app.logs import summarize, is_log_async, start_log_queue, stop_log_queue
+from roadmap_app.rendering import TemplateLogFilter, current_template
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.threads.add(threading.current_thread().name)
+        self.records.append(f"{record.template}{record.getMessage()}")
+
+
+class Payload:
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "payload"
+
+
+class TestLogs(unittest.TestCase):
+    def setUp(self):
+        self.root_logger = logging.getLogger()
+        self.root_level = self.root_logger.level
+        self.root_handlers = list(self.root_logger.handlers)
+
+    def tearDown(self):
+        stop_log_queue()
+        for handler in list(self.root_logger.handlers):
+            self.root_logger.removeHandler(handler)
+        for handler in self.root_handlers:
+            self.root_logger.addHandler(handler)
+        self.root_logger.setLevel(self.root_level)
+
+    def test_small_payload_is_logged_as_it_is(self):
+        self.assertEqual(str(summarize({"title": "Roadmap"})), "{'title': 'Roadmap'}")
+        self.assertEqual(str(summarize("short")), "short")
+
+    def test_large_payload_is_summarized(self):
+        project = {f"key{index}": "x" * 100 for index in range(20)}
+        summary = str(summarize(project))
+        self.assertTrue(summary.startswith("dict with 20 keys (key0, key1, key2"), summary)
+        self.assertIn("key9, ...), ", summary)
+        self.assertLess(len(summary), 200)
+        # the hash tells different payloads of the same size apart
+        self.assertNotEqual(summary, str(summarize(dict(project, key0="y" * 100))))
+        self.assertTrue(str(summarize(list(range(1000)))).startswith("list with 1000 items, "))
+        text = str(summarize("x" * 5000, max_length=10))
+        self.assertTrue(text.startswith("xxxxxxxxxx... (5000 chars, sha256 "), text)
+
+    def test_payload_is_formatted_lazily(self):
+        payload = Payload()
+        self.root_logger.setLevel(logging.INFO)
+        logging.debug("payload: %s", summarize(payload))
+        self.assertEqual(payload.formatted, 0)
+        with self.assertLogs(level="DEBUG") as captured:
+            logging.debug("payload: %s", summarize(payload))
+        self.assertEqual(captured.output, ["DEBUG:root:payload: payload"])
+        self.assertEqual(payload.formatted, 1)
+
+    def test_is_log_async(self):
+        self.assertTrue(is_log_async({"LOG_ASYNC": "true"}))
+        self.assertTrue(is_log_async({"LOG_ASYNC": " 1 "}))
+        self.assertFalse(is_log_async({"LOG_ASYNC": "false"}))
+        self.assertFalse(is_log_async({"LOG_ASYNC": None}))
+        self.assertFalse(is_log_async({}))
+
+    def test_log_queue_writes_in_background_thread(self):
+        handler = ListHandler()
+        handler.addFilter(TemplateLogFilter())
+        for root_handler in list(self.root_logger.handlers):
+            self.root_logger.removeHandler(root_handler)
+        self.root_logger.addHandler(handler)
+        self.root_logger.setLevel(logging.INFO)
+
+        start_log_queue(TemplateLogFilter())
+        self.assertIsNotNone(logs._queue_listener)
+        self.assertNotIn(handler, self.root_logger.handlers)
+
+        def render():
+            current_template.set("roadmap.html")
+            logging.info("rendered")
+
+        thread = threading.Thread(target=render)
+        thread.start()
+        thread.join()
+        logging.info("finished")
+        stop_log_queue()
+
+        # the template name is taken from the thread which logged the record
+        self.assertEqual(handler.records, ["[roadmap.html] rendered", "finished"])
+        self.assertNotIn(threading.current_thread().name, handler.threads)
+        self.assertEqual(self.root_logger.handlers, [handler])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import tempfile
+import os
+from unittest.mock import patch
+
+from roadmap_app.utils import LazyKeyValueList
+from roadmap_app.manifest import RenderManifest, get_project_hash, get_config_hash, MANIFEST_FILE
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.template_dir = os.path.join(self.tmpdir.name, "templates")
+        self.output_folder = os.path.join(self.tmpdir.name, "output")
+        os.makedirs(self.template_dir)
+        os.makedirs(self.output_folder)
+        self.partial = self._write(os.path.join(self.template_dir, "partial.html"), "partial")
+        self.template = {"path": self.template_dir, "file": "roadmap.html", "suffix": "html",
+                         "output_name": "roadmap.html", "output_file_basename": "roadmap",
+                         "output_file": os.path.join(self.output_folder, "roadmap.html"),
+                         "output_path": self.output_folder}
+        self.output_file = self._write(self.template["output_file"], "rendered")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def _write(path, content):
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def _record(self, manifest, project_hash="project"):
+        manifest.record(self.template, project_hash, [self.partial], [self.output_file])
+
+    def test_project_hash_ignores_rendertime(self):
+        project = {"title": "Roadmap", "meta": {"version": "1234abcd", "rendertime": "20240101000000"},
+                   "as_list": [{"key": "meta.rendertime", "value": "20240101000000"}]}
+        later = {"title": "Roadmap", "meta": {"version": "1234abcd", "rendertime": "20240102000000"},
+                 "as_list": [{"key": "meta.rendertime", "value": "20240102000000"}]}
+        self.assertEqual(get_project_hash(project), get_project_hash(later))
+        self.assertNotEqual(get_project_hash(project), get_project_hash(dict(project, title="Changed")))
+        # the project itself is not changed
+        self.assertIn("rendertime", project["meta"])
+        # the flat list is derived from the project, it is not built to hash the project
+        with patch("roadmap_app.utils.iter_key_value_list", side_effect=AssertionError("built")):
+            self.assertEqual(get_project_hash(dict(project, as_list=LazyKeyValueList(project))),
+                             get_project_hash(project))
+        # as the index and the ids of the elements
+        self.assertEqual(get_project_hash(dict(project, index={"parent": {}}, by_id={"m1": {}})),
+                         get_project_hash(project))
+
+    def test_config_hash_ignores_output_location(self):
+        moved = dict(self.template, output_file="/elsewhere/roadmap.html", output_path="/elsewhere")
+        self.assertEqual(get_config_hash(self.template), get_config_hash(moved))
+        self.assertNotEqual(get_config_hash(self.template), get_config_hash(dict(self.template, output_name="x.html")))
+        # settings of a template change its outputs
+        self.assertNotEqual(get_config_hash(self.template), get_config_hash(self.template, {"graphviz_formats": ["svg"]}))
+
+    def test_unchanged_inputs_are_up_to_date(self):
+        manifest = RenderManifest(self.output_folder)
+        self.assertFalse(manifest.is_up_to_date(self.template, "project"))
+        self._record(manifest)
+        manifest.save()
+        self.assertTrue(os.path.exists(os.path.join(self.output_folder, MANIFEST_FILE)))
+
+        manifest = RenderManifest(self.output_folder)
+        self.assertTrue(manifest.is_up_to_date(self.template, "project"))
+        self.assertEqual(manifest.get_dependencies(self.template), [self.partial])
+        self.assertFalse(manifest.is_up_to_date(self.template, "changed project"))
+        self.assertFalse(manifest.is_up_to_date(dict(self.template, suffix="md"), "project"))
+
+    def test_changed_dependency_or_missing_output_is_rendered(self):
+        manifest = RenderManifest(self.output_folder)
+        self._record(manifest)
+        manifest.save()
+        self._write(self.partial, "changed partial")
+        self.assertFalse(RenderManifest(self.output_folder).is_up_to_date(self.template, "project"))
+
+        manifest = RenderManifest(self.output_folder)
+        self._record(manifest)
+        manifest.save()
+        os.remove(self.output_file)
+        self.assertFalse(RenderManifest(self.output_folder).is_up_to_date(self.template, "project"))
+
+    def test_failed_render_is_not_recorded(self):
+        manifest = RenderManifest(self.output_folder)
+        self._record(manifest)
+        # processing the template failed, it wrote no file
+        manifest.record(self.template, "project", [self.partial], [])
+        manifest.save()
+        self.assertFalse(RenderManifest(self.output_folder).is_up_to_date(self.template, "project"))
+        # a broken manifest is ignored
+        self._write(os.path.join(self.output_folder, MANIFEST_FILE), "{broken")
+        self.assertEqual(RenderManifest(self.output_folder).entries, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
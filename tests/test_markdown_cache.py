@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import os
+import pickle
+from unittest.mock import patch
+
+from roadmap_app.markdown_cache import (MarkdownRenderer, get_markdown_renderer, add_description_html,
+                                        MARKDOWN_CACHE_SIZE, MARKDOWN_CACHE_FILE)
+from roadmap_app.rendering import EnvironmentPool
+
+
+class TestMarkdownCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_convert_is_cached(self):
+        renderer = MarkdownRenderer(max_entries=2)
+        self.assertEqual(renderer.convert("**bold**"), "<p><strong>bold</strong></p>")
+        self.assertEqual(renderer.convert("**bold**"), "<p><strong>bold</strong></p>")
+        self.assertEqual((renderer.hits, renderer.misses), (1, 1))
+        with patch("markdown.Markdown.convert", side_effect=AssertionError("converted again")):
+            renderer.convert("**bold**")
+        # the least recently used text is evicted
+        renderer.convert("first")
+        renderer.convert("**bold**")
+        renderer.convert("second")
+        self.assertEqual(renderer.misses, 3)
+        renderer.convert("**bold**")
+        renderer.convert("first")
+        self.assertEqual((renderer.hits, renderer.misses), (4, 4))
+
+    def test_persisted_cache(self):
+        directory = os.path.join(self.tmpdir.name, "markdown")
+        renderer = MarkdownRenderer(directory=directory)
+        renderer.convert("*cached*")
+        renderer.save()
+        cache_file = os.path.join(directory, MARKDOWN_CACHE_FILE)
+        os.utime(cache_file, (1000000000, 1000000000))
+
+        renderer = MarkdownRenderer(directory=directory)
+        self.assertEqual(renderer.convert("*cached*"), "<p><em>cached</em></p>")
+        self.assertEqual((renderer.hits, renderer.misses), (1, 0))
+        # nothing was converted, the cache is not written again
+        renderer.save()
+        self.assertEqual(os.stat(cache_file).st_mtime, 1000000000)
+
+        # a cache of other markdown versions or a broken cache is ignored
+        with open(cache_file, "wb") as f:
+            pickle.dump(("0.0|other", [("*cached*", "stale")]), f)
+        self.assertEqual(MarkdownRenderer(directory=directory).convert("*cached*"), "<p><em>cached</em></p>")
+        with open(cache_file, "wb") as f:
+            f.write(b"broken")
+        self.assertEqual(MarkdownRenderer(directory=directory).convert("*cached*"), "<p><em>cached</em></p>")
+
+    def test_description_html_like_markdown_block(self):
+        path = os.path.join(self.tmpdir.name, "html")
+        os.makedirs(path)
+        with open(os.path.join(path, "item.html"), "w") as f:
+            f.write("{% markdown %}{{ item.description }}{% endmarkdown %}|{{ item.description_html }}")
+        project = {"description": "Project *description*",
+                   "milestones": [{"title": "M1", "description": "\n  - one\n  - two\n",
+                                   "deliverables": [{"description": "`code` & <b>"}, {"title": "no description"}]}],
+                   "as_list": [{"key": "description", "description": "not converted"}]}
+        pool = EnvironmentPool()
+        add_description_html(project, pool.markdown_renderer)
+        self.assertNotIn("description_html", project["as_list"][0])
+        self.assertNotIn("description_html", project["milestones"][0]["deliverables"][1])
+
+        template = pool.get_environment([path]).get_template("item.html")
+        for item in (project, project["milestones"][0], project["milestones"][0]["deliverables"][0]):
+            inline, precomputed = template.render(item=item).split("|")
+            self.assertEqual(inline, precomputed)
+        # the {% markdown %} blocks were converted by the renderer of the pool
+        self.assertEqual(pool.markdown_renderer.misses, 3)
+        self.assertEqual(pool.markdown_renderer.hits, 3)
+        self.assertIs(pool.get_environment([self.tmpdir.name]).markdown_renderer, pool.markdown_renderer)
+
+    def test_get_markdown_renderer(self):
+        renderer = get_markdown_renderer({})
+        self.assertEqual((renderer.max_entries, renderer.directory), (MARKDOWN_CACHE_SIZE, None))
+        renderer = get_markdown_renderer({"MARKDOWN_CACHE_SIZE": "10", "CACHE_PATH": self.tmpdir.name})
+        self.assertEqual((renderer.max_entries, renderer.directory), (10, os.path.join(self.tmpdir.name, "markdown")))
+        with self.assertRaises(ValueError):
+            get_markdown_renderer({"MARKDOWN_CACHE_SIZE": "many"})
+
+
+if __name__ == '__main__':
+    unittest.main()
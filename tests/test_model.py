@@ -1,9 +1,14 @@
 import unittest
 import os
+import time
+import tracemalloc
+from collections.abc import Sequence
 from roadmap_app.utils import read_roadmap_definition
 from roadmap_app.model import (remove_element, calculate_cost_of_delay,
                                calculate_weighted_shortest_job_first, calculate_wsjf_quantifiers_for_element_items,
-                               make_id_from, get_items_grouped_by_date, enrich_project)
+                               make_id_from, get_items_grouped_by_date, enrich_project,
+                               build_element_index, calculate_ids_for_element_items,
+                               build_dependency_graph, get_jobsize)
 
 
 class TestModel(unittest.TestCase):
@@ -360,6 +365,8 @@ class TestModel(unittest.TestCase):
         self.assertIn("2024-02", grouped)
         self.assertEqual(len(grouped["2024-01"]), 2)
         self.assertEqual(len(grouped["2024-02"]), 1)
+        # the groups contain the items, not copies
+        self.assertIs(grouped["2024-02"][0], items[2])
 
     def test_get_items_grouped_by_date_without_date(self):
         # test items without date attribute are grouped under "None"
@@ -400,6 +407,24 @@ class TestModel(unittest.TestCase):
         as_list_keys = [item["key"] for item in project["as_list"]]
         self.assertIn("visionstatement", as_list_keys)
 
+    def test_enrich_project_as_list_keeps_fields_named_like_derived_fields(self):
+        # test that only the derived fields are left out of as_list, not fields of the roadmap with their names
+        project = dict(read_roadmap_definition(self.test_existing_file))
+        project["milestones"][0]["custom"] = {"index": 1, "ranking": "high", "base64": "abc",
+                                              "description_html": "<b>kept</b>"}
+        enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
+        # fields added when rendering
+        project["logo"] = {"filename": "logo.png", "base64": "data:image/png;base64,"}
+        project["milestones"][0]["description"] = "Milestone"
+        project["milestones"][0]["description_html"] = "<p>Milestone</p>"
+        keys = [item["key"] for item in project["as_list"]]
+        for key in ("index", "ranking", "base64", "description_html"):
+            self.assertIn(f"milestones.custom.{key}", keys)
+        self.assertIn("logo.filename", keys)
+        self.assertNotIn("logo.base64", keys)
+        self.assertNotIn("milestones.description_html", keys)
+        self.assertFalse([key for key in keys if key.split(".")[0] in ("index", "by_id", "dependencies", "ranking")])
+
     def test_enrich_project(self):
         # test that enrich_project adds all expected computed fields
         project = dict(read_roadmap_definition(self.test_existing_file))
@@ -419,8 +444,194 @@ class TestModel(unittest.TestCase):
         self.assertIn("group", project)
         # as_list should be present
         self.assertIn("as_list", project)
-        self.assertIsInstance(project["as_list"], list)
+        self.assertIsInstance(project["as_list"], Sequence)
         self.assertGreater(len(project["as_list"]), 0)
+        # index should be present, but not in as_list
+        self.assertIn("index", project)
+        self.assertIs(project["index"]["milestones"]["all"][0], project["milestones"][0])
+        self.assertFalse([item for item in project["as_list"] if item["key"].startswith("index")])
+        # every element by its _id, not in as_list
+        self.assertIs(project["by_id"][project["milestones"][0]["_id"]], project["milestones"][0])
+        self.assertIs(project["by_id"], project["index"]["by_id"])
+        self.assertFalse([item for item in project["as_list"] if item["key"].startswith("by_id")])
+        # the roadmap has no depends_on links
+        self.assertEqual(project["dependencies"]["critical_path"], [])
+        # keyresults and deliverables with wsjf are ranked, highest cost of delay first
+        self.assertEqual(len(project["ranking"]), 9)
+        self.assertIs(project["ranking"].top(1)[0], project["milestones"][0]["deliverables"][3])
+        self.assertFalse([item for item in project["as_list"] if item["key"].startswith("ranking")])
+
+    def test_enrich_project_in_place(self):
+        # test that enrich_project changes the elements in place and adds less memory than the parsed roadmap
+        tracemalloc.start()
+        try:
+            project = read_roadmap_definition(self.test_existing_file)
+            parsed = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            objectives, milestones = project["objectives"], project["milestones"]
+            deliverables = milestones[0]["deliverables"]
+            enrich_project(project, skip_items=None, roadmap_definition_file=self.test_existing_file)
+            peak = tracemalloc.get_traced_memory()[1] - parsed
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, parsed)
+        # the lists of the parsed roadmap are kept on every nesting level
+        self.assertIs(project["objectives"], objectives)
+        self.assertIs(project["milestones"], milestones)
+        self.assertIs(project["milestones"][0]["deliverables"], deliverables)
+        self.assertIn("_id", deliverables[0])
+        # groups refer to the elements
+        grouped = [item for items in project["group"]["objectives_by"]["date"].values() for item in items]
+        self.assertIs(grouped[0], objectives[0])
+        # pairs of as_list with the same key share it
+        titles = [item for item in project["as_list"] if item["key"] == "milestones.title"]
+        self.assertIs(titles[0]["key"], titles[1]["key"])
+
+    def test_build_element_index(self):
+        # test that elements of all nesting levels are grouped by state, date, requirement and tag
+        project = {
+            "objectives": calculate_ids_for_element_items([
+                {"title": "O1", "state": "IDEA", "milestones": [
+                    {"title": "Objective milestone", "state": "IDEA",
+                     "deliverables": [{"title": "D3", "state": "TODO", "requirement": "MUST"}]}]}], prefix="O"),
+            "milestones": calculate_ids_for_element_items([
+                {"title": "M1", "state": "IDEA", "date": "2024-01", "deliverables": [
+                    {"title": "D1", "state": "TODO", "requirement": "MUST"},
+                    {"title": "D2", "state": "DONE", "requirement": "SHOULD"}]},
+                {"title": "M2", "state": "REACHED"}], prefix="M"),
+            "releases": calculate_ids_for_element_items([{"tag": "v1.0"}], prefix="Release"),
+        }
+        index = build_element_index(project)
+        milestone, objective_milestone = project["milestones"][0], project["objectives"][0]["milestones"][0]
+        # milestones of the project come before milestones of objectives
+        self.assertEqual(index["milestones"]["by_state"]["IDEA"], [milestone, objective_milestone])
+        self.assertIs(index["milestones"]["by_state"]["IDEA"][0], milestone)
+        self.assertEqual(index["milestones"]["by_date"], {"2024-01": [milestone]})
+        self.assertEqual([d["title"] for d in index["deliverables"]["by_state"]["TODO"]], ["D1", "D3"])
+        self.assertEqual([d["title"] for d in index["deliverables"]["by_requirement"]["MUST"]], ["D1", "D3"])
+        self.assertEqual(index["releases"]["by_tag"], {"v1.0": project["releases"]})
+        self.assertEqual(len(index["deliverables"]["all"]), 3)
+        # parents of nested elements, top level elements have none
+        self.assertIs(index["parent"][objective_milestone["_id"]], project["objectives"][0])
+        self.assertIs(index["parent"]["m1_d2"], milestone)
+        self.assertNotIn(milestone["_id"], index["parent"])
+        # every element type is indexed, also if the project has none
+        self.assertEqual(index["todos"]["by_state"], {})
+        self.assertEqual(build_element_index({})["timeline"]["all"], [])
+        # every element by its _id with its path and children
+        self.assertIs(index["by_id"]["o1_m1_d1"], project["objectives"][0]["milestones"][0]["deliverables"][0])
+        self.assertEqual(index["path"]["o1_m1_d1"], "objectives.0.milestones.0.deliverables.0")
+        self.assertEqual(index["path"]["m1_d2"], "milestones.0.deliverables.1")
+        self.assertEqual(index["children"]["m1"], milestone["deliverables"])
+        self.assertNotIn("m2", index["children"])
+        self.assertEqual(len(index["by_id"]), 8)
+        # paths and children are computed on access for every registered element
+        self.assertEqual(len(index["path"]), 8)
+        self.assertEqual(set(index["children"]), {_id for _id, element in index["by_id"].items()
+                                                  if any(isinstance(element.get(key), list) and element[key]
+                                                         for key in ("milestones", "deliverables"))})
+        self.assertIsNone(index["path"].get_path({"_id": "m1"}))
+        self.assertEqual(index["collisions"], [])
+
+    def test_build_element_index_detects_id_collisions(self):
+        # test that ids which become the same _id are reported and the first element is kept
+        project = {"milestones": calculate_ids_for_element_items([{"id": "A.B"}, {"id": "A-B"}, {"id": "c"}], prefix="M")}
+        with self.assertLogs(level="WARNING") as logs:
+            index = build_element_index(project)
+        self.assertIs(index["by_id"]["a_b"], project["milestones"][0])
+        self.assertEqual(index["collisions"], [{"_id": "a_b", "path": "milestones.1", "first_path": "milestones.0"}])
+        self.assertIn("milestones.1", logs.output[0])
+        self.assertEqual(len(index["by_id"]), 2)
+
+    def test_build_element_index_id_collision_keeps_first_element(self):
+        # test that by_id, path, parent and children all describe the first element of a colliding _id
+        # the milestones "y.z" of objective "x" and "z" of objective "x.y" both become x_y_z
+        project = {"objectives": calculate_ids_for_element_items([
+            {"id": "x", "milestones": [{"id": "y.z", "deliverables": [{"id": "d"}]}]},
+            {"id": "x.y", "milestones": [{"id": "z", "deliverables": [{"id": "e"}]}]}], prefix="O")}
+        first, second = project["objectives"][0]["milestones"][0], project["objectives"][1]["milestones"][0]
+        with self.assertLogs(level="WARNING"):
+            index = build_element_index(project)
+        self.assertEqual(index["collisions"], [{"_id": "x_y_z", "path": "objectives.1.milestones.0",
+                                                "first_path": "objectives.0.milestones.0"}])
+        self.assertIs(index["by_id"]["x_y_z"], first)
+        self.assertEqual(index["path"]["x_y_z"], "objectives.0.milestones.0")
+        self.assertIs(index["parent"]["x_y_z"], project["objectives"][0])
+        self.assertEqual(index["children"]["x_y_z"], first["deliverables"])
+        # the children of the second element keep their own _id and parent
+        self.assertIs(index["parent"]["x_y_z_e"], second)
+        self.assertEqual(index["path"]["x_y_z_e"], "objectives.1.milestones.0.deliverables.0")
+        # parent_of finds the parent by the identity of the element
+        self.assertIs(index["parent_of"](second), project["objectives"][1])
+        self.assertIs(index["parent_of"](first), project["objectives"][0])
+        self.assertIsNone(index["parent_of"](project["objectives"][1]))
+        self.assertIsNone(index["parent_of"]({"_id": "x_y_z"}))
+
+    def test_build_element_index_with_many_collisions(self):
+        # test that colliding ids are detected and all paths are computed in linear time
+        count = 40000
+        project = {"milestones": [{"_id": "m", "deliverables": [{"_id": f"m_{index}"}]} for index in range(count)]}
+        project["milestones"].append({"deliverables": [{"_id": "without_parent_id"}]})
+        start = time.perf_counter()
+        with self.assertLogs(level="WARNING"):
+            index = build_element_index(project)
+        paths = {_id: index["path"][_id] for _id in index["by_id"]}
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(len(index["collisions"]), count - 1)
+        self.assertEqual(index["collisions"][-1], {"_id": "m", "path": f"milestones.{count - 1}",
+                                                   "first_path": "milestones.0"})
+        self.assertEqual(paths[f"m_{count - 1}"], f"milestones.{count - 1}.deliverables.0")
+        self.assertEqual(paths["without_parent_id"], f"milestones.{count}.deliverables.0")
+
+    def test_build_dependency_graph(self):
+        # test that depends_on links are resolved like _id and ordered with the jobsize-weighted critical path
+        project = {
+            "objectives": calculate_ids_for_element_items([
+                {"title": "O1", "keyresults": [{"title": "R1", "depends_on": ["M2", "m1.d1"],
+                                                "quantifiers": {"jobsize": 3}}]}], prefix="O"),
+            "milestones": calculate_ids_for_element_items([
+                {"title": "M1", "deliverables": [{"title": "D1", "quantifiers": {"jobsize": 8}},
+                                                 {"title": "D2", "depends_on": ["m1_d1", "M1_D1"]}]},
+                {"title": "M2", "depends_on": ["M1", "o1", "unknown"]}], prefix="M"),
+        }
+        with self.assertLogs(level="WARNING") as logs:
+            graph = build_dependency_graph(build_element_index(project))
+        # objectives and unknown ids are no dependencies
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("milestones.1", logs.output[0])
+        keyresult, (milestone1, milestone2) = project["objectives"][0]["keyresults"][0], project["milestones"]
+        deliverable1, deliverable2 = milestone1["deliverables"]
+        self.assertEqual([(edge["source"], edge["target"]) for edge in graph["edges"]],
+                         [("m1", "m2"), ("m1_d1", "m1_d2"), ("m2", "o1_r1"), ("m1_d1", "o1_r1")])
+        self.assertEqual(graph["depends_on"]["o1_r1"], [milestone2, deliverable1])
+        self.assertEqual(graph["dependents"]["m1_d1"], [deliverable2, keyresult])
+        self.assertEqual([element["_id"] for element in graph["order"]], ["m1", "m1_d1", "m2", "m1_d2", "o1_r1"])
+        # the deliverable with jobsize 8 outweighs the two milestones
+        self.assertEqual(graph["critical_path"], [deliverable1, keyresult])
+        self.assertEqual(graph["critical"], {"m1_d1", "o1_r1"})
+        self.assertEqual(graph["length"], 11)
+        self.assertEqual([edge["critical"] for edge in graph["edges"]], [False, False, False, True])
+        # without links the graph is empty
+        self.assertEqual(build_dependency_graph(build_element_index({}))["order"], [])
+        self.assertEqual(get_jobsize({"quantifiers": {"jobsize": None}}), 1)
+        self.assertEqual(get_jobsize({"quantifiers": {"jobsize": 5}}), 5)
+
+    def test_build_dependency_graph_with_hub(self):
+        # test that an element with thousands of dependents is linked in linear time
+        count = 40000
+        project = {"milestones": calculate_ids_for_element_items([
+            {"title": "Hub"},
+            {"title": "M2", "deliverables": [{"title": f"D{index}", "depends_on": ["M1", "m1"]}
+                                             for index in range(count)]}], prefix="M")}
+        index = build_element_index(project)
+        start = time.perf_counter()
+        graph = build_dependency_graph(index)
+        self.assertLess(time.perf_counter() - start, 5)
+        # the duplicate reference is linked once
+        self.assertEqual(len(graph["edges"]), count)
+        self.assertEqual(len(graph["dependents"]["m1"]), count)
+        self.assertEqual(graph["order"][0], project["milestones"][0])
+        self.assertEqual(graph["length"], 2)
 
 
 if __name__ == '__main__':
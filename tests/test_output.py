@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import threading
+import os
+import pickle
+
+from roadmap_app.output import write_output, write_atomic, OutputDirectoryLock, LOCK_FILE
+
+
+class TestOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.tmpdir.name, "roadmap.html")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _read(self):
+        with open(self.output_file) as f:
+            return f.read()
+
+    def test_write_output(self):
+        self.assertTrue(write_output(self.output_file, ["<h1>", "Roadmap", "</h1>"], buffer_size=4))
+        self.assertEqual(self._read(), "<h1>Roadmap</h1>")
+        self.assertTrue(write_output(self.output_file, ["<h1>Changed</h1>"]))
+        self.assertEqual(self._read(), "<h1>Changed</h1>")
+        self.assertEqual(os.listdir(self.tmpdir.name), ["roadmap.html"])
+
+    def test_identical_output_is_not_written(self):
+        write_output(self.output_file, ["<h1>Roadmap</h1>"])
+        os.utime(self.output_file, (1000000000, 1000000000))
+        self.assertFalse(write_output(self.output_file, ["<h1>", "Roadmap</h1>"]))
+        self.assertEqual(os.stat(self.output_file).st_mtime, 1000000000)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["roadmap.html"])
+
+    def test_failed_write_keeps_output(self):
+        write_output(self.output_file, ["previous"])
+
+        def chunks():
+            yield "next"
+            raise RuntimeError("template failed")
+
+        with self.assertRaises(RuntimeError):
+            write_output(self.output_file, chunks())
+        self.assertEqual(self._read(), "previous")
+        self.assertEqual(os.listdir(self.tmpdir.name), ["roadmap.html"])
+
+    def test_write_atomic(self):
+        cache_file = os.path.join(self.tmpdir.name, "cache.pickle")
+        write_atomic(cache_file, lambda f: pickle.dump({"key": 1}, f), mode="wb")
+        with open(cache_file, "rb") as f:
+            self.assertEqual(pickle.load(f), {"key": 1})
+
+        def fail(f):
+            f.write(b"partial")
+            raise pickle.PicklingError("not picklable")
+
+        # a failed write leaves the file untouched and no temp file behind
+        with self.assertRaises(pickle.PicklingError):
+            write_atomic(cache_file, fail, mode="wb")
+        with open(cache_file, "rb") as f:
+            self.assertEqual(pickle.load(f), {"key": 1})
+        self.assertEqual(os.listdir(self.tmpdir.name), ["cache.pickle"])
+
+    def test_output_directory_lock_is_exclusive(self):
+        output_folder = os.path.join(self.tmpdir.name, "output")
+        events = []
+        locked = threading.Event()
+
+        def render():
+            locked.wait()
+            with OutputDirectoryLock(output_folder):
+                events.append("second")
+
+        thread = threading.Thread(target=render)
+        thread.start()
+        with OutputDirectoryLock(output_folder) as lock:
+            self.assertTrue(os.path.exists(os.path.join(output_folder, LOCK_FILE)))
+            locked.set()
+            # the second run waits for the lock
+            thread.join(timeout=0.2)
+            self.assertTrue(thread.is_alive())
+            events.append("first")
+        thread.join()
+        self.assertEqual(events, ["first", "second"])
+        # releasing twice does nothing
+        lock.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
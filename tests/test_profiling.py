@@ -0,0 +1,95 @@
+import unittest
+import tempfile
+import json
+import os
+import pstats
+import threading
+import tracemalloc
+
+from roadmap_app.profiling import Profiler, stage
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.tmpdir.cleanup()
+
+    def test_stage_records_wall_and_cpu_time(self):
+        profiler = Profiler()
+        with stage(profiler, "read", roadmap_file="roadmap.yml"):
+            sum(range(100000))
+        self.assertEqual(len(profiler.stages), 1)
+        record = profiler.stages[0]
+        self.assertEqual((record["name"], record["roadmap_file"]), ("read", "roadmap.yml"))
+        self.assertGreater(record["wall_time"], 0)
+        self.assertGreaterEqual(record["cpu_time"], 0)
+        self.assertNotIn("peak_memory", record)
+        # without profiler nothing is measured
+        with stage(None, "read"):
+            pass
+
+    def test_nested_and_threaded_stages(self):
+        profiler = Profiler(cprofile_dir=os.path.join(self.tmpdir.name, "cprofile"))
+
+        def render_in_thread():
+            with stage(profiler, "graphviz", template="thread"):
+                pass
+
+        with stage(profiler, "render"):
+            with stage(profiler, "graphviz", template="main"):
+                pass
+            thread = threading.Thread(target=render_in_thread)
+            thread.start()
+            thread.join()
+        # stages are recorded when they end, only the outermost stage of the main thread is profiled
+        self.assertEqual([record.get("template") for record in profiler.stages], ["main", "thread", None])
+        self.assertNotIn("cprofile", profiler.stages[0])
+        self.assertNotIn("cprofile", profiler.stages[1])
+        self.assertEqual(os.path.basename(profiler.stages[2]["cprofile"]), "002-render.prof")
+        self.assertIn("function calls", self._cprofile_summary(profiler.stages[2]["cprofile"]))
+        # a new outermost stage is profiled again
+        with stage(profiler, "render"):
+            pass
+        self.assertIn("cprofile", profiler.stages[3])
+
+    def _cprofile_summary(self, path):
+        summary_file = os.path.join(self.tmpdir.name, "summary.txt")
+        with open(summary_file, "w") as f:
+            pstats.Stats(path, stream=f).print_stats(0)
+        with open(summary_file) as f:
+            return f.read()
+
+    def test_trace_memory(self):
+        profiler = Profiler(trace_memory=True)
+        self.assertTrue(tracemalloc.is_tracing())
+        with stage(profiler, "enrich"):
+            data = bytearray(1024 * 1024)
+        del data
+        self.assertGreaterEqual(profiler.stages[0]["peak_memory"], 1024 * 1024)
+        self.assertGreaterEqual(profiler.report()["peak_memory"], 1024 * 1024)
+
+    def test_write_report(self):
+        profiler = Profiler(trace_memory=True)
+        with stage(profiler, "validate"):
+            pass
+        profiler.add_template({"template": "templates/csv/roadmap.csv", "output_file": "output/roadmap.csv",
+                               "wall_time": 0.5, "cpu_time": 0.25, "dependencies": []})
+        report_file = os.path.join(self.tmpdir.name, "profile", "report.json")
+        profiler.write_report(report_file)
+        # the profiler stops tracing memory allocations it started
+        self.assertFalse(tracemalloc.is_tracing())
+        with open(report_file) as f:
+            report = json.load(f)
+        self.assertEqual(sorted(report), ["cpu_time", "peak_memory", "stages", "templates", "wall_time"])
+        self.assertEqual(report["stages"][0]["name"], "validate")
+        self.assertEqual(report["templates"], [{"template": "templates/csv/roadmap.csv",
+                                                "output_file": "output/roadmap.csv",
+                                                "wall_time": 0.5, "cpu_time": 0.25}])
+
+
+if __name__ == '__main__':
+    unittest.main()
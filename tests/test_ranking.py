@@ -0,0 +1,59 @@
+import unittest
+
+from roadmap_app.ranking import Ranking, merge_rankings, get_rank_key, is_rankable
+
+
+def make_element(_id, wsjf=None, cost_of_delay=None):
+    return {"_id": _id, "quantifiers": {"weighted_shortest_job_first": wsjf, "cost_of_delay": cost_of_delay}}
+
+
+class TestRanking(unittest.TestCase):
+    def setUp(self):
+        self.elements = [make_element("b", 2.5, 10), make_element("a", 2.5, 10), make_element("c", 4, 8),
+                         make_element("d", 2.5, 12), make_element("e"), {"_id": "f"}, make_element("g", 2.5)]
+
+    def test_is_rankable(self):
+        self.assertEqual([is_rankable(element) for element in self.elements],
+                         [True, True, True, True, False, False, True])
+        self.assertFalse(is_rankable(None))
+        self.assertFalse(is_rankable({"quantifiers": None}))
+        self.assertFalse(is_rankable(make_element("x", True)))
+
+    def test_rank_order(self):
+        ranking = Ranking(self.elements)
+        self.assertEqual(len(ranking), 5)
+        # highest wsjf first, equal wsjf by cost of delay, then by _id, elements without cost of delay last
+        self.assertEqual([element["_id"] for element in ranking], ["c", "d", "a", "b", "g"])
+        self.assertIs(ranking[0], self.elements[2])
+        self.assertLess(get_rank_key(self.elements[3]), get_rank_key(self.elements[0]))
+        self.assertEqual(len(Ranking()), 0)
+
+    def test_top(self):
+        ranking = Ranking(self.elements)
+        self.assertEqual([element["_id"] for element in ranking.top(3)], ["c", "d", "a"])
+        # the full order is not sorted to select the top elements
+        self.assertIsNone(ranking._sorted)
+        self.assertEqual(ranking.top(0), [])
+        self.assertEqual(ranking.top(10), list(ranking))
+        self.assertEqual(ranking.top(2), ranking.top(None)[:2])
+        self.assertEqual(ranking, Ranking(reversed(self.elements)))
+
+    def test_equal_keys_keep_their_order(self):
+        first, second = make_element("a", 1, 3), make_element("a", 1, 3)
+        self.assertEqual([id(element) for element in Ranking([first, second])], [id(first), id(second)])
+        self.assertEqual([id(element) for element in Ranking([first, second]).top(1)], [id(first)])
+
+    def test_merge_rankings(self):
+        portfolio = [("one.yml", Ranking(self.elements).top(2)),
+                     ("two.yml", Ranking([make_element("a", 5, 5), make_element("c", 4, 8)]).top(2)),
+                     ("three.yml", [])]
+        merged = merge_rankings(portfolio, 3)
+        # equal keys are ordered by the order of the rankings
+        self.assertEqual([(source, element["_id"]) for source, element in merged],
+                         [("two.yml", "a"), ("one.yml", "c"), ("two.yml", "c")])
+        self.assertEqual(len(merge_rankings(portfolio)), 4)
+        self.assertEqual(merge_rankings(None, 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,12 @@ import unittest
 import tempfile
 import shutil
 import os
+from unittest.mock import patch
 from jinja2 import Environment
-from roadmap_app.utils import read_roadmap_definition
-from roadmap_app.rendering import validate_yaml, find_templates, is_graphviz_installed, process_template
+from roadmap_app.utils import read_roadmap_definition, LazyKeyValueList
+from roadmap_app.rendering import (validate_yaml, find_templates, is_graphviz_installed, process_template,
+                                   EnvironmentPool, relocate_templates, get_render_buffer_size, RENDER_BUFFER_SIZE,
+                                   get_template_search_paths)
 
 
 class TestRendering(unittest.TestCase):
@@ -206,6 +209,18 @@ class TestRendering(unittest.TestCase):
             self.assertIn("dot", found_suffixes)
             self.assertIn("md", found_suffixes)
 
+    def test_relocate_templates(self):
+        # templates found once can be rendered into another output directory
+        template_path = os.path.join(os.path.dirname(__file__), "..", "templates")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "output")
+            other_output_path = os.path.join(tmpdir, "other")
+            templates = find_templates(template_path, ["html", "md", "dot", "csv"], output_path)
+            relocated = relocate_templates(templates, other_output_path)
+            self.assertEqual(relocated, find_templates(template_path, ["html", "md", "dot", "csv"], other_output_path))
+            # the original templates are not modified
+            self.assertTrue(all(t["output_file"].startswith(output_path) for t in templates))
+
 
 class TestProcessTemplate(unittest.TestCase):
 
@@ -295,6 +310,19 @@ class TestProcessTemplate(unittest.TestCase):
             with open(template["output_file"]) as f:
                 self.assertEqual(f.read(), "<yes>")
 
+    def test_globals_without_environment_pool(self):
+        # the roadmap globals are available without a pool, the provided environment is not changed
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = self._make_template(tmpdir, content=(
+                "{{ roadmap_graph_svg(project) | join | length > 0 }} "
+                "{{ get_filtered_key_value_list(key_value_list=[{'key': 'title', 'value': 'R'}], "
+                "filter_for_keys='title') | map(attribute='value') | join }}"))
+            env = Environment()
+            process_template(environment=env, template=template, project={"title": "R"})
+            with open(template["output_file"]) as f:
+                self.assertEqual(f.read(), "True R")
+            self.assertNotIn("roadmap_graph_svg", env.globals)
+
     def test_template_with_none_project(self):
         # project=None -- template can still render (project is just None in context)
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -303,6 +331,153 @@ class TestProcessTemplate(unittest.TestCase):
             with open(template["output_file"]) as f:
                 self.assertEqual(f.read(), "static content only")
 
+    def test_environment_pool_reuses_environment_for_same_search_paths(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pool = EnvironmentPool()
+            env = pool.get_environment([tmpdir])
+            # relative and absolute spelling of the same path share one Environment
+            self.assertIs(pool.get_environment([os.path.join(tmpdir, ".")]), env)
+            self.assertIsNot(pool.get_environment([tmpdir, os.path.join(tmpdir, "html")]), env)
+            # all Environments share the bytecode cache
+            self.assertIs(pool.get_environment([os.path.join(tmpdir, "html")]).bytecode_cache, env.bytecode_cache)
+
+    def test_uses_environment_pool_and_returns_loaded_files(self):
+        # files from the template cache of a pooled Environment are reported on every render
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = self._make_template(tmpdir, content="{% include 'partial.html' %} {{ project.v }}")
+            partial_file = os.path.join(template["path"], "partial.html")
+            with open(partial_file, "w") as f:
+                f.write("partial")
+            pool = EnvironmentPool()
+            for _ in range(2):
+                loaded_files = process_template(template=template, project={"v": "pooled"}, environment_pool=pool)
+                self.assertEqual([os.path.basename(path) for path in loaded_files], ["partial.html", "roadmap.html"])
+            with open(template["output_file"]) as f:
+                self.assertEqual(f.read(), "partial pooled")
+
+    def test_templates_filter_key_value_list(self):
+        # templates filter project.as_list with the global get_filtered_key_value_list and its key_index
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = self._make_template(tmpdir, content=(
+                "{% for item in get_filtered_key_value_list(key_value_list=project.as_list, filter_for_keys='.todos.', "
+                "precise_search=False) %}{{ item.value }} {% endfor %}"
+                "{% for item in project.as_list.key_index.find('milestones.*.todos.title') %}{{ item.value }}{% endfor %}"))
+            project = {"milestones": [{"todos": [{"title": "T1"}], "deliverables": [{"todos": [{"title": "T2"}]}]}]}
+            project["as_list"] = LazyKeyValueList(project, skip_keys=("as_list",))
+            process_template(template=template, project=project, environment_pool=EnvironmentPool())
+            with open(template["output_file"]) as f:
+                self.assertEqual(f.read(), "T1 T2 T2")
+
+    def test_reports_written_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = self._make_template(tmpdir)
+            written_files = []
+            process_template(template=template, project={"title": "written"}, written_files=written_files)
+            self.assertEqual(written_files, [template["output_file"]])
+            # nothing is reported if processing failed
+            broken_template = self._make_template(tmpdir, content="{% if %}broken{% endif %}", suffix="md")
+            written_files = []
+            process_template(template=broken_template, project={}, written_files=written_files)
+            self.assertEqual(written_files, [])
+
+    def test_dot_template_without_graphviz_logs_error(self):
+        # a missing graphviz is reported as error, the dot output is still written and reported
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = self._make_template(tmpdir, content="digraph { {{ project.title }} }", suffix="dot")
+            written_files = []
+            is_graphviz_installed.cache_clear()
+            try:
+                with patch.dict(os.environ, {"PATH": tmpdir}), self.assertLogs(level="ERROR") as captured:
+                    process_template(template=template, project={"title": "a"}, written_files=written_files)
+            finally:
+                is_graphviz_installed.cache_clear()
+            self.assertIn("graphviz not installed", "\n".join(captured.output))
+            self.assertIn("png rendering skipped", "\n".join(captured.output))
+            self.assertEqual(written_files, [template["output_file"]])
+            with open(template["output_file"]) as f:
+                self.assertEqual(f.read(), "digraph { a }")
+
+    def test_streams_output_through_write_buffer(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            content = "{% for item in project.deliverables %}{{ item }}\n{% endfor %}"
+            template = self._make_template(tmpdir, content=content, suffix="csv")
+            items = [f"item {index}" for index in range(1000)]
+            # a buffer smaller than a single chunk gives the same output
+            process_template(template=template, project={"deliverables": items}, buffer_size=16)
+            with open(template["output_file"]) as f:
+                self.assertEqual(f.read(), "".join(f"{item}\n" for item in items))
+            self.assertEqual(os.listdir(template["output_path"]), ["roadmap.csv"])
+
+    def test_failed_stream_keeps_previous_output(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = self._make_template(tmpdir)
+            process_template(template=template, project={"title": "previous"})
+            # the include fails after the first chunk was written
+            failing_template = self._make_template(tmpdir, content="Hello {% include 'missing.html' %}")
+            process_template(template=failing_template, project={"title": "next"})
+            with open(template["output_file"]) as f:
+                self.assertEqual(f.read(), "Hello previous")
+            self.assertEqual(os.listdir(template["output_path"]), ["roadmap.html"])
+
+    def test_get_render_buffer_size(self):
+        self.assertEqual(get_render_buffer_size({}), RENDER_BUFFER_SIZE)
+        self.assertEqual(get_render_buffer_size({"RENDER_BUFFER_SIZE": "4096"}), 4096)
+        self.assertEqual(get_render_buffer_size({"RENDER_BUFFER_SIZE": "0"}), 1)
+        with self.assertRaises(ValueError):
+            get_render_buffer_size({"RENDER_BUFFER_SIZE": "large"})
+
+    def _render_include_loop(self, tmpdir, production):
+        """Render a template including a partial per item, return the stats of the EnvironmentPool."""
+        template = self._make_template(tmpdir, content="{% for item in project.entries %}"
+                                                       "{% include 'item.html' %}{% endfor %}")
+        with open(os.path.join(template["path"], "item.html"), "w") as f:
+            f.write("[{{ item }}]")
+        with open(os.path.join(template["path"], "unused.html"), "w") as f:
+            f.write("not included")
+        pool = EnvironmentPool(production=production)
+        if production:
+            self.assertEqual(pool.preload([template["path"]], [template["file"]]), 2)
+        process_template(template=template, project={"entries": list(range(50))}, environment_pool=pool)
+        with open(template["output_file"]) as f:
+            self.assertTrue(f.read().startswith("[0][1][2]"))
+        return pool.stats.as_dict()
+
+    def test_production_mode_include_loop_does_not_touch_filesystem(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            stats = self._render_include_loop(tmpdir, production=True)
+            # both files are read once by preload, the loop only resolves cached templates
+            self.assertEqual(stats, {"include_resolutions": 50, "source_loads": 2, "uptodate_checks": 0})
+
+    def test_production_preload_loads_reachable_templates_once(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            files = {"html/roadmap.html": "{% include 'shared.css' %}{{ project.title }}",
+                     "html/shared.css": "body {}",
+                     "html/unused.html": "{% include 'missing.html' %}",
+                     "html-kanban/board.html": "{% include 'shared.css' %}{% include 'card.html' %}",
+                     "html-kanban/card.html": "{{ project.title }}"}
+            for name, content in files.items():
+                os.makedirs(os.path.join(tmpdir, os.path.dirname(name)), exist_ok=True)
+                with open(os.path.join(tmpdir, name), "w") as f:
+                    f.write(content)
+            templates = [dict(self._make_template(tmpdir), path=os.path.join(tmpdir, "html")),
+                         dict(self._make_template(tmpdir), path=os.path.join(tmpdir, "html-kanban"), file="board.html")]
+            pool = EnvironmentPool(production=True)
+            # only the templates reachable from the output templates are loaded, the fallback html/ included
+            self.assertEqual(pool.preload(get_template_search_paths(templates[0]), ["roadmap.html"]), 2)
+            self.assertEqual(pool.preload(get_template_search_paths(templates[1]), ["board.html"]), 3)
+            self.assertEqual(pool.preload(get_template_search_paths(templates[1]), ["board.html"]), 0)
+            for template in templates:
+                process_template(template=template, project={"title": "T"}, environment_pool=pool)
+            self.assertEqual(pool.stats.as_dict(), {"include_resolutions": 3, "source_loads": 5, "uptodate_checks": 0})
+
+    def test_default_mode_checks_included_templates_for_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            stats = self._render_include_loop(tmpdir, production=False)
+            self.assertEqual(stats["include_resolutions"], 50)
+            self.assertEqual(stats["source_loads"], 2)
+            # every include of the cached partial is checked against the filesystem
+            self.assertEqual(stats["uptodate_checks"], 49)
+
 
 if __name__ == '__main__':
     unittest.main()
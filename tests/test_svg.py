@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import os
+import xml.dom.minidom
+
+from roadmap_app.svg import layout_roadmap_graph, generate_roadmap_svg, LABEL_MAX_LENGTH
+from roadmap_app.model import calculate_ids_for_element_items, enrich_project
+from roadmap_app.utils import read_roadmap_definition
+from roadmap_app.rendering import process_template, EnvironmentPool
+
+
+class TestSvg(unittest.TestCase):
+    def setUp(self):
+        self.objectives = calculate_ids_for_element_items([
+            {"title": "First", "keyresults": [{"title": "Done", "state": "DONE"}, {"title": "Open", "state": "TODO"}]},
+            {"title": "Second", "milestones": [{"title": "Objective milestone", "state": "REACHED"}]},
+            {"title": "Third"},
+        ], prefix="O")
+
+    def test_layout_follows_ids(self):
+        layout = layout_roadmap_graph({"objectives": self.objectives})
+        nodes = {node["id"]: node for node in layout["nodes"]}
+        self.assertEqual(list(nodes), ["objectives_start", "o1", "o1_r1", "o1_r2", "o2", "o2_m1", "o3",
+                                       "objectives_end"])
+        chain = [(edge["source"], edge["target"]) for edge in layout["edges"] if edge["type"] == "chain"]
+        self.assertEqual(chain, [("objectives_start", "o1"), ("o1", "o2"), ("o2", "o3"), ("o3", "objectives_end")])
+        parents = [(edge["source"], edge["target"]) for edge in layout["edges"] if edge["type"] == "parent"]
+        self.assertEqual(parents, [("o1_r1", "o1"), ("o1_r2", "o1"), ("o2_m1", "o2")])
+        self.assertEqual(nodes["o1_r1"]["color"], "palegreen")
+        self.assertTrue(nodes["o1_r1"]["label"].startswith("✓ "))
+        # every node is inside its cluster, clusters do not overlap
+        for cluster, root in zip(layout["clusters"], ("o1", "o2", "o3")):
+            self.assertEqual(cluster["id"], f"cluster_{root}")
+            for node in layout["nodes"]:
+                if node["id"] == root or node["id"].startswith(f"{root}_"):
+                    self.assertGreaterEqual(node["x"], cluster["x"])
+                    self.assertLessEqual(node["x"] + node["width"], cluster["x"] + cluster["width"])
+                    self.assertLessEqual(node["y"] + node["height"], cluster["y"] + cluster["height"])
+        for left, right in zip(layout["clusters"], layout["clusters"][1:]):
+            self.assertLess(left["x"] + left["width"], right["x"])
+        self.assertLessEqual(max(node["x"] + node["width"] for node in layout["nodes"]), layout["width"])
+
+    def test_layout_of_large_roadmap(self):
+        objectives = calculate_ids_for_element_items(
+            [{"title": f"Objective {index}", "keyresults": [{"title": "Keyresult"}] * 4} for index in range(1000)],
+            prefix="O")
+        milestones = calculate_ids_for_element_items(
+            [{"title": f"Milestone {index}", "deliverables": [{"title": "Deliverable"}]} for index in range(1000)],
+            prefix="M")
+        layout = layout_roadmap_graph({"objectives": objectives, "milestones": milestones})
+        self.assertEqual(len(layout["nodes"]), 5000 + 2000 + 4)
+        self.assertEqual(len(layout["edges"]), 5000 + 2000 + 2)
+        # the milestone row is below the objective row
+        self.assertGreater(layout["clusters"][1000]["y"], max(cluster["y"] + cluster["height"]
+                                                              for cluster in layout["clusters"][:1000]))
+
+    def test_svg_is_valid_and_escaped(self):
+        objectives = calculate_ids_for_element_items([
+            {"title": 'Use <dot> & "graphviz" for a very long objective title', "description": "a < b"}], prefix="O")
+        svg = "".join(generate_roadmap_svg({"title": "R&D", "objectives": objectives,
+                                            "meta": {"version": "1234abcd", "rendertime": "20240101000000"}}))
+        document = xml.dom.minidom.parseString(svg)
+        self.assertEqual(document.documentElement.tagName, "svg")
+        labels = [text.firstChild.data for text in document.getElementsByTagName("text") if text.firstChild]
+        self.assertIn("R&D", labels)
+        self.assertIn("Use <dot> & \"graphviz\" for…", labels)
+        self.assertTrue(all(len(label) <= LABEL_MAX_LENGTH for label in labels if label.startswith("Use")))
+        self.assertIn("version: 1234abcd/20240101000000", labels)
+        tooltips = [title.firstChild.data for title in document.getElementsByTagName("title") if title.firstChild]
+        self.assertIn("a < b", tooltips)
+        # without elements an empty graph is drawn
+        xml.dom.minidom.parseString("".join(generate_roadmap_svg(None)))
+
+    def test_svg_template(self):
+        roadmap_file = os.path.join(os.path.dirname(__file__), "roadmap.yml")
+        template_path = os.path.join(os.path.dirname(__file__), "..", "templates", "svg")
+        project = read_roadmap_definition(roadmap_file)
+        enrich_project(project, None, roadmap_file)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            template = {"path": template_path, "file": "roadmap.svg", "suffix": "svg", "type": "svg",
+                        "output_file": os.path.join(tmpdir, "roadmap.svg"), "output_file_basename": "roadmap",
+                        "output_path": tmpdir, "output_name": "roadmap.svg"}
+            process_template(template=template, project=project, environment_pool=EnvironmentPool())
+            with open(template["output_file"]) as f:
+                svg = f.read()
+        self.assertEqual(svg, "".join(generate_roadmap_svg(project)))
+        self.assertGreater(svg.count("<rect"), len(project["objectives"]) + len(project["milestones"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 import unittest
 import os
 import tempfile
-from roadmap_app.utils import (read_roadmap_definition, calculate_roadmap_version, get_key_value_list,
-                               get_filtered_key_value_list, create_output_folder, convert_image_to_html_base64)
+import glob
+import yaml
+from unittest.mock import patch
+from roadmap_app.utils import (read_roadmap_definition, calculate_roadmap_version, calculate_file_hash, get_key_value_list,
+                               get_filtered_key_value_list, create_output_folder, convert_image_to_html_base64, load_yml,
+                               read_yml_source, iter_key_value_list, LazyKeyValueList, KeyValueIndex)
+from roadmap_app.cache import ParsedYamlCache
 
 
 class TestUtils(unittest.TestCase):
@@ -41,11 +46,52 @@ class TestUtils(unittest.TestCase):
         if os.path.exists(self.test_file):
             os.remove(self.test_file)
 
+    def test_load_yml_same_as_full_loader(self):
+        yml_files = glob.glob(os.path.join(os.path.dirname(__file__), "..", "examples", "*.yml"))
+        yml_files += [self.test_existing_file, os.path.join(os.path.dirname(__file__), "..", "templates", "templates.yml")]
+        for yml_file in yml_files:
+            with open(yml_file) as f:
+                content = f.read()
+            self.assertEqual(load_yml(content), yaml.load(content, Loader=yaml.FullLoader), yml_file)
+        # python tags are unknown to the safe loader and still parsed
+        self.assertEqual(load_yml("pair: !!python/tuple [1, 2]"), {"pair": (1, 2)})
+
+    def test_read_roadmap_definition_with_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ParsedYamlCache(os.path.join(tmpdir, "yaml"))
+            expected = read_roadmap_definition(self.test_existing_file)
+            self.assertEqual(read_roadmap_definition(self.test_existing_file, cache=cache), expected)
+            # an unchanged file is not parsed again
+            with patch("roadmap_app.utils.load_yml", side_effect=AssertionError("parsed again")):
+                self.assertEqual(read_roadmap_definition(self.test_existing_file, cache=cache), expected)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_read_yml_source(self):
+        source = read_yml_source(self.test_existing_file)
+        stat = os.stat(self.test_existing_file)
+        self.assertEqual(source.data, read_roadmap_definition(self.test_existing_file))
+        self.assertEqual(source.hash, calculate_file_hash(self.test_existing_file))
+        self.assertEqual(source.version, self.version_existing_roadmap)
+        self.assertEqual((source.size, source.mtime_ns), (stat.st_size, stat.st_mtime_ns))
+        # large files are memory-mapped, hashed and parsed the same way
+        with patch("roadmap_app.utils.MMAP_THRESHOLD", 1):
+            mapped_source = read_yml_source(self.test_existing_file)
+            self.assertEqual((mapped_source.data, mapped_source.hash), (source.data, source.hash))
+            with tempfile.TemporaryDirectory() as tmpdir:
+                python_tag_file = os.path.join(tmpdir, "tuple.yml")
+                with open(python_tag_file, "w") as f:
+                    f.write("pair: !!python/tuple [1, 2]\n")
+                self.assertEqual(read_yml_source(python_tag_file).data, {"pair": (1, 2)})
+
     def test_roadmap_yml_version_id(self):
         # test if we get none for non-existing file
         self.assertIsNone(calculate_roadmap_version(self.test_file))
         # test if the version id of roadmap fulfills our expectations
         self.assertEqual(calculate_roadmap_version(self.test_existing_file), self.version_existing_roadmap)
+        # the version consists of the first and last 4 characters of the md5 hash
+        file_hash = calculate_file_hash(self.test_existing_file)
+        self.assertEqual(file_hash[0:4] + file_hash[-4:], self.version_existing_roadmap)
+        self.assertIsNone(calculate_file_hash(self.test_file))
 
     def test_get_key_value_list(self):
         # test if we build a key-value list correctly
@@ -77,6 +123,44 @@ class TestUtils(unittest.TestCase):
         self.assertIsNone(project_as_list[0]['key'])
         self.assertIsNone(project_as_list[0]['value'])
 
+    def test_iter_key_value_list(self):
+        # test that pairs are generated like get_key_value_list and nested elements are flattened in linear time
+        project = dict(read_roadmap_definition(self.test_existing_file))
+        pairs = iter_key_value_list(project, prefix_for_key="project", keep_index=True)
+        self.assertEqual(next(pairs), {"key": "project.title", "value": project["title"]})
+        self.assertEqual(list(iter_key_value_list(project)), get_key_value_list(element=project))
+        # skipped keys are left out with everything below them
+        keys = [pair["key"] for pair in iter_key_value_list(project, skip_keys=("milestones", "description"))]
+        self.assertFalse([key for key in keys if key.startswith("milestones") or key.endswith("description")])
+        self.assertIn("objectives.title", keys)
+        pairs = iter_key_value_list({"a": {"x": 1, "y": 2}, "x": 3},
+                                    get_skip_keys=lambda element: ("x",) if "y" in element else ())
+        self.assertEqual([pair["key"] for pair in pairs], ["a.y", "x"])
+        # 100000 elements with a list each are flattened without copying the list per element
+        large = {"milestones": [{"title": f"M{index}", "deliverables": [{"title": "D"}]} for index in range(100000)]}
+        pairs = list(iter_key_value_list(large, keep_index=True))
+        self.assertEqual(len(pairs), 200000)
+        self.assertEqual(pairs[-1], {"key": "milestones.99999.deliverables.0.title", "value": "D"})
+
+    def test_lazy_key_value_list(self):
+        # test that the list is built from the element when it is used first
+        project = {"title": "Roadmap", "milestones": [{"title": "M1"}]}
+        as_list = LazyKeyValueList(project, skip_keys=("as_list",))
+        project["as_list"] = as_list
+        project["description"] = "added before first use"
+        self.assertEqual(repr(as_list), "LazyKeyValueList(skip_keys=('as_list',))")
+        self.assertEqual(list(as_list), [{"key": "title", "value": "Roadmap"},
+                                         {"key": "milestones.title", "value": "M1"},
+                                         {"key": "description", "value": "added before first use"}])
+        # the list is built once
+        project["title"] = "Changed"
+        self.assertEqual(as_list[0], {"key": "title", "value": "Roadmap"})
+        self.assertEqual(len(as_list), 3)
+        self.assertEqual(as_list, get_key_value_list(element={"title": "Roadmap", "milestones": [{"title": "M1"}],
+                                                              "description": "added before first use"}))
+        self.assertEqual(get_filtered_key_value_list(key_value_list=as_list, filter_for_keys="milestones.title"),
+                         [{"key": "milestones.title", "value": "M1"}])
+
     def test_convert_image_to_html_base64(self):
         # test that a valid image file is converted to base64 HTML string
         with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
@@ -110,10 +194,49 @@ class TestUtils(unittest.TestCase):
         # first and second key are milestones.title
         self.assertEqual(filtered_list[0]['key'], "milestones.title")
         self.assertEqual(filtered_list[1]['key'], "milestones.title")
+        # several filters are concatenated, each in list order, like a scan of the list per filter
+        filter_for_keys = "milestones.todos, .todos., title"
+        for precise_search in (True, False):
+            scanned = [item for filter_key in filter_for_keys.split(",") for item in project_as_list
+                       if (item["key"] == filter_key.strip(" ") if precise_search
+                           else filter_key.strip(" ") in item["key"])]
+            self.assertEqual(get_filtered_key_value_list(key_value_list=project_as_list, filter_for_keys=filter_for_keys,
+                                                         precise_search=precise_search), scanned)
+            self.assertTrue(scanned)
+        # the index of a lazy list is built once and reused
+        as_list = LazyKeyValueList(project)
+        self.assertIs(as_list.key_index, as_list.key_index)
+        with patch("roadmap_app.utils.KeyValueIndex", side_effect=AssertionError("index built again")):
+            self.assertEqual(get_filtered_key_value_list(key_value_list=as_list, filter_for_keys="milestones.title"),
+                             filtered_list)
         # check for error handling
         with self.assertRaises(ValueError):
             get_filtered_key_value_list()
 
+    def test_key_value_index(self):
+        # test exact, prefix, wildcard and substring queries
+        key_value_list = get_key_value_list(element={
+            "title": "Roadmap",
+            "milestones": [{"title": "M1", "todos": [{"title": "T1"}],
+                            "deliverables": [{"title": "D1", "todos": [{"title": "T2"}]}]},
+                           {"title": "M2", "deliverables": [{"title": "D2", "state": "DONE"}]}],
+            "objectives": [{"title": "O1", "todos": [{"title": "T3"}]}]})
+        key_value_list.append({"value": "without key"})
+        index = KeyValueIndex(key_value_list)
+        self.assertEqual(index.keys()[:3], ["title", "milestones.title", "milestones.todos.title"])
+        self.assertEqual([item["value"] for item in index.get("milestones.title")], ["M1", "M2"])
+        self.assertEqual(index.get("milestones"), [])
+        self.assertEqual([item["value"] for item in index.find("milestones.deliverables.")], ["D1", "T2", "D2", "DONE"])
+        self.assertEqual([item["value"] for item in index.find("*.todos.title")], ["T1", "T3"])
+        self.assertEqual([item["value"] for item in index.find("*.*.todos.")], ["T2"])
+        self.assertEqual([item["value"] for item in index.find("*.title")], ["M1", "M2", "O1"])
+        self.assertEqual(index.find("title"), [{"key": "title", "value": "Roadmap"}])
+        self.assertEqual(len(index.find("")), len(key_value_list) - 1)
+        self.assertEqual(index.find("unknown."), [])
+        self.assertEqual([item["value"] for item in index.search("todos")], ["T1", "T2", "T3"])
+        # the pairs are the items of the list
+        self.assertIs(index.get("title")[0], key_value_list[0])
+
 
 if __name__ == '__main__':
     unittest.main()
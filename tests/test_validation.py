@@ -0,0 +1,113 @@
+import unittest
+import tempfile
+import datetime
+import glob
+import json
+import os
+from unittest.mock import patch
+
+import jsonschema
+from jsonschema.validators import Draft202012Validator
+
+from roadmap_app import validation
+from roadmap_app.utils import read_roadmap_definition
+from roadmap_app.validation import (get_validator, validate_roadmap, get_schema_cache_path, get_schema_hash,
+                                    ValidationResultCache, get_validation_result_cache)
+
+
+class TestValidation(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.schema_path = os.path.join(os.path.dirname(__file__), "..", "schema", "roadmap.json")
+        self.date_schema_path = os.path.join(self.tmpdir.name, "schema.json")
+        self._write_schema({"$schema": "https://json-schema.org/draft/2020-12/schema", "type": "object",
+                            "properties": {"date": {"type": "string", "pattern": "^2023-"}}})
+        # every test starts without compiled validators
+        self.validators = patch.dict(validation._validators, clear=True)
+        self.validators.start()
+
+    def tearDown(self):
+        self.validators.stop()
+        self.tmpdir.cleanup()
+
+    def _write_schema(self, schema):
+        with open(self.date_schema_path, "w") as f:
+            json.dump(schema, f)
+
+    def test_validator_is_compiled_once(self):
+        validator = get_validator(self.schema_path)
+        self.assertIs(get_validator(self.schema_path), validator)
+        # a changed schema file is compiled again
+        self._write_schema({"type": "object", "required": ["title"]})
+        self.assertIsNot(get_validator(self.date_schema_path), get_validator(self.schema_path))
+
+    def test_dates_are_valid_strings(self):
+        self.assertEqual(validate_roadmap({"date": datetime.date(2023, 12, 9)}, self.date_schema_path), [])
+        self.assertEqual(validate_roadmap({"date": datetime.datetime(2023, 12, 9, 10, 0)}, self.date_schema_path), [])
+        # string keywords compare the string representation of the date
+        self.assertEqual(len(validate_roadmap({"date": datetime.date(2024, 1, 1)}, self.date_schema_path)), 1)
+        self.assertEqual(len(validate_roadmap({"date": 2023}, self.date_schema_path)), 1)
+
+    def test_validation_does_not_serialize_roadmap(self):
+        project = dict(read_roadmap_definition(os.path.join(os.path.dirname(__file__), "roadmap.yml")))
+        get_validator(self.schema_path)
+        with patch("json.dumps", side_effect=AssertionError("roadmap serialized")):
+            self.assertEqual(validate_roadmap(project, self.schema_path), [])
+
+    def test_all_errors(self):
+        invalid_data = {"title": 1, "authors": "nobody"}
+        self.assertEqual(len(validate_roadmap(invalid_data, self.schema_path)), 1)
+        errors = validate_roadmap(invalid_data, self.schema_path, all_errors=True)
+        # missing objectives, wrong type of title and authors
+        self.assertEqual(len(errors), 3)
+
+    def test_same_result_as_validation_of_json_round_trip(self):
+        roadmap_files = glob.glob(os.path.join(os.path.dirname(__file__), "..", "examples", "*.yml"))
+        roadmap_files.append(os.path.join(os.path.dirname(__file__), "roadmap.yml"))
+        with open(self.schema_path) as f:
+            schema = json.load(f)
+        for roadmap_file in roadmap_files:
+            project = dict(read_roadmap_definition(roadmap_file))
+            instance = json.loads(json.dumps(project, indent=4, sort_keys=True, default=str))
+            expected = [error.message for error in Draft202012Validator(schema).iter_errors(instance)]
+            errors = [error.message for error in validate_roadmap(project, self.schema_path, all_errors=True)]
+            self.assertEqual(len(errors), len(expected), roadmap_file)
+
+    def test_checked_schema_is_cached_on_disk(self):
+        cache_path = get_schema_cache_path({"CACHE_PATH": self.tmpdir.name})
+        self.assertIsNone(get_schema_cache_path({}))
+        get_validator(self.schema_path, cache_path)
+        self.assertEqual(len(os.listdir(cache_path)), 1)
+        # another process loads the checked schema without checking it against the meta-schema
+        validation._validators.clear()
+        with patch.object(Draft202012Validator, "check_schema",
+                          side_effect=jsonschema.exceptions.SchemaError("checked again")):
+            self.assertEqual(validate_roadmap({"not_a_valid_key": "value"}, self.schema_path,
+                                              cache_path=cache_path)[0].validator, "required")
+
+    def test_get_schema_hash(self):
+        schema_hash = get_schema_hash(self.date_schema_path)
+        self.assertEqual(len(schema_hash), 64)
+        self.assertEqual(get_schema_hash(self.date_schema_path), schema_hash)
+        self._write_schema({"type": "object", "required": ["title", "authors"]})
+        self.assertNotEqual(get_schema_hash(self.date_schema_path), schema_hash)
+
+    def test_validation_result_cache(self):
+        self.assertIsNone(get_validation_result_cache({"CACHE_PATH": ""}))
+        cache = get_validation_result_cache({"CACHE_PATH": self.tmpdir.name})
+        self.assertFalse(cache.is_valid("roadmap", "schema"))
+        cache.add("roadmap", "schema")
+        self.assertTrue(cache.is_valid("roadmap", "schema"))
+        # a changed roadmap or schema misses the cache
+        self.assertFalse(cache.is_valid("changed roadmap", "schema"))
+        self.assertFalse(cache.is_valid("roadmap", "changed schema"))
+        # roadmaps without hash are never cached
+        cache.add(None, "schema")
+        self.assertFalse(cache.is_valid(None, "schema"))
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        # the cache is persistent
+        self.assertTrue(ValidationResultCache(cache.directory).is_valid("roadmap", "schema"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import threading
+import time
+import os
+from roadmap_app.watch import snapshot_files, diff_snapshots, wait_for_changes, get_affected_templates
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.template_path = os.path.join(self.tmpdir.name, "templates")
+        os.makedirs(os.path.join(self.template_path, "html"))
+        os.makedirs(os.path.join(self.template_path, "markdown"))
+        self.css_file = os.path.join(self.template_path, "html", "roadmap.css")
+        with open(self.css_file, "w") as f:
+            f.write("body {}")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _template(self, template_type, file):
+        return {"path": os.path.join(self.template_path, template_type), "file": file}
+
+    def test_snapshot_files(self):
+        missing_file = os.path.join(self.tmpdir.name, "missing.yml")
+        snapshot = snapshot_files([self.template_path, missing_file])
+        # directories are walked recursively, missing files are left out
+        self.assertIn(os.path.abspath(self.css_file), snapshot)
+        self.assertNotIn(missing_file, snapshot)
+        self.assertEqual(snapshot_files(None), {})
+
+    def test_diff_snapshots(self):
+        old = {"a": 1, "b": 1, "c": 1}
+        new = {"a": 1, "b": 2, "d": 1}
+        # b modified, c removed, d added
+        self.assertEqual(diff_snapshots(old, new), {"b", "c", "d"})
+        self.assertEqual(diff_snapshots(old, dict(old)), set())
+        self.assertEqual(diff_snapshots(None, None), set())
+
+    def test_wait_for_changes_debounces_burst_of_saves(self):
+        snapshot = snapshot_files([self.template_path])
+        new_file = os.path.join(self.template_path, "html", "roadmap.js")
+
+        def save_twice():
+            time.sleep(0.05)
+            with open(self.css_file, "w") as f:
+                f.write("body { color: red; }")
+            time.sleep(0.02)
+            with open(new_file, "w") as f:
+                f.write("// js")
+
+        writer = threading.Thread(target=save_twice)
+        writer.start()
+        changed, new_snapshot = wait_for_changes(lambda: [self.template_path], snapshot,
+                                                 poll_interval=0.04, debounce=0.15)
+        writer.join()
+        # both saves are reported in one change set
+        self.assertEqual(changed, {os.path.abspath(self.css_file), os.path.abspath(new_file)})
+        self.assertEqual(new_snapshot, snapshot_files([self.template_path]))
+
+    def test_get_affected_templates(self):
+        os.makedirs(os.path.join(self.template_path, "html-kanban"))
+        html = self._template("html", "roadmap.html")
+        kanban = self._template("html-kanban", "roadmap.kanban.milestones.html")
+        markdown = self._template("markdown", "roadmap.md")
+        templates = [html, kanban, markdown]
+        markdown_file = os.path.join(self.template_path, "markdown", "roadmap.md")
+        # without known dependencies every template with html/ in its search paths is affected
+        self.assertEqual(get_affected_templates(templates, {self.css_file}), [html, kanban, markdown])
+        self.assertEqual(get_affected_templates(templates, {markdown_file}), [markdown])
+        self.assertEqual(get_affected_templates(templates, set()), [])
+
+    def test_get_affected_templates_with_dependencies(self):
+        html = dict(self._template("html", "roadmap.html"), output_file="roadmap.html")
+        markdown = dict(self._template("markdown", "roadmap.md"), output_file="roadmap.md")
+        markdown_file = os.path.join(self.template_path, "markdown", "roadmap.md")
+        dependencies = {"roadmap.html": [os.path.join(self.template_path, "html", "roadmap.html"), self.css_file],
+                        "roadmap.md": [markdown_file]}
+        # only templates which loaded the changed file are affected
+        self.assertEqual(get_affected_templates([html, markdown], {self.css_file}, dependencies), [html])
+        self.assertEqual(get_affected_templates([html, markdown], {markdown_file}, dependencies), [markdown])
+
+
+if __name__ == '__main__':
+    unittest.main()